@@ -44,6 +44,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'gestion',
     'Internaute',
 ]
@@ -51,11 +52,14 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'gestion.middleware.InstrumentationSQLMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'gestion.middleware.CollecteAlertesMiddleware',
+    'gestion.middleware.CollecteHistoriqueMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -163,6 +167,73 @@ STORAGES = {
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Durée de vie (s) des prévisions de stock en cache, en secours de l'invalidation
+FORECAST_CACHE_TTL = int(os.getenv('FORECAST_CACHE_TTL', '900'))
+
+# Âge maximal (s) de l'instantané de prévisions (precompute_forecasts, cron
+# horaire) ; au-delà, la page recalcule à la demande et le signale périmé
+FORECAST_SNAPSHOT_MAX_AGE = int(os.getenv('FORECAST_SNAPSHOT_MAX_AGE', '10800'))
+
+# Nombre de processus pour les prévisions par produit / entrepôt
+FORECAST_WORKERS = int(os.getenv('FORECAST_WORKERS', str(min(4, os.cpu_count() or 1))))
+
+# Durée de vie (s) des compteurs du tableau de bord (gestion/kpi.py)
+KPI_CACHE_TTL = int(os.getenv('KPI_CACHE_TTL', '60'))
+
+# Instrumentation SQL par requête (gestion/middleware.py) : Server-Timing,
+# log JSON sur le logger gestion.sql, avertissement au-delà du budget
+SQL_INSTRUMENTATION = os.getenv('SQL_INSTRUMENTATION', str(DEBUG)).lower() in ('true', '1', 'yes')
+# Nombre maximal de requêtes par vue (nom d'URL), SQL_BUDGET_DEFAUT sinon
+SQL_BUDGET_DEFAUT = int(os.getenv('SQL_BUDGET_DEFAUT', '20'))
+SQL_BUDGETS = {
+    'dashboard': 8,
+    'alertes_list': 14,
+    'stock_prediction': 8,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'gestion.sql': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+        'gestion.audit': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+    },
+}
+
+# Lignes par page des listes (pagination par clé, gestion/pagination.py)
+LISTE_PAR_PAGE = int(os.getenv('LISTE_PAR_PAGE', '50'))
+
+# Durée de vie (s) des totaux des listes (nombre de lignes filtrées, montants)
+LISTE_TOTAUX_CACHE_TTL = int(os.getenv('LISTE_TOTAUX_CACHE_TTL', '60'))
+
+# Lignes au plus d'un export XLSX depuis la page web (au-delà : CSV en flux
+# ou python manage.py exporter_donnees)
+EXPORT_XLSX_MAX_LIGNES = int(os.getenv('EXPORT_XLSX_MAX_LIGNES', '100000'))
+
+# Nombre de trajectoires de la simulation Monte Carlo (probabilité de rupture)
+FORECAST_MC_CHEMINS = int(os.getenv('FORECAST_MC_CHEMINS', '10000'))
+
+# Historique de traçabilité (gestion/audit.py) : écrit en un bulk_create par
+# requête ; en mode asynchrone, par un thread qui regroupe les requêtes
+HISTORIQUE_ASYNCHRONE = os.getenv('HISTORIQUE_ASYNCHRONE', 'False').lower() in ('true', '1', 'yes')
+# Entrées en attente au plus (au-delà, la requête écrit elle-même) et taille des INSERT
+HISTORIQUE_FILE_MAX = int(os.getenv('HISTORIQUE_FILE_MAX', '10000'))
+HISTORIQUE_TAILLE_LOT = int(os.getenv('HISTORIQUE_TAILLE_LOT', '500'))
+# Thread d'écriture : essais par lot, puis fichier de secours (loaddata)
+HISTORIQUE_TENTATIVES = int(os.getenv('HISTORIQUE_TENTATIVES', '3'))
+HISTORIQUE_SECOURS = os.getenv('HISTORIQUE_SECOURS', str(BASE_DIR / 'historique_secours.jsonl'))
+
+# Cache partagé entre processus (prévisions calculées hors requête web)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('CACHE_DIR', str(BASE_DIR / '.cache')),
+    }
+}
+
 # Custom test runner pour les modèles non managés
 TEST_RUNNER = 'gestion.test_runner.UnmanagedModelTestRunner'
 
@@ -0,0 +1,331 @@
+"""
+Évaluation différée et regroupée des alertes de stock.
+
+Les chemins d'écriture (ventes, réservations, livraisons, réceptions…) se
+contentent de signaler les produits dont le stock a changé. La file est
+propre au thread (donc à la requête) ; elle est vidée par
+``transaction.on_commit`` : les alertes sont calculées une seule fois par
+produit, à partir de l'état validé en base, avec une requête pour les
+produits et une pour leurs alertes actives.
+
+L'évaluation est idempotente : un produit signalé dans une transaction
+annulée est simplement réévalué au vidage suivant.
+
+La sévérité et la priorité d'affichage (CRITIQUE, URGENT, ATTENTION) sont
+calculées en SQL (``produits_critiques``, ``annoter_priorite``).
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+
+
+_etat = threading.local()
+
+
+def _file():
+    if not hasattr(_etat, 'file'):
+        _etat.file = {}
+        _etat.profondeur = 0
+    return _etat.file
+
+
+def signaler_produit(produit, user=None):
+    """
+    Marque un produit (instance ou identifiant) comme à réévaluer.
+    Hors d'une collecte, le vidage est programmé au commit de la
+    transaction courante (immédiatement en autocommit).
+    """
+    file = _file()
+    produit_id = getattr(produit, 'pk', produit)
+    # Conserver l'utilisateur connu si un signalement ultérieur n'en a pas
+    file[produit_id] = user or file.get(produit_id)
+    if _etat.profondeur == 0:
+        transaction.on_commit(vider_file_alertes, robust=True)
+
+
+@contextmanager
+def collecte_alertes():
+    """
+    Regroupe les signalements jusqu'à la sortie du bloc (une requête HTTP,
+    un traitement par lot) puis vide la file au commit.
+    """
+    _file()
+    _etat.profondeur += 1
+    try:
+        yield
+    finally:
+        _etat.profondeur -= 1
+        if _etat.profondeur == 0 and _etat.file:
+            transaction.on_commit(vider_file_alertes, robust=True)
+
+
+def vider_file_alertes():
+    """Évalue les produits en attente ; sans effet si la file est vide."""
+    file = _file()
+    if not file:
+        return {}
+    en_attente = dict(file)
+    file.clear()
+    return evaluer_alertes(en_attente)
+
+
+def evaluer_alertes(produits):
+    """
+    Évalue les alertes d'un ensemble de produits {produit_id: user}.
+    Crée alerte + DA quand stock ≤ seuil, met à jour les alertes actives,
+    ou les résout si le stock est repassé au-dessus du seuil.
+    Retourne {produit_id: alerte créée}.
+    """
+    from .models import AlerteStock, Produit
+    from .services import get_stock_info
+    from django.utils import timezone
+    from collections import defaultdict
+
+    if not produits:
+        return {}
+
+    now = timezone.now()
+    with transaction.atomic():
+        # Verrou par produit : deux vidages concurrents ne créent pas deux alertes
+        catalogue = {
+            p.pk: p for p in Produit.objects.select_for_update()
+            .filter(pk__in=list(produits)).order_by('pk')
+        }
+        actives = defaultdict(list)
+        for alerte in AlerteStock.objects.filter(
+                produit_id__in=list(catalogue), statut='ACTIVE'):
+            actives[alerte.produit_id].append(alerte)
+
+        resolues, maj, nouvelles = [], [], []
+        for produit_id, produit in catalogue.items():
+            info = get_stock_info(produit)
+            user = produits.get(produit_id)
+
+            if not info['en_alerte']:
+                # Stock OK → résoudre les alertes actives existantes
+                for alerte in actives[produit_id]:
+                    alerte.statut = 'TRAITEE'
+                    alerte.date_traitement = now
+                    alerte.user_traitement = user
+                    alerte.observations = (
+                        (alerte.observations or '') +
+                        f'\nRésolue auto : stock remonté à {info["stock_disponible"]}'
+                    )
+                    resolues.append(alerte)
+            elif actives[produit_id]:
+                # Mettre à jour le stock_actuel de l'alerte existante
+                for alerte in actives[produit_id]:
+                    alerte.stock_actuel = info['stock_disponible']
+                    maj.append(alerte)
+            else:
+                nouvelles.append((user, AlerteStock(
+                    produit=produit, date_alerte=now,
+                    stock_actuel=info['stock_disponible'],
+                    seuil_alerte=info['seuil_alerte'],
+                    statut='ACTIVE', demande_achat_generee=user is not None,
+                    observations=(
+                        f'Alerte auto : stock dispo ({info["stock_disponible"]}) '
+                        f'≤ seuil ({info["seuil_alerte"]})'
+                    ),
+                )))
+
+        if resolues:
+            AlerteStock.objects.bulk_update(
+                resolues, ['statut', 'date_traitement', 'user_traitement', 'observations'])
+        if maj:
+            AlerteStock.objects.bulk_update(maj, ['stock_actuel'])
+        if nouvelles:
+            AlerteStock.objects.bulk_create([alerte for _, alerte in nouvelles])
+
+        # DA automatique pour chaque nouvelle alerte signalée par un utilisateur
+        _creer_demandes_achat(
+            [(user, alerte) for user, alerte in nouvelles if user is not None], now)
+
+    return {alerte.produit_id: alerte for _, alerte in nouvelles}
+
+
+def _creer_demandes_achat(alertes, date_creation):
+    """DA en brouillon pour une liste [(user, alerte)], numérotées en un appel."""
+    from .models import DemandeAchat
+    from .numerotation import allouer_numeros
+    from .services import quantite_demande_achat
+
+    if not alertes:
+        return []
+    numeros = allouer_numeros('DA', len(alertes))
+    return DemandeAchat.objects.bulk_create([
+        DemandeAchat(
+            numero_da=numero, date_creation=date_creation,
+            produit=alerte.produit,
+            stock_actuel=alerte.stock_actuel,
+            seuil_alerte=alerte.seuil_alerte,
+            quantite_a_commander=quantite_demande_achat(alerte),
+            priorite='URGENT' if alerte.stock_actuel <= 0 else 'NORMAL',
+            statut='BROUILLON', alerte=alerte, user_createur=user,
+        )
+        for numero, (user, alerte) in zip(numeros, alertes)
+    ])
+
+
+def balayer_alertes(user=None, dry_run=False):
+    """
+    Réévalue les alertes de tout le catalogue en quelques requêtes :
+    une passe SQL sur la colonne générée ``stock_disponible`` repère les
+    produits sous le seuil sans alerte active, qui reçoivent alerte + DA
+    (bulk_create) ; les alertes des produits remontés au-dessus du seuil
+    sont résolues par un seul UPDATE.
+    Retourne un dict de compteurs ; avec `dry_run`, rien n'est écrit.
+    """
+    from .models import AlerteStock, Produit
+    from django.db.models import (
+        BooleanField, Case, DecimalField, Exists, F, OuterRef, Q, Subquery,
+        TextField, Value, When,
+    )
+    from django.db.models.functions import Cast, Coalesce, Concat, Greatest
+    from django.utils import timezone
+    from decimal import Decimal
+
+    zero = Value(Decimal('0.00'))
+    # Même règle que get_stock_info : dispo (borné à 0) ≤ seuil et seuil > 0
+    dispo = Greatest(Coalesce(F('stock_disponible'), zero), zero)
+    en_alerte = Q(seuil_alerte__gt=0) & Q(stock_disponible_calc__lte=F('seuil_alerte'))
+    alerte_active = AlerteStock.objects.filter(produit=OuterRef('pk'), statut='ACTIVE')
+
+    produits = Produit.objects.annotate(
+        stock_disponible_calc=dispo,
+        en_alerte=Case(When(en_alerte, then=Value(True)),
+                       default=Value(False), output_field=BooleanField()),
+        alerte_active=Exists(alerte_active),
+    )
+    a_creer = produits.filter(en_alerte=True, alerte_active=False)
+    stock_produit = Subquery(
+        Produit.objects.filter(pk=OuterRef('produit_id'))
+        .annotate(stock_disponible_calc=dispo).values('stock_disponible_calc'),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+    a_resoudre = AlerteStock.objects.filter(
+        statut='ACTIVE',
+        produit__in=produits.filter(en_alerte=False).values('pk'),
+    )
+    a_actualiser = AlerteStock.objects.filter(
+        statut='ACTIVE',
+        produit__in=produits.filter(en_alerte=True).values('pk'),
+    )
+
+    if dry_run:
+        nb_creees = a_creer.count()
+        return {
+            'alertes_creees': nb_creees,
+            'demandes_creees': nb_creees if user else 0,
+            'alertes_resolues': a_resoudre.count(),
+            'alertes_actualisees': a_actualiser.count(),
+        }
+
+    now = timezone.now()
+    with transaction.atomic():
+        nouvelles = [
+            AlerteStock(
+                produit=produit, date_alerte=now,
+                stock_actuel=produit.stock_disponible_calc,
+                seuil_alerte=produit.seuil_alerte,
+                statut='ACTIVE', demande_achat_generee=user is not None,
+                observations=(
+                    f'Alerte auto : stock dispo ({produit.stock_disponible_calc}) '
+                    f'≤ seuil ({produit.seuil_alerte})'
+                ),
+            )
+            for produit in a_creer.select_for_update(of=('self',)).order_by('pk')
+        ]
+        AlerteStock.objects.bulk_create(nouvelles)
+        demandes = _creer_demandes_achat([(user, a) for a in nouvelles] if user else [], now)
+
+        nb_resolues = a_resoudre.update(
+            statut='TRAITEE', date_traitement=now, user_traitement=user,
+            observations=Concat(
+                Coalesce(F('observations'), Value('')),
+                Value('\nRésolue auto : stock remonté à '),
+                Cast(stock_produit, TextField()),
+                output_field=TextField(),
+            ),
+        )
+        nb_actualisees = a_actualiser.update(stock_actuel=stock_produit)
+
+    return {
+        'alertes_creees': len(nouvelles),
+        'demandes_creees': len(demandes),
+        'alertes_resolues': nb_resolues,
+        'alertes_actualisees': nb_actualisees,
+    }
+
+
+def _severite(stock, seuil):
+    """
+    Expressions SQL (sévérité, rang de tri) d'un stock face à un seuil > 0,
+    `stock` et `seuil` étant des noms de champs ou d'annotations :
+    CRITIQUE ≤ 25 % du seuil, URGENT ≤ 50 %, ATTENTION au-delà.
+    """
+    from django.db.models import CharField, Case, F, IntegerField, Q, Value, When
+    from decimal import Decimal
+
+    critique = Q(**{f'{stock}__lte': F(seuil) * Decimal('0.25')})
+    urgent = Q(**{f'{stock}__lte': F(seuil) * Decimal('0.50')})
+    severite = Case(
+        When(critique, then=Value('CRITIQUE')),
+        When(urgent, then=Value('URGENT')),
+        default=Value('ATTENTION'), output_field=CharField(),
+    )
+    rang = Case(
+        When(critique, then=Value(0)),
+        When(urgent, then=Value(1)),
+        default=Value(2), output_field=IntegerField(),
+    )
+    return severite, rang
+
+
+def produits_critiques():
+    """
+    Produits dont le stock disponible est ≤ seuil d'alerte (seuil > 0),
+    annotés en SQL : stock_dispo, seuil, ratio (% du seuil, plafonné à
+    100), severite, deficit ; les plus critiques puis les plus gros
+    déficits en premier.
+    """
+    from .models import Produit
+    from django.db.models import DecimalField, ExpressionWrapper, F, Value
+    from django.db.models.functions import Coalesce, Least, Round
+    from decimal import Decimal
+
+    zero = Value(Decimal('0.00'))
+    severite, rang = _severite('stock_dispo', 'seuil')
+    return (
+        Produit.objects
+        .annotate(stock_dispo=Coalesce(F('stock_disponible'), zero),
+                  seuil=Coalesce(F('seuil_alerte'), zero))
+        .filter(seuil__gt=0, stock_dispo__lte=F('seuil'))
+        .annotate(
+            ratio=Round(Least(
+                ExpressionWrapper(F('stock_dispo') * 100 / F('seuil'),
+                                  output_field=DecimalField()),
+                Value(Decimal('100'))), 1),
+            severite=severite,
+            rang_severite=rang,
+            deficit=ExpressionWrapper(F('seuil') - F('stock_dispo'),
+                                      output_field=DecimalField()),
+        )
+        .order_by('rang_severite', '-deficit', 'pk')
+    )
+
+
+def annoter_priorite(queryset):
+    """
+    Annote des alertes de leur ``priorite`` (même échelle que les
+    produits, sur stock_actuel / seuil_alerte de l'alerte) ; NULL si le
+    seuil de l'alerte est nul ou absent.
+    """
+    from django.db.models import Case, CharField, Q, When
+
+    severite, _ = _severite('stock_actuel', 'seuil_alerte')
+    return queryset.annotate(priorite=Case(
+        When(Q(seuil_alerte__gt=0), then=severite),
+        default=None, output_field=CharField(),
+    ))
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class GestionConfig(AppConfig):
     name = 'gestion'
+
+    def ready(self):
+        from .signals import connecter_signaux
+        connecter_signaux()
@@ -0,0 +1,305 @@
+"""
+Écriture groupée de l'historique de traçabilité (HistoriqueTracabilite).
+
+Les vues ne font plus un INSERT par entrée : ``journaliser`` prépare
+l'entrée et la confie à ``transaction.on_commit``, si bien qu'une entrée
+émise dans une transaction annulée disparaît avec elle. Les entrées
+validées s'accumulent dans une file propre au thread (donc à la requête)
+et sont écrites en un seul ``bulk_create`` à la fin de la requête
+(CollecteHistoriqueMiddleware) ou du bloc ``collecte_historique``.
+
+HISTORIQUE_ASYNCHRONE : les lots sont remis à un thread d'écriture qui
+regroupe plusieurs requêtes (file bornée à HISTORIQUE_FILE_MAX entrées).
+File pleine : la requête écrit elle-même ses entrées plutôt que de les
+perdre ; à l'arrêt du processus (atexit), la file est vidée. Un lot que
+le thread n'arrive pas à écrire est retenté (HISTORIQUE_TENTATIVES), puis
+ajouté au fichier de secours HISTORIQUE_SECOURS, rechargeable par
+``python manage.py loaddata <fichier>.jsonl``.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache, partial
+
+from django.db import transaction
+
+
+logger = logging.getLogger('gestion.audit')
+
+_etat = threading.local()
+
+# Valeurs gardées telles quelles dans le JSON de l'historique
+_TYPES_JSON = (str, int, float, bool, type(None))
+
+
+def _file():
+    if not hasattr(_etat, 'file'):
+        _etat.file = []
+        _etat.profondeur = 0
+    return _etat.file
+
+
+def journaliser(user, type_action, description, lot=None, commande=None,
+                ancienne_valeur=None, nouvelle_valeur=None):
+    """Enregistre une entrée dans l'historique de traçabilité (au commit)."""
+    from .models import HistoriqueTracabilite
+    from django.utils import timezone
+
+    entree = HistoriqueTracabilite(
+        date_action=timezone.now(),
+        type_action=type_action,
+        description=description,
+        lot=lot,
+        commande=commande,
+        user=user,
+        ancienne_valeur=ancienne_valeur,
+        nouvelle_valeur=nouvelle_valeur,
+    )
+    transaction.on_commit(partial(_ajouter, entree))
+
+
+def _ajouter(entree):
+    file = _file()
+    file.append(entree)
+    if _etat.profondeur == 0:
+        vider_historique()
+
+
+@contextmanager
+def collecte_historique():
+    """
+    Regroupe les entrées jusqu'à la sortie du bloc (une requête HTTP, un
+    traitement par lot) puis les écrit en une fois.
+    """
+    _file()
+    _etat.profondeur += 1
+    try:
+        yield
+    finally:
+        _etat.profondeur -= 1
+        if _etat.profondeur == 0 and _etat.file:
+            transaction.on_commit(vider_historique)
+
+
+def vider_historique():
+    """Écrit (ou remet au thread d'écriture) les entrées en attente."""
+    from django.conf import settings
+
+    file = _file()
+    if not file:
+        return 0
+    entrees = list(file)
+    file.clear()
+    if getattr(settings, 'HISTORIQUE_ASYNCHRONE', False):
+        _ecrivain().soumettre(entrees)
+    else:
+        ecrire_entrees(entrees)
+    return len(entrees)
+
+
+def ecrire_entrees(entrees):
+    from .models import HistoriqueTracabilite
+    from django.conf import settings
+
+    HistoriqueTracabilite.objects.bulk_create(
+        entrees, batch_size=getattr(settings, 'HISTORIQUE_TAILLE_LOT', 500))
+
+
+_verrou_secours = threading.Lock()
+
+
+def ecrire_secours(entrees):
+    """
+    Ajoute les entrées au fichier de secours (JSON Lines au format des
+    fixtures : python manage.py loaddata le réinsère). En dernier recours,
+    si le fichier est inaccessible, elles sont écrites dans le log.
+    """
+    from .models import HistoriqueTracabilite
+    from django.conf import settings
+    from django.core import serializers
+
+    champs = [f.name for f in HistoriqueTracabilite._meta.concrete_fields
+              if not f.primary_key and not f.generated]
+    contenu = serializers.serialize('jsonl', entrees, fields=champs)
+    chemin = str(getattr(settings, 'HISTORIQUE_SECOURS', 'historique_secours.jsonl'))
+    try:
+        with _verrou_secours, open(chemin, 'a', encoding='utf-8') as fichier:
+            fichier.write(contenu)
+    except OSError:
+        logger.critical('Historique non écrit (%d entrées, %s inaccessible) :\n%s',
+                        len(entrees), chemin, contenu, exc_info=True)
+    else:
+        logger.error('%d entrées d\'historique écrites dans %s '
+                     '(à recharger : python manage.py loaddata %s)',
+                     len(entrees), chemin, chemin)
+
+
+# ── Écriture en arrière-plan ──
+
+_FIN = object()
+
+
+class EcrivainHistorique:
+    """Thread d'écriture : vide la file par lots de `taille_lot` entrées."""
+
+    def __init__(self, taille_file, taille_lot, tentatives=3, pause=0.5):
+        self.file = queue.Queue(maxsize=taille_file)
+        self.taille_lot = taille_lot
+        self.tentatives = max(1, tentatives)
+        self.pause = pause
+        self._thread = None
+        self._verrou = threading.Lock()
+
+    def soumettre(self, entrees):
+        self._demarrer()
+        for i, entree in enumerate(entrees):
+            try:
+                self.file.put_nowait(entree)
+            except queue.Full:
+                # File pleine : écriture synchrone plutôt que perte
+                logger.warning('File de l\'historique pleine : %d entrées écrites '
+                               'dans la requête', len(entrees) - i)
+                ecrire_entrees(entrees[i:])
+                return
+
+    def _demarrer(self):
+        with self._verrou:
+            if self._thread is None:
+                atexit.register(self.arreter)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._boucle, name='ecrivain-historique', daemon=True)
+                self._thread.start()
+
+    def _boucle(self):
+        from django.db import connection
+
+        fin = False
+        while not fin:
+            # Attend une entrée, puis prend ce qui est déjà en file
+            lot, entree = [], self.file.get()
+            while True:
+                if entree is _FIN:
+                    fin = True
+                    break
+                lot.append(entree)
+                if len(lot) >= self.taille_lot:
+                    break
+                try:
+                    entree = self.file.get_nowait()
+                except queue.Empty:
+                    break
+            if lot:
+                self._ecrire(lot)
+        connection.close()
+
+    def _ecrire(self, lot):
+        """Écrit un lot : nouvelles tentatives, puis fichier de secours."""
+        from django.db import close_old_connections, connection
+
+        for tentative in range(self.tentatives):
+            close_old_connections()
+            try:
+                ecrire_entrees(lot)
+                return
+            except Exception:
+                logger.warning('Échec d\'écriture de %d entrées d\'historique (tentative %d/%d)',
+                               len(lot), tentative + 1, self.tentatives, exc_info=True)
+                # Lot annulé en entier : identifiants éventuellement attribués
+                # oubliés ; connexion peut-être rompue, la suivante repart neuve
+                for entree in lot:
+                    entree.pk = None
+                connection.close()
+                if tentative + 1 < self.tentatives:
+                    time.sleep(self.pause * 2 ** tentative)
+        ecrire_secours(lot)
+
+    def _vider(self):
+        """Écrit, dans le thread appelant, les entrées encore en file."""
+        lot = []
+        while True:
+            try:
+                entree = self.file.get_nowait()
+            except queue.Empty:
+                break
+            if entree is _FIN:
+                continue
+            lot.append(entree)
+            if len(lot) >= self.taille_lot:
+                self._ecrire(lot)
+                lot = []
+        if lot:
+            self._ecrire(lot)
+
+    def arreter(self, delai=10):
+        """
+        Arrête le thread puis vide la file (appelé à la sortie du processus).
+        Ce que le thread n'a pas écrit dans le délai (file pleine, base
+        lente) est écrit par le thread appelant ; rien ne bloque sur la file.
+        """
+        if self._thread is None:
+            return
+        if self._thread.is_alive():
+            try:
+                self.file.put_nowait(_FIN)
+            except queue.Full:
+                pass
+            self._thread.join(delai)
+        self._vider()
+
+
+@lru_cache(maxsize=None)
+def _ecrivain():
+    from django.conf import settings
+
+    return EcrivainHistorique(
+        getattr(settings, 'HISTORIQUE_FILE_MAX', 10000),
+        getattr(settings, 'HISTORIQUE_TAILLE_LOT', 500),
+        getattr(settings, 'HISTORIQUE_TENTATIVES', 3),
+    )
+
+
+# ── Instantanés des objets ──
+
+@lru_cache(maxsize=None)
+def _attributs(modele, champs):
+    """(nom, attname, relation) des champs à relever, calculé une fois par modèle."""
+    from django.core.exceptions import FieldDoesNotExist
+
+    if champs is None:
+        return tuple((f.name, f.attname, f.is_relation) for f in modele._meta.fields
+                     if f.name not in ('id', 'user', 'date_creation'))
+    attributs = []
+    for nom in champs:
+        try:
+            champ = modele._meta.get_field(nom)
+        except FieldDoesNotExist:
+            attributs.append((nom, None, False))
+        else:
+            attributs.append((nom, champ.attname, champ.is_relation))
+    return tuple(attributs)
+
+
+def valeurs_modele(instance, fields=None):
+    """
+    Convertit un objet model en dict lisible pour l'historique.
+    Lit les valeurs chargées de l'instance ; une clé étrangère non chargée
+    est relevée par son identifiant (aucune requête).
+    """
+    valeurs = instance.__dict__
+    liees = instance._state.fields_cache
+    data = {}
+    for nom, attname, relation in _attributs(type(instance), tuple(fields) if fields else None):
+        if relation:
+            val = liees.get(nom, valeurs.get(attname))
+        elif attname in valeurs:
+            val = valeurs[attname]
+        else:
+            val = getattr(instance, nom, None)
+        if not isinstance(val, _TYPES_JSON):
+            val = str(val)
+        data[nom] = val
+    return data
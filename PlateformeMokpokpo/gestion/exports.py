@@ -0,0 +1,197 @@
+"""
+Extractions comptables (mouvements, ventes, ventes immédiates, historique).
+
+Les lignes sont lues par un curseur serveur (``.iterator(chunk_size)``)
+en ``values_list`` — sans instancier de modèles — et écrites au fil de
+l'eau : la mémoire reste constante quel que soit le nombre de lignes.
+Utilisé par la vue ``exporter`` (StreamingHttpResponse) et par
+``python manage.py exporter_donnees``.
+
+Le XLSX nécessite openpyxl (optionnel), en mode write_only.
+"""
+import csv
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from .filtres import (
+    filtrer_ventes, filtrer_mouvements, filtrer_historique,
+    filtrer_ventes_immediates,
+)
+
+
+TAILLE_LOT = 2000
+
+# nom → modèle, filtre de la liste, clé de date, colonnes (en-tête, champ)
+EXPORTS = {
+    'mouvements': {
+        'modele': 'MouvementStock',
+        'filtre': filtrer_mouvements,
+        'cle': 'date_mouvement',
+        'colonnes': [
+            ('Date', 'date_mouvement'),
+            ('Type', 'type_mouvement'),
+            ('Lot', 'lot__code_lot'),
+            ('Produit', 'lot__produit__nom'),
+            ('Quantité', 'quantite'),
+            ('Motif', 'motif'),
+            ('Zone origine', 'zone_origine__nom'),
+            ('Zone destination', 'zone_destination__nom'),
+            ('Commande', 'commande__numero_commande'),
+            ('Utilisateur', 'user__username'),
+            ('Validé', 'valide'),
+        ],
+    },
+    'ventes': {
+        'modele': 'Vente',
+        'filtre': filtrer_ventes,
+        'cle': 'date_vente',
+        'colonnes': [
+            ('Numéro', 'numero_vente'),
+            ('Date', 'date_vente'),
+            ('Type', 'type_vente'),
+            ('Client', 'client__nom'),
+            ('Lot', 'lot__code_lot'),
+            ('Produit', 'lot__produit__nom'),
+            ('Quantité', 'quantite_vendue'),
+            ('Prix unitaire', 'prix_unitaire'),
+            ('Montant total', 'montant_total'),
+            ('Mode de paiement', 'mode_paiement'),
+            ('Commande', 'commande__numero_commande'),
+            ('Utilisateur', 'user__username'),
+        ],
+    },
+    'ventes_immediates': {
+        'modele': 'VenteImmediate',
+        'filtre': filtrer_ventes_immediates,
+        'cle': 'date_vente',
+        'colonnes': [
+            ('Numéro', 'numero_vente'),
+            ('Date', 'date_vente'),
+            ('Type', 'type_vente'),
+            ('Client', 'client__nom'),
+            ('Produit', 'produit__nom'),
+            ('Quantité demandée', 'quantite_demandee'),
+            ('Quantité servie', 'quantite_servie_maintenant'),
+            ('Prix unitaire', 'prix_unitaire'),
+            ('Prix majoré urgence', 'prix_majore_urgence'),
+            ('Montant total', 'montant_total'),
+            ('Commande associée', 'commande_associee__numero_commande'),
+            ('Utilisateur', 'user__username'),
+        ],
+    },
+    'historique': {
+        'modele': 'HistoriqueTracabilite',
+        'filtre': filtrer_historique,
+        'cle': 'date_action',
+        'colonnes': [
+            ('Date', 'date_action'),
+            ('Action', 'type_action'),
+            ('Description', 'description'),
+            ('Lot', 'lot__code_lot'),
+            ('Commande', 'commande__numero_commande'),
+            ('Utilisateur', 'user__username'),
+            ('Ancienne valeur', 'ancienne_valeur'),
+            ('Nouvelle valeur', 'nouvelle_valeur'),
+        ],
+    },
+}
+
+
+def queryset_export(nom, params):
+    """
+    Lignes (tuples) d'une extraction : filtres de la liste + période
+    optionnelle ``du`` / ``au`` (AAAA-MM-JJ, incluses) sur la clé de date.
+    """
+    from django.apps import apps
+    from django.utils.dateparse import parse_date
+
+    definition = EXPORTS[nom]
+    modele = apps.get_model('gestion', definition['modele'])
+    cle = definition['cle']
+
+    queryset = definition['filtre'](modele.objects.all(), params)
+    du = parse_date(params.get('du') or '')
+    au = parse_date(params.get('au') or '')
+    if du:
+        queryset = queryset.filter(**{f'{cle}__date__gte': du})
+    if au:
+        queryset = queryset.filter(**{f'{cle}__date__lte': au})
+
+    champs = [champ for _, champ in definition['colonnes']]
+    return queryset.order_by(cle, 'pk').values_list(*champs)
+
+
+def depasse(nom, params, limite):
+    """Vrai si l'extraction compte plus de `limite` lignes (lecture bornée)."""
+    return queryset_export(nom, params)[limite:limite + 1].exists()
+
+
+def _cellule(valeur):
+    """Valeur imprimable : dates locales, décimaux exacts, JSON compact."""
+    from django.utils import timezone
+
+    if valeur is None:
+        return ''
+    if isinstance(valeur, datetime):
+        if timezone.is_aware(valeur):
+            valeur = timezone.localtime(valeur)
+        return valeur.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(valeur, bool):
+        return 'Oui' if valeur else 'Non'
+    if isinstance(valeur, Decimal):
+        return str(valeur)
+    if isinstance(valeur, (dict, list)):
+        return json.dumps(valeur, ensure_ascii=False, default=str)
+    return valeur
+
+
+def _cellule_xlsx(valeur):
+    """Comme _cellule, mais montants et dates restent typés pour Excel."""
+    from django.utils import timezone
+
+    if isinstance(valeur, datetime):
+        if timezone.is_aware(valeur):
+            valeur = timezone.make_naive(valeur)
+        return valeur
+    if isinstance(valeur, Decimal):
+        return float(valeur)
+    if valeur is None:
+        return None
+    return _cellule(valeur)
+
+
+class _Tampon:
+    """Pseudo-fichier : csv.writer renvoie la ligne au lieu de l'écrire."""
+    def write(self, valeur):
+        return valeur
+
+
+def lignes_csv(nom, params, taille_lot=TAILLE_LOT):
+    """
+    Générateur de lignes CSV (BOM UTF-8 et ';' pour Excel en français),
+    lues par lots de `taille_lot` sur un curseur serveur.
+    """
+    writer = csv.writer(_Tampon(), delimiter=';')
+    yield '\ufeff' + writer.writerow([entete for entete, _ in EXPORTS[nom]['colonnes']])
+    for ligne in queryset_export(nom, params).iterator(chunk_size=taille_lot):
+        yield writer.writerow([_cellule(v) for v in ligne])
+
+
+def ecrire_xlsx(nom, params, fichier, taille_lot=TAILLE_LOT):
+    """
+    Écrit l'extraction en XLSX dans `fichier` (chemin ou fichier binaire).
+    openpyxl en mode write_only écrit chaque ligne sans garder la feuille
+    en mémoire. Lève ImportError si openpyxl n'est pas installé.
+    """
+    from openpyxl import Workbook
+
+    classeur = Workbook(write_only=True)
+    feuille = classeur.create_sheet(title=nom[:31])
+    feuille.append([entete for entete, _ in EXPORTS[nom]['colonnes']])
+    nb = 0
+    for ligne in queryset_export(nom, params).iterator(chunk_size=taille_lot):
+        feuille.append([_cellule_xlsx(v) for v in ligne])
+        nb += 1
+    classeur.save(fichier)
+    return nb
@@ -0,0 +1,44 @@
+"""
+Filtres des listes (recherche, statut, date…) partagés entre les vues
+de liste et les exports : une extraction contient exactement les lignes
+que la liste affiche pour les mêmes paramètres GET. La recherche passe
+par gestion.recherche (index trigrammes / plein texte).
+"""
+from .recherche import rechercher
+
+
+def filtrer_ventes(queryset, params):
+    search_query = params.get('search', '')
+    date_filter = params.get('date', '')
+
+    queryset = rechercher(queryset, search_query,
+                          ('numero_vente', 'client__nom', 'lot__code_lot'))
+
+    if date_filter:
+        queryset = queryset.filter(date_vente__date=date_filter)
+    return queryset
+
+
+def filtrer_mouvements(queryset, params):
+    # La liste des mouvements n'a pas de filtre : tout est affiché
+    return queryset
+
+
+def filtrer_historique(queryset, params):
+    search_query = params.get('search', '')
+    type_action_filter = params.get('type_action', '')
+
+    queryset = rechercher(
+        queryset, search_query,
+        ('lot__code_lot', 'user__username', 'commande__numero_commande'),
+        texte='recherche',
+    )
+
+    if type_action_filter:
+        queryset = queryset.filter(type_action=type_action_filter)
+    return queryset
+
+
+def filtrer_ventes_immediates(queryset, params):
+    search_query = params.get('search', '')
+    return rechercher(queryset, search_query, ('numero_vente', 'client__nom'))
@@ -229,7 +229,7 @@ class LotForm(forms.ModelForm):
         if self.instance and self.instance.pk:
             self.fields['code_lot'].initial = self.instance.code_lot
         else:
-            self.fields['code_lot'].initial = generate_lot_code()
+            self.fields['code_lot'].initial = generate_lot_code(reserver=False)
 
     def clean_quantite_restante(self):
         val = self.cleaned_data.get('quantite_restante')
@@ -284,7 +284,7 @@ class VenteForm(forms.ModelForm):
         if self.instance and self.instance.pk:
             self.fields['numero_vente'].initial = self.instance.numero_vente
         else:
-            self.fields['numero_vente'].initial = generate_vente_numero()
+            self.fields['numero_vente'].initial = generate_vente_numero(reserver=False)
 
 
 class MouvementStockForm(forms.ModelForm):
@@ -371,7 +371,7 @@ class CommandeForm(forms.ModelForm):
             if ligne:
                 self.fields['produit'].initial = ligne.produit_id
         else:
-            self.fields['numero_commande'].initial = generate_commande_numero()
+            self.fields['numero_commande'].initial = generate_commande_numero(reserver=False)
 
     def clean(self):
         cleaned = super().clean()
@@ -433,7 +433,7 @@ class VenteImmediateForm(forms.ModelForm):
         if self.instance and self.instance.pk:
             self.fields['numero_vente'].initial = self.instance.numero_vente
         else:
-            self.fields['numero_vente'].initial = generate_vente_immediate_numero()
+            self.fields['numero_vente'].initial = generate_vente_immediate_numero(reserver=False)
 
 
 class DemandeAchatForm(forms.ModelForm):
@@ -469,4 +469,4 @@ class DemandeAchatForm(forms.ModelForm):
         if self.instance and self.instance.pk:
             self.fields['numero_da'].initial = self.instance.numero_da
         else:
-            self.fields['numero_da'].initial = generate_demande_achat_numero()
+            self.fields['numero_da'].initial = generate_demande_achat_numero(reserver=False)
@@ -0,0 +1,91 @@
+"""
+Instrumentation SQL par requête (middleware InstrumentationSQLMiddleware).
+
+Un ``connection.execute_wrapper`` posé sur chaque connexion compte les
+requêtes, cumule leur durée et garde les plus lentes ; les SQL répétés à
+l'identique (même texte paramétré) signalent les boucles N+1, par exemple
+un ``__str__`` qui suit une clé étrangère dans une liste.
+
+Budgets : SQL_BUDGETS (nom d'URL → nombre maximal de requêtes), sinon
+SQL_BUDGET_DEFAUT. ``verifier_budget`` sert les tests : il échoue si une
+vue dépasse son budget.
+"""
+import heapq
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+
+class EnregistreurSQL:
+    """execute_wrapper : nombre, durée totale, plus lentes et répétitions."""
+
+    def __init__(self, nb_lentes=3):
+        self.nb = 0
+        self.duree = 0.0
+        self.nb_lentes = nb_lentes
+        self._lentes = []
+        self._textes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        debut = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duree = time.perf_counter() - debut
+            self.nb += 1
+            self.duree += duree
+            self._textes[sql] += 1
+            # Tas borné : seules les nb_lentes plus lentes sont conservées
+            entree = (duree, self.nb, sql)
+            if len(self._lentes) < self.nb_lentes:
+                heapq.heappush(self._lentes, entree)
+            else:
+                heapq.heappushpop(self._lentes, entree)
+
+    def plus_lentes(self):
+        """[(durée en ms, sql)] de la plus lente à la moins lente."""
+        return [(round(d * 1000, 2), sql)
+                for d, _, sql in sorted(self._lentes, reverse=True)]
+
+    def repetitions(self, minimum=2):
+        """[(nombre, sql)] des SQL exécutés au moins `minimum` fois."""
+        return [(n, sql) for sql, n in self._textes.most_common() if n >= minimum]
+
+
+@contextmanager
+def enregistrer_sql(nb_lentes=3):
+    """Enregistre les requêtes de toutes les connexions du thread courant."""
+    from django.db import connections
+
+    enregistreur = EnregistreurSQL(nb_lentes)
+    with ExitStack() as pile:
+        for alias in connections:
+            pile.enter_context(connections[alias].execute_wrapper(enregistreur))
+        yield enregistreur
+
+
+def budget_vue(nom_url):
+    """Nombre maximal de requêtes admis pour une vue (par nom d'URL)."""
+    from django.conf import settings
+
+    budgets = getattr(settings, 'SQL_BUDGETS', {})
+    return budgets.get(nom_url, getattr(settings, 'SQL_BUDGET_DEFAUT', 20))
+
+
+def verifier_budget(client, url, budget=None, **extra):
+    """
+    GET `url` avec le client de test ; AssertionError si la vue exécute
+    plus de requêtes que son budget (`budget` ou budget_vue). Retourne la
+    réponse.
+    """
+    with enregistrer_sql(nb_lentes=5) as enregistreur:
+        response = client.get(url, **extra)
+    nom = response.resolver_match.url_name if response.resolver_match else url
+    limite = budget if budget is not None else budget_vue(nom)
+    if enregistreur.nb > limite:
+        details = '\n'.join(
+            f'  {n}× {sql[:200]}' for n, sql in enregistreur.repetitions()
+        ) or '\n'.join(f'  {ms} ms  {sql[:200]}' for ms, sql in enregistreur.plus_lentes())
+        raise AssertionError(
+            f'{nom} : {enregistreur.nb} requêtes SQL pour un budget de {limite}\n{details}')
+    return response
@@ -0,0 +1,72 @@
+"""
+Indicateurs des cartes du tableau de bord et du centre d'alertes.
+
+Tous les compteurs sont calculés en une seule requête (agrégation
+conditionnelle ``count(*) FILTER (WHERE …)``, une sous-requête par
+table) au lieu d'un ``count()`` par carte, puis mis en cache pour
+KPI_CACHE_TTL secondes (60 par défaut) : la page d'accueil, ouverte par
+chaque utilisateur après connexion, ne touche la base qu'une fois par
+minute pour ses compteurs.
+"""
+
+CACHE_CLE = 'gestion:kpi'
+
+_SQL_INDICATEURS = """
+    SELECT *
+    FROM (SELECT count(*) AS total_clients FROM stock_cajou.client) c,
+         (SELECT count(*) AS total_produits FROM stock_cajou.produit) p,
+         (SELECT count(*) AS total_producteurs FROM stock_cajou.producteur) pr,
+         (SELECT count(*) AS total_ventes FROM stock_cajou.vente) v,
+         (SELECT count(*) AS total_lots,
+                 count(*) FILTER (WHERE date_expiration >= %(aujourdhui)s
+                                    AND date_expiration <= %(dans_30_jours)s)
+                     AS lots_expiration_proche,
+                 count(*) FILTER (WHERE date_expiration < %(aujourdhui)s)
+                     AS lots_expires,
+                 count(*) FILTER (WHERE date_expiration < %(aujourdhui)s
+                                    AND etat IN ('EN_STOCK', 'PARTIELLEMENT_SORTI'))
+                     AS lots_expires_en_stock
+          FROM stock_cajou.lot) l,
+         (SELECT count(*) AS total_entrepots,
+                 count(*) FILTER (WHERE quantite_disponible <= seuil_critique)
+                     AS entrepots_alerte
+          FROM stock_cajou.entrepot) e,
+         (SELECT count(*) FILTER (WHERE statut IS NULL
+                                     OR statut NOT IN ('LIVREE', 'ANNULEE'))
+                     AS total_commandes
+          FROM stock_cajou.commande) co,
+         (SELECT count(*) AS alertes_total,
+                 count(*) FILTER (WHERE statut = 'ACTIVE') AS alertes_actives,
+                 count(*) FILTER (WHERE statut = 'TRAITEE') AS alertes_traitees,
+                 count(*) FILTER (WHERE statut = 'IGNOREE') AS alertes_ignorees,
+                 count(*) FILTER (WHERE demande_achat_generee) AS alertes_avec_da
+          FROM stock_cajou.alerte_stock) a
+"""
+
+
+def calculer_indicateurs():
+    """Tous les compteurs, en une requête. Retourne un dict nom → entier."""
+    from django.db import connection
+    from django.utils import timezone
+    from datetime import timedelta
+
+    aujourdhui = timezone.localdate()
+    with connection.cursor() as cursor:
+        cursor.execute(_SQL_INDICATEURS, {
+            'aujourdhui': aujourdhui,
+            'dans_30_jours': aujourdhui + timedelta(days=30),
+        })
+        colonnes = [col[0] for col in cursor.description]
+        return dict(zip(colonnes, cursor.fetchone()))
+
+
+def indicateurs():
+    """Compteurs en cache (KPI_CACHE_TTL secondes), recalculés à expiration."""
+    from django.conf import settings
+    from django.core.cache import cache
+
+    valeurs = cache.get(CACHE_CLE)
+    if valeurs is None:
+        valeurs = calculer_indicateurs()
+        cache.set(CACHE_CLE, valeurs, timeout=getattr(settings, 'KPI_CACHE_TTL', 60))
+    return valeurs
@@ -0,0 +1,105 @@
+"""
+Rétention de historique_tracabilite et mouvement_stock : les partitions
+mensuelles plus anciennes que --garder-mois sont détachées, sauvegardées
+dans une archive pg_dump compressée (format custom), vérifiée par
+pg_restore --list, puis supprimées. Aucun DELETE : la table active ne
+garde ni lignes mortes ni index gonflés.
+
+Restauration d'un mois :
+    pg_restore -d <base> archives/historique_tracabilite_p2022_01.dump
+    puis ALTER TABLE stock_cajou.historique_tracabilite ATTACH PARTITION …
+"""
+import os
+import shutil
+import subprocess
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Détache, archive (pg_dump compressé) et supprime les partitions anciennes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--garder-mois', type=int, default=24,
+            help='Mois conservés en base, mois courant exclu (défaut : 24)',
+        )
+        parser.add_argument(
+            '--dossier', default=str(Path(settings.BASE_DIR) / 'archives'),
+            help='Dossier des archives (défaut : archives/)',
+        )
+        parser.add_argument(
+            '--pg-dump', default='pg_dump',
+            help='Exécutable pg_dump (pg_restore est cherché à côté)',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Afficher les partitions concernées sans rien modifier",
+        )
+
+    def handle(self, *args, **options):
+        from django.db import transaction
+        from gestion.partitions import (
+            detacher, partitions_anciennes, rattacher, supprimer,
+        )
+
+        if options['garder_mois'] < 1:
+            raise CommandError('--garder-mois doit être au moins 1.')
+
+        anciennes = partitions_anciennes(options['garder_mois'])
+        if not anciennes:
+            self.stdout.write('Aucune partition à archiver.')
+            return
+        if options['dry_run']:
+            for table, partition, mois in anciennes:
+                self.stdout.write(f'  {partition}  ({table}, {mois:%m/%Y})')
+            self.stdout.write(f'\n{len(anciennes)} partitions seraient archivées.')
+            return
+
+        pg_dump = shutil.which(options['pg_dump'])
+        pg_restore = pg_dump and (shutil.which(str(Path(pg_dump).with_name('pg_restore')))
+                                  or shutil.which('pg_restore'))
+        if not pg_dump or not pg_restore:
+            raise CommandError('pg_dump / pg_restore introuvables (--pg-dump).')
+        dossier = Path(options['dossier'])
+        dossier.mkdir(parents=True, exist_ok=True)
+
+        base = settings.DATABASES['default']
+        env = dict(os.environ, PGPASSWORD=base.get('PASSWORD') or '')
+        connexion = ['-d', base['NAME'], '-h', base.get('HOST') or 'localhost',
+                     '-p', str(base.get('PORT') or 5432)]
+        if base.get('USER'):
+            connexion += ['-U', base['USER']]
+
+        debut = time.perf_counter()
+        for table, partition, mois in anciennes:
+            archive = dossier / f'{partition}.dump'
+            with transaction.atomic():
+                detacher(table, partition)
+
+            proc = subprocess.run(
+                [pg_dump, *connexion, '-Fc', '-Z', '9',
+                 '-t', f'stock_cajou.{partition}', '-f', str(archive)],
+                env=env, capture_output=True, text=True)
+            if proc.returncode == 0:
+                proc = subprocess.run([pg_restore, '--list', str(archive)],
+                                      capture_output=True, text=True)
+            if proc.returncode != 0:
+                # Archive inutilisable : la partition reprend sa place
+                with transaction.atomic():
+                    rattacher(table, partition, mois)
+                raise CommandError(
+                    f'Archivage de {partition} impossible, partition rattachée :\n'
+                    f'{proc.stderr[-2000:]}')
+
+            with transaction.atomic():
+                supprimer(partition)
+            taille = archive.stat().st_size / 1024 / 1024
+            self.stdout.write(self.style.SUCCESS(
+                f'  {partition:<40} → {archive} ({taille:.1f} Mo)'))
+
+        self.stdout.write(
+            f'\n{len(anciennes)} partitions archivées en {time.perf_counter() - debut:.1f} s.')
@@ -0,0 +1,77 @@
+"""
+Backtesting des prévisions de stock : MAE / MAPE par horizon du modèle
+(LinearRegression + saisonnalité Togo) face à des références simples, à
+origine glissante, avec le temps de calcul de chaque fold.
+À relancer à chaque évolution du modèle pour suivre précision et coût.
+"""
+import json
+import time
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Backtesting à origine glissante des prévisions (données synthétiques ou réelles)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source', choices=['synthetique', 'base'], default='synthetique',
+            help='Série évaluée : synthétique (défaut) ou generate_stock_data()',
+        )
+        parser.add_argument('--mois', type=int, default=60,
+                            help='Longueur de la série synthétique (défaut : 60)')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Graine de la série synthétique (défaut : 0)')
+        parser.add_argument('--horizon', type=int, default=12,
+                            help='Horizon de prévision en mois (défaut : 12)')
+        parser.add_argument('--min-train', type=int, default=12,
+                            help="Taille minimale d'entraînement en mois (défaut : 12)")
+        parser.add_argument('--cible', choices=['stock', 'entrees', 'sorties'],
+                            default='stock', help='Grandeur évaluée (défaut : stock)')
+        parser.add_argument('--json', action='store_true',
+                            help='Sortie JSON (suivi entre versions)')
+
+    def handle(self, *args, **options):
+        from gestion.analytics import StockAnalyticsService as S
+
+        capacite_max = 50000
+        if options['source'] == 'base':
+            df, capacite_max = S.generate_stock_data()[:2]
+        else:
+            df = S.serie_synthetique(n_mois=options['mois'], seed=options['seed'],
+                                     capacite_max=capacite_max)
+        if df is None or len(df) <= options['min_train']:
+            raise CommandError(
+                f"Série trop courte ({0 if df is None else len(df)} mois) "
+                f"pour --min-train {options['min_train']}.")
+
+        debut = time.perf_counter()
+        resultat = S.backtester(
+            df, horizon=options['horizon'], min_train=options['min_train'],
+            cible=options['cible'], capacite_max=capacite_max)
+        resultat['duree_s'] = round(time.perf_counter() - debut, 3)
+
+        if options['json']:
+            self.stdout.write(json.dumps(resultat, indent=2))
+            return
+
+        self.stdout.write(f"Folds ({len(resultat['folds'])}) :")
+        for f in resultat['folds']:
+            self.stdout.write(
+                f"  origine {f['origine']}  train {f['nb_train']:>3} mois  "
+                f"horizon {f['horizon']:>2}  fit {f['fit_ms']:>7.2f} ms  "
+                f"prévision {f['prediction_ms']:>7.2f} ms")
+
+        modeles = S.MODELES_BACKTEST
+        self.stdout.write(f"\nMAE / MAPE par horizon (cible : {resultat['cible']}) :")
+        self.stdout.write('           ' + ''.join(f'{m:>24}' for m in modeles))
+        self.stdout.write('   h    n  ' + ''.join(f"{'MAE':>13} {'MAPE':>10}" for _ in modeles))
+        for ligne in resultat['horizons']:
+            cellules = ''
+            for m in modeles:
+                mape = ligne['mape'][m]
+                mape = '—' if mape is None else f'{mape:.1f}%'
+                cellules += f"{ligne['mae'][m]:>13.1f} {mape:>10}"
+            self.stdout.write(f"  {ligne['h']:>2}  {ligne['n']:>3}  {cellules}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"\nBacktesting terminé en {resultat['duree_s']:.2f} s."))
@@ -0,0 +1,69 @@
+"""
+Benchmark du temps de démarrage : mesure l'import de gestion.views avec
+``python -X importtime`` dans un processus neuf et vérifie qu'aucune
+bibliothèque lourde (pandas, NumPy, scikit-learn…) n'est chargée.
+"""
+import os
+import subprocess
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+MODULES_LOURDS = ('pandas', 'numpy', 'sklearn', 'scipy')
+
+
+class Command(BaseCommand):
+    help = "Mesure le temps d'import de gestion.views (python -X importtime)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--module', default='gestion.views',
+            help='Module à importer après django.setup() (défaut : gestion.views)',
+        )
+        parser.add_argument(
+            '--budget-ms', type=float, default=200,
+            help='Temps cumulé maximal pour le module, en ms (défaut : 200)',
+        )
+        parser.add_argument(
+            '--top', type=int, default=10,
+            help='Nombre de modules les plus coûteux à afficher (défaut : 10)',
+        )
+
+    def handle(self, *args, **options):
+        module = options['module']
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c',
+             f'import django; django.setup(); import {module}'],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            raise CommandError(f"Échec de l'import de {module} :\n{proc.stderr[-2000:]}")
+
+        # Lignes « import time: self [us] | cumulative | imported package »
+        mesures = []
+        for ligne in proc.stderr.splitlines():
+            if not ligne.startswith('import time:') or 'self [us]' in ligne:
+                continue
+            self_us, cumul_us, nom = ligne[len('import time:'):].split('|', 2)
+            mesures.append((int(self_us), int(cumul_us), nom.strip()))
+
+        total_ms = sum(m[0] for m in mesures) / 1000
+        module_ms = next((m[1] / 1000 for m in mesures if m[2] == module), 0.0)
+        lourds = sorted({m[2].split('.')[0] for m in mesures} & set(MODULES_LOURDS))
+
+        self.stdout.write(f'Import total (Django compris) : {total_ms:.1f} ms')
+        self.stdout.write(f'Import de {module}        : {module_ms:.1f} ms '
+                          f'(budget {options["budget_ms"]:.0f} ms)')
+        self.stdout.write('\nModules les plus coûteux (temps propre) :')
+        for self_us, cumul_us, nom in sorted(mesures, reverse=True)[:options['top']]:
+            self.stdout.write(f'  {self_us / 1000:>8.1f} ms  {nom}')
+
+        erreurs = []
+        if lourds:
+            erreurs.append(f"bibliothèques lourdes chargées : {', '.join(lourds)}")
+        if module_ms > options['budget_ms']:
+            erreurs.append(f'{module} dépasse le budget ({module_ms:.1f} ms)')
+        if erreurs:
+            raise CommandError(' ; '.join(erreurs))
+        self.stdout.write(self.style.SUCCESS(f'\n{module} reste léger.'))
@@ -0,0 +1,345 @@
+"""
+Banc d'essai des chemins d'écriture du stock, à lancer sur une base
+PostgreSQL jetable (schéma stock_cajou et ses triggers chargés).
+
+Étapes :
+1. Jeu de données à l'échelle voulue, inséré en masse (préfixe BENCH-) :
+   produits, lots par produit, clients, commandes confirmées à réserver.
+2. Chronométrage de chaque service (vente immédiate, confirmation,
+   livraison) et des vues clés (création de lot et de vente, listes,
+   tableau de bord) : p50 / p95 / p99 et nombre de requêtes SQL
+   (gestion.instrumentation.enregistrer_sql).
+3. Résultats écrits en JSON (--output) ; --comparer affiche l'écart avec
+   un fichier d'un commit précédent pour repérer les régressions.
+
+Exemple :
+    DB_NAME=bench_cajou python manage.py benchmark_stock \\
+        --produits 200 --lots-par-produit 20 --commandes 500 \\
+        --output bench/$(git rev-parse --short HEAD).json --comparer bench/main.json
+"""
+import json
+import math
+import subprocess
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+User = get_user_model()
+
+# Préfixes de nom de base acceptés sans --force
+BASES_JETABLES = ('test', 'bench')
+
+# Écart (en %) au-delà duquel une comparaison est signalée
+SEUIL_REGRESSION = 20
+
+
+def _centile(durees, p):
+    """Centile par rang le plus proche sur une liste triée."""
+    if not durees:
+        return 0.0
+    rang = max(0, min(len(durees) - 1, math.ceil(p / 100 * len(durees)) - 1))
+    return durees[rang]
+
+
+def _resumer(mesures):
+    """mesures : [(durée en s, nb requêtes)] → statistiques en ms."""
+    durees = sorted(d * 1000 for d, _ in mesures)
+    requetes = [n for _, n in mesures]
+    return {
+        'iterations': len(mesures),
+        'p50_ms': round(_centile(durees, 50), 2),
+        'p95_ms': round(_centile(durees, 95), 2),
+        'p99_ms': round(_centile(durees, 99), 2),
+        'moyenne_ms': round(sum(durees) / len(durees), 2) if durees else 0.0,
+        'requetes_moy': round(sum(requetes) / len(requetes), 1) if requetes else 0,
+        'requetes_max': max(requetes, default=0),
+    }
+
+
+def _commit_git():
+    try:
+        proc = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              cwd=settings.BASE_DIR, capture_output=True, text=True)
+    except OSError:
+        return None
+    return proc.stdout.strip() or None
+
+
+class Command(BaseCommand):
+    help = "Chronomètre les services et vues d'écriture du stock sur une base jetable"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--produits', type=int, default=50,
+                            help='Nombre de produits créés (défaut : 50)')
+        parser.add_argument('--lots-par-produit', type=int, default=10,
+                            help='Lots créés par produit (défaut : 10)')
+        parser.add_argument('--commandes', type=int, default=200,
+                            help='Commandes confirmées créées (défaut : 200)')
+        parser.add_argument('--iterations', type=int, default=50,
+                            help='Mesures par scénario (défaut : 50)')
+        parser.add_argument('--output',
+                            help='Fichier JSON où écrire les résultats')
+        parser.add_argument('--comparer',
+                            help="Fichier JSON d'une exécution précédente à comparer")
+        parser.add_argument(
+            '--username',
+            help="Utilisateur des opérations (par défaut : premier superuser)",
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help=f"Autorise une base dont le nom ne commence pas par {' / '.join(BASES_JETABLES)}",
+        )
+
+    def handle(self, *args, **options):
+        nom_base = str(settings.DATABASES['default'].get('NAME', ''))
+        if not nom_base.lower().startswith(BASES_JETABLES) and not options['force']:
+            raise CommandError(
+                f"La base « {nom_base} » ne semble pas jetable : le banc d'essai "
+                f"écrit des milliers de lignes. Utilisez une base test*/bench* ou --force.")
+
+        if options['username']:
+            user = User.objects.filter(username=options['username']).first()
+        else:
+            user = User.objects.filter(is_superuser=True).first()
+        if not user:
+            raise CommandError('Aucun utilisateur trouvé pour enregistrer les opérations.')
+
+        iterations = options['iterations']
+        echelle = {
+            'produits': options['produits'],
+            'lots_par_produit': options['lots_par_produit'],
+            'commandes': max(options['commandes'], 2 * iterations),
+        }
+
+        debut = time.perf_counter()
+        jeu = self._semer(user, **echelle)
+        self.stdout.write(
+            f"Jeu de données : {echelle['produits']} produits, "
+            f"{echelle['produits'] * echelle['lots_par_produit']} lots, "
+            f"{echelle['commandes']} commandes ({time.perf_counter() - debut:.1f} s)")
+
+        resultats = {}
+        resultats.update(self._services(jeu, user, iterations))
+        resultats.update(self._vues(jeu, user, iterations))
+
+        rapport = {
+            'meta': {
+                'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'commit': _commit_git(),
+                'base': nom_base,
+                'echelle': echelle,
+                'iterations': iterations,
+            },
+            'resultats': resultats,
+        }
+        precedent = None
+        if options['comparer']:
+            try:
+                with open(options['comparer'], encoding='utf-8') as fichier:
+                    precedent = json.load(fichier)['resultats']
+            except (OSError, ValueError, KeyError) as exc:
+                raise CommandError(f"Lecture de {options['comparer']} impossible : {exc}")
+
+        self._afficher(resultats, precedent)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fichier:
+                json.dump(rapport, fichier, indent=2, ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(f"\nRésultats écrits dans {options['output']}"))
+
+    # ── Jeu de données ──
+
+    def _semer(self, user, produits, lots_par_produit, commandes):
+        """Insère le jeu de données en masse ; retourne les objets utiles aux scénarios."""
+        from gestion.models import (
+            Client, Commande, Entrepot, LigneCommande, Lot, Producteur,
+            Produit, ZoneEntrepot,
+        )
+        from django.db import transaction
+        from django.utils import timezone
+        from datetime import timedelta
+
+        tag = f'BENCH-{int(time.time())}'
+        aujourdhui = timezone.localdate()
+        quantite_lot = Decimal('500.00')
+
+        with transaction.atomic():
+            entrepot = Entrepot.objects.create(
+                nom=tag, capacite_max=Decimal('99999999.00'),
+                seuil_critique=Decimal('0.00'), quantite_disponible=Decimal('0.00'),
+            )
+            zone = ZoneEntrepot.objects.create(
+                nom=tag, entrepot=entrepot, capacite=Decimal('99999999.00'),
+                quantite=Decimal('0.00'),
+            )
+            producteur = Producteur.objects.create(nom=tag)
+            clients = Client.objects.bulk_create(
+                [Client(nom=f'{tag}-C{i}') for i in range(20)])
+            liste_produits = Produit.objects.bulk_create([
+                Produit(
+                    nom=f'{tag}-P{i}', categorie='BENCH',
+                    prix_unitaire=Decimal('1000.00'),
+                    stock_physique=quantite_lot * lots_par_produit,
+                    stock_reserve=Decimal('0.00'),
+                    stock_tampon_comptoir=Decimal('0.00'),
+                    seuil_alerte=Decimal('100.00'),
+                )
+                for i in range(produits)
+            ])
+            Lot.objects.bulk_create([
+                Lot(
+                    code_lot=f'{tag}-L{p}-{j}', produit=produit, producteur=producteur,
+                    zone=zone, user=user, etat='EN_STOCK', qualite='STANDARD',
+                    quantite_initiale=quantite_lot, quantite_restante=quantite_lot,
+                    quantite_reservee=Decimal('0.00'),
+                    date_reception=aujourdhui - timedelta(days=lots_par_produit - j),
+                )
+                for p, produit in enumerate(liste_produits)
+                for j in range(lots_par_produit)
+            ], batch_size=2000)
+
+            liste_commandes = Commande.objects.bulk_create([
+                Commande(
+                    numero_commande=f'{tag}-CMD{i}', client=clients[i % len(clients)],
+                    user=user, date_commande=timezone.now(), statut='CONFIRMEE',
+                    priorite='NORMALE', quantite_demandee=Decimal('10.00'),
+                    quantite_reservee=Decimal('0.00'), quantite_servie=Decimal('0.00'),
+                )
+                for i in range(commandes)
+            ], batch_size=2000)
+            LigneCommande.objects.bulk_create([
+                LigneCommande(
+                    commande=commande, produit=liste_produits[i % len(liste_produits)],
+                    quantite_demandee=Decimal('10.00'), quantite_reservee=Decimal('0.00'),
+                    quantite_servie=Decimal('0.00'), prix_unitaire=Decimal('1000.00'),
+                    statut_ligne='EN_ATTENTE',
+                )
+                for i, commande in enumerate(liste_commandes)
+            ], batch_size=2000)
+
+        return {
+            'tag': tag,
+            'zone': zone,
+            'producteur': producteur,
+            'clients': clients,
+            'produits': liste_produits,
+            'commandes': [c.pk for c in liste_commandes],
+        }
+
+    # ── Scénarios ──
+
+    def _mesurer(self, fonction, iterations):
+        """Appelle fonction(i) `iterations` fois : [(durée, nb requêtes)]."""
+        from gestion.instrumentation import enregistrer_sql
+
+        mesures = []
+        for i in range(iterations):
+            with enregistrer_sql() as enregistreur:
+                debut = time.perf_counter()
+                fonction(i)
+                duree = time.perf_counter() - debut
+            mesures.append((duree, enregistreur.nb))
+        return mesures
+
+    def _services(self, jeu, user, iterations):
+        from gestion.models import Commande, Produit
+        from gestion.services import (
+            confirmer_commande, livrer_commande, traiter_vente_immediate_service,
+        )
+
+        produits = jeu['produits']
+        clients = jeu['clients']
+        # Commandes distinctes par itération : une confirmée ne se reconfirme pas
+        a_confirmer = jeu['commandes'][:iterations]
+
+        def vente_immediate(i):
+            produit = Produit.objects.get(pk=produits[i % len(produits)].pk)
+            traiter_vente_immediate_service(
+                produit, Decimal('5.00'), 'TOTALE', produit.prix_unitaire,
+                clients[i % len(clients)], user)
+
+        def confirmation(i):
+            confirmer_commande(Commande.objects.get(pk=a_confirmer[i]), user)
+
+        def livraison(i):
+            livrer_commande(Commande.objects.get(pk=a_confirmer[i]), user)
+
+        return {
+            'service.vente_immediate': _resumer(self._mesurer(vente_immediate, iterations)),
+            'service.confirmer_commande': _resumer(self._mesurer(confirmation, iterations)),
+            'service.livrer_commande': _resumer(self._mesurer(livraison, iterations)),
+        }
+
+    def _vues(self, jeu, user, iterations):
+        from gestion.models import Lot
+        from django.test import Client as ClientTest
+        from django.urls import reverse
+        from django.utils import timezone
+
+        navigateur = ClientTest()
+        navigateur.force_login(user)
+        produits = jeu['produits']
+        aujourdhui = timezone.localdate().isoformat()
+        lots = list(Lot.objects.filter(code_lot__startswith=jeu['tag'])
+                    .values_list('pk', flat=True)[:iterations])
+
+        def post(nom_url, donnees):
+            def appel(i):
+                response = navigateur.post(reverse(nom_url), donnees(i))
+                if response.status_code >= 400:
+                    raise CommandError(f'{nom_url} : HTTP {response.status_code}')
+            return appel
+
+        def get(nom_url):
+            def appel(i):
+                response = navigateur.get(reverse(nom_url))
+                if response.status_code != 200:
+                    raise CommandError(f'{nom_url} : HTTP {response.status_code}')
+            return appel
+
+        scenarios = {
+            'vue.lots_create': post('lots_create', lambda i: {
+                'produit': produits[i % len(produits)].pk,
+                'producteur': jeu['producteur'].pk, 'zone': jeu['zone'].pk,
+                'quantite_initiale': '250.00', 'qualite': 'STANDARD',
+                'etat': 'EN_STOCK', 'date_reception': aujourdhui,
+            }),
+            'vue.ventes_create': post('ventes_create', lambda i: {
+                'client': jeu['clients'][i % len(jeu['clients'])].pk,
+                'lot': lots[i % len(lots)], 'quantite_vendue': '1.00',
+                'prix_unitaire': '1000.00', 'mode_paiement': 'ESPECES',
+                'type_vente': 'IMMEDIATE',
+            }),
+            'vue.dashboard': get('dashboard'),
+            'vue.commandes_list': get('commandes_list'),
+            'vue.mouvements_list': get('mouvements_list'),
+            'vue.historique_list': get('historique_list'),
+            'vue.alertes_list': get('alertes_list'),
+        }
+        return {nom: _resumer(self._mesurer(appel, iterations))
+                for nom, appel in scenarios.items()}
+
+    # ── Affichage ──
+
+    def _afficher(self, resultats, precedent=None):
+        self.stdout.write(
+            f"\n{'Scénario':<30} {'p50':>9} {'p95':>9} {'p99':>9} {'SQL moy':>8} {'SQL max':>8}")
+        for nom, r in resultats.items():
+            ligne = (f"{nom:<30} {r['p50_ms']:>7.1f}ms {r['p95_ms']:>7.1f}ms "
+                     f"{r['p99_ms']:>7.1f}ms {r['requetes_moy']:>8} {r['requetes_max']:>8}")
+            avant = (precedent or {}).get(nom)
+            if not avant:
+                self.stdout.write(ligne)
+                continue
+            ecart = ((r['p95_ms'] - avant['p95_ms']) / avant['p95_ms'] * 100
+                     if avant['p95_ms'] else 0.0)
+            ligne += f"   p95 {ecart:+.0f} %, SQL {r['requetes_max'] - avant['requetes_max']:+d}"
+            if ecart > SEUIL_REGRESSION or r['requetes_max'] > avant['requetes_max']:
+                self.stdout.write(self.style.ERROR(ligne))
+            elif ecart < -SEUIL_REGRESSION:
+                self.stdout.write(self.style.SUCCESS(ligne))
+            else:
+                self.stdout.write(ligne)
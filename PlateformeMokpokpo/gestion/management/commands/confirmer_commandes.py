@@ -0,0 +1,66 @@
+"""
+Confirmation en masse des commandes (pics de récolte) :
+réserve le stock de toutes les commandes sélectionnées en une seule passe.
+"""
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Confirme en une passe les commandes confirmées ou en attente de réappro'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'ids', nargs='*', type=int,
+            help='Identifiants des commandes (par défaut : toutes les commandes confirmables)',
+        )
+        parser.add_argument(
+            '--username',
+            help="Utilisateur enregistré sur les réservations (par défaut : premier superuser)",
+        )
+
+    def handle(self, *args, **options):
+        from gestion.models import Commande
+        from gestion.services import (
+            confirmer_commandes_batch, COMMANDE_STATUTS_CONFIRMABLES,
+        )
+
+        if options['username']:
+            user = User.objects.filter(username=options['username']).first()
+        else:
+            user = User.objects.filter(is_superuser=True).first()
+        if not user:
+            raise CommandError('Aucun utilisateur trouvé pour enregistrer les réservations.')
+
+        ids = options['ids'] or list(
+            Commande.objects.filter(statut__in=COMMANDE_STATUTS_CONFIRMABLES)
+            .values_list('pk', flat=True)
+        )
+        if not ids:
+            self.stdout.write('Aucune commande à confirmer.')
+            return
+
+        debut = time.perf_counter()
+        rapport = confirmer_commandes_batch(ids, user)
+        duree = time.perf_counter() - debut
+
+        for resultat in rapport.values():
+            ligne = (
+                f'  {resultat["numero_commande"]:<12} {resultat["statut"]:<20} '
+                f'{resultat["quantite_reservee"]:>10}  {resultat["message"]}'
+            )
+            if not resultat['succes']:
+                self.stdout.write(self.style.ERROR(ligne))
+            elif resultat['statut'] == 'RESERVEE':
+                self.stdout.write(self.style.SUCCESS(ligne))
+            else:
+                self.stdout.write(self.style.WARNING(ligne))
+
+        reservees = sum(1 for r in rapport.values() if r['statut'] == 'RESERVEE')
+        self.stdout.write(
+            f'\n{len(rapport)} commandes traitées en {duree:.2f} s '
+            f'— {reservees} entièrement réservées.'
+        )
@@ -0,0 +1,43 @@
+"""
+Création d'avance des partitions mensuelles de historique_tracabilite et
+mouvement_stock (sql/006_partitionnement.sql). À lancer chaque mois (cron) :
+une ligne écrite pour un mois sans partition tombe dans la partition par
+défaut, qui ralentit alors la création des partitions suivantes.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Crée les partitions mensuelles du mois courant et des mois à venir'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mois-avance', type=int, default=3,
+            help="Nombre de mois créés d'avance après le mois courant (défaut : 3)",
+        )
+
+    def handle(self, *args, **options):
+        from django.db import transaction
+        from gestion.partitions import (
+            TABLES_PARTITIONNEES, creer_partitions, est_partitionnee, lignes_par_defaut,
+        )
+
+        manquantes = [t for t in TABLES_PARTITIONNEES if not est_partitionnee(t)]
+        if manquantes:
+            raise CommandError(
+                f"Tables non partitionnées : {', '.join(manquantes)} "
+                f"(appliquer sql/006_partitionnement.sql).")
+
+        with transaction.atomic():
+            creees = creer_partitions(options['mois_avance'])
+
+        for table, noms in creees.items():
+            if noms:
+                self.stdout.write(self.style.SUCCESS(f"{table} : {', '.join(noms)}"))
+            else:
+                self.stdout.write(f'{table} : partitions déjà présentes.')
+            egarees = lignes_par_defaut(table)
+            if egarees:
+                self.stdout.write(self.style.WARNING(
+                    f'  {egarees} lignes datées dans {table}_defaut '
+                    f'(dates hors des partitions créées).'))
@@ -0,0 +1,70 @@
+"""
+Extraction comptable complète (mouvements, ventes, ventes immédiates,
+historique) en CSV ou XLSX, sans limite de durée de requête web.
+Mêmes filtres que les listes, plus une période --du / --au.
+"""
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Exporte mouvements, ventes, ventes immédiates ou historique en CSV / XLSX'
+
+    def add_arguments(self, parser):
+        from gestion.exports import EXPORTS, TAILLE_LOT
+
+        parser.add_argument('nom', choices=sorted(EXPORTS), help='Extraction à produire')
+        parser.add_argument('--format', choices=('csv', 'xlsx'), default='csv')
+        parser.add_argument(
+            '--output', '-o',
+            help='Fichier de sortie (CSV : sortie standard par défaut ; obligatoire en XLSX)',
+        )
+        parser.add_argument('--search', default='', help='Recherche, comme dans la liste')
+        parser.add_argument('--date', default='', help='Ventes : jour (AAAA-MM-JJ)')
+        parser.add_argument('--type-action', default='', help='Historique : type d\'action')
+        parser.add_argument('--du', default='', help='Début de période incluse (AAAA-MM-JJ)')
+        parser.add_argument('--au', default='', help='Fin de période incluse (AAAA-MM-JJ)')
+        parser.add_argument(
+            '--taille-lot', type=int, default=TAILLE_LOT,
+            help=f'Lignes lues par aller-retour du curseur serveur (défaut : {TAILLE_LOT})',
+        )
+
+    def handle(self, *args, **options):
+        from gestion.exports import lignes_csv, ecrire_xlsx
+
+        nom = options['nom']
+        params = {
+            'search': options['search'],
+            'date': options['date'],
+            'type_action': options['type_action'],
+            'du': options['du'],
+            'au': options['au'],
+        }
+        debut = time.perf_counter()
+
+        if options['format'] == 'xlsx':
+            if not options['output']:
+                raise CommandError('--output est obligatoire pour un export XLSX.')
+            try:
+                nb = ecrire_xlsx(nom, params, options['output'], options['taille_lot'])
+            except ImportError:
+                raise CommandError('Export XLSX indisponible : installer openpyxl.')
+        else:
+            sortie = (
+                open(options['output'], 'w', encoding='utf-8', newline='')
+                if options['output'] else sys.stdout
+            )
+            try:
+                nb = -1  # en-tête
+                for ligne in lignes_csv(nom, params, options['taille_lot']):
+                    sortie.write(ligne)
+                    nb += 1
+            finally:
+                if sortie is not sys.stdout:
+                    sortie.close()
+
+        duree = time.perf_counter() - debut
+        # Le CSV peut occuper la sortie standard : le bilan va sur stderr
+        self.stderr.write(self.style.SUCCESS(
+            f'{nb} lignes exportées ({nom}, {options["format"]}) en {duree:.2f} s.'))
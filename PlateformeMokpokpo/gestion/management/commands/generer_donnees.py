@@ -0,0 +1,442 @@
+"""
+Générateur de données synthétiques en volume (bancs d'essai, bases de test).
+
+Contrairement à populate_data, qui passe par les formulaires pour valider
+les opérations une à une, toutes les lignes sont calculées en tableaux
+NumPy puis chargées par ``COPY`` (ou ``bulk_create`` avec --methode bulk) :
+
+- lots reçus suivant la saisonnalité cajou (SAISON_ENTREES_TOGO), sur
+  --months mois avec une tendance de croissance ;
+- ventes tirées après réception suivant SAISON_SORTIES_TOGO, avec leurs
+  mouvements de sortie et leurs entrées d'historique ;
+- stocks des produits, zones et entrepôts cohérents avec les lots.
+
+Les identifiants sont réservés par blocs sur les séquences, les numéros
+(LOT-, VNT-) sur les séquences de numérotation (sql/001). Les triggers
+sont suspendus pendant le chargement (session_replication_role, rôle
+superuser requis), puis flux_stock_mensuel est reconstruit en une passe.
+
+Exemple :
+    python manage.py generer_donnees --producteurs 5000 --lots 200000 --months 60
+"""
+import io
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+
+User = get_user_model()
+
+PRODUITS = [
+    # nom, catégorie, unité, prix unitaire, seuil d'alerte, tampon comptoir, part des lots
+    ('Noix de cajou brutes', 'Brut', 'kg', 350, 100, 25, 0.40),
+    ('Amandes de cajou W320', 'Transformé', 'kg', 3500, 40, 10, 0.15),
+    ('Amandes de cajou W240', 'Transformé', 'kg', 4500, 30, 8, 0.10),
+    ('Brisures de cajou', 'Sous-produit', 'kg', 1500, 25, 5, 0.15),
+    ('Huile de cajou (CNSL)', 'Sous-produit', 'litre', 750, 15, 3, 0.05),
+    ('Pomme de cajou séchée', 'Transformé', 'kg', 1000, 20, 5, 0.15),
+]
+
+NOMS = ['TCHALA', 'AGBEKO', 'KOFFI', 'MENSAH', 'ADJO', 'KPATCHA', 'ESSO',
+        'GNASSINGBE', 'AMEGAN', 'DOSSOU', 'LAWSON', 'ABALO', 'BATCHO', 'TCHAMDJA']
+PRENOMS = ['Kossi', 'Afi', 'Komlan', 'Akossiwa', 'Yao', 'Ama', 'Kodjo',
+           'Abla', 'Edem', 'Essi', 'Mawuli', 'Dzifa', 'Sena', 'Kafui']
+LOCALITES = ['Sotouboua, Région Centrale', 'Tchamba, Région Centrale',
+             'Bassar, Région de la Kara', 'Kara, Région de la Kara',
+             'Atakpamé, Région des Plateaux', 'Kpalimé, Région des Plateaux',
+             'Dapaong, Région des Savanes', 'Tsévié, Région Maritime']
+
+TABLES = [
+    'flux_stock_mensuel', 'flux_stock_mensuel_delta',
+    'demande_achat', 'alerte_stock', 'vente_immediate',
+    'mouvement_stock', 'historique_tracabilite',
+    'vente', 'affectation_lot', 'ligne_commande',
+    'preparation_commande', 'commande',
+    'lot', 'zone_entrepot', 'entrepot',
+    'producteur', 'produit', 'client',
+]
+
+# Bornes des colonnes numeric(10,2)
+MONTANT_MAX = 99999999.99
+
+
+def _reserver_ids(cursor, table, nombre):
+    """Réserve `nombre` identifiants consécutifs sur la séquence de `table`."""
+    import numpy as np
+
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+    sequence = cursor.fetchone()[0]
+    return np.arange(*_reserver_bloc(cursor, sequence, nombre))
+
+
+def _reserver_bloc(cursor, sequence, nombre):
+    """Avance `sequence` de `nombre` valeurs : retourne (première, dernière + 1)."""
+    if nombre < 1:
+        return 0, 0
+    cursor.execute('SELECT setval(%s::regclass, nextval(%s::regclass) + %s - 1)',
+                   [sequence, sequence, nombre])
+    fin = cursor.fetchone()[0]
+    return fin - nombre + 1, fin + 1
+
+
+def _numeros(cursor, prefix, nombre):
+    """Numéros de document (LOT-0001…) pris en bloc sur leur séquence."""
+    import numpy as np
+    from gestion.numerotation import SEQUENCES_NUMEROTATION, formater_numero
+
+    debut, fin = _reserver_bloc(cursor, SEQUENCES_NUMEROTATION[prefix][0], nombre)
+    return np.array([formater_numero(prefix, v) for v in range(debut, fin)], dtype=object)
+
+
+class Command(BaseCommand):
+    help = 'Génère un jeu de données cajou synthétique en volume (COPY / bulk_create)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--producteurs', type=int, default=500,
+                            help='Nombre de producteurs (défaut : 500)')
+        parser.add_argument('--clients', type=int, default=1000,
+                            help='Nombre de clients (défaut : 1000)')
+        parser.add_argument('--lots', type=int, default=20000,
+                            help='Nombre de lots reçus (défaut : 20000)')
+        parser.add_argument('--months', type=int, default=36,
+                            help="Profondeur d'historique en mois (défaut : 36)")
+        parser.add_argument('--ventes-par-lot', type=float, default=3.0,
+                            help='Nombre moyen de ventes par lot (défaut : 3)')
+        parser.add_argument('--entrepots', type=int, default=5,
+                            help='Entrepôts, 4 zones chacun (défaut : 5)')
+        parser.add_argument('--seed', type=int, default=42,
+                            help='Graine du générateur aléatoire (défaut : 42)')
+        parser.add_argument('--methode', choices=('copy', 'bulk'), default='copy',
+                            help='Chargement par COPY (défaut) ou bulk_create')
+        parser.add_argument('--batch-size', type=int, default=50000,
+                            help='Lignes par COPY / bulk_create (défaut : 50000)')
+        parser.add_argument('--avec-triggers', action='store_true',
+                            help='Garde les triggers actifs (plus lent, sans rôle superuser)')
+        parser.add_argument('--clear', action='store_true',
+                            help='Vide les tables métier avant la génération')
+        parser.add_argument(
+            '--username',
+            help="Utilisateur des lignes générées (par défaut : premier superuser)",
+        )
+
+    def handle(self, *args, **options):
+        from django.db import connection, transaction
+        from django.db.utils import DatabaseError
+
+        if options['lots'] < 1 or options['months'] < 1 or options['producteurs'] < 1:
+            raise CommandError('--lots, --months et --producteurs doivent être positifs.')
+
+        if options['username']:
+            user = User.objects.filter(username=options['username']).first()
+        else:
+            user = User.objects.filter(is_superuser=True).first()
+        if not user:
+            raise CommandError('Aucun utilisateur trouvé pour enregistrer les données.')
+
+        self.options = options
+        self.user_id = user.pk
+        debut = time.perf_counter()
+
+        if options['clear']:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'TRUNCATE ' + ', '.join(f'stock_cajou.{t}' for t in TABLES) + ' CASCADE')
+            from gestion.numerotation import resynchroniser_sequences
+            resynchroniser_sequences()
+            self.stdout.write(self.style.SUCCESS('Tables métier vidées.'))
+
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                if not options['avec_triggers']:
+                    cursor.execute("SET LOCAL session_replication_role = 'replica'")
+                comptes = self._generer(cursor)
+                if not options['avec_triggers']:
+                    cursor.execute("SET LOCAL session_replication_role = 'origin'")
+                    cursor.execute('SELECT stock_cajou.fn_flux_mensuel_reconstruire()')
+                    comptes['flux_stock_mensuel'] = cursor.fetchone()[0]
+        except DatabaseError as exc:
+            raise CommandError(
+                f'Échec du chargement : {exc}'
+                '\n(--avec-triggers si le rôle ne peut pas suspendre les triggers)')
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE ' + ', '.join(f'stock_cajou.{t}' for t in comptes))
+
+        duree = time.perf_counter() - debut
+        total = sum(comptes.values())
+        for table, nombre in comptes.items():
+            self.stdout.write(f'  {table:<24} {nombre:>12,}'.replace(',', ' '))
+        self.stdout.write(self.style.SUCCESS(
+            f'\n{total:,} lignes générées en {duree:.1f} s '
+            f'({total / duree:,.0f} lignes/s).'.replace(',', ' ')))
+
+    # ── Chargement ──
+
+    def _charger(self, cursor, modele, frame):
+        """Insère `frame` (colonnes = colonnes SQL) dans la table de `modele`."""
+        taille = self.options['batch_size']
+        table = f'stock_cajou.{modele._meta.db_table}'
+        if self.options['methode'] == 'bulk':
+            for debut in range(0, len(frame), taille):
+                modele.objects.bulk_create(
+                    [modele(**ligne) for ligne in
+                     frame.iloc[debut:debut + taille].to_dict('records')],
+                    batch_size=taille)
+            return len(frame)
+
+        import numpy as np
+
+        # Horodatages formatés en ISO 8601 par NumPy (le formatage de pandas
+        # est ligne à ligne) ; les montants sont déjà arrondis au centime
+        horodatages = frame.select_dtypes('datetimetz').columns
+        frame = frame.assign(**{
+            col: np.datetime_as_string(
+                frame[col].dt.tz_localize(None).to_numpy(), unit='s', timezone='UTC')
+            for col in horodatages
+        })
+        sql = f"COPY {table} ({', '.join(frame.columns)}) FROM STDIN WITH (FORMAT csv)"
+        for debut in range(0, len(frame), taille):
+            tampon = io.StringIO()
+            frame.iloc[debut:debut + taille].to_csv(tampon, header=False, index=False)
+            tampon.seek(0)
+            if hasattr(cursor, 'copy_expert'):  # psycopg2
+                cursor.copy_expert(sql, tampon)
+            else:  # psycopg 3
+                with cursor.copy(sql) as copie:
+                    copie.write(tampon.getvalue())
+        return len(frame)
+
+    # ── Génération ──
+
+    def _generer(self, cursor):
+        import numpy as np
+        import pandas as pd
+        from django.utils import timezone
+        from gestion.analytics import StockAnalyticsService
+        from gestion.models import (
+            Client, Entrepot, HistoriqueTracabilite, Lot, MouvementStock,
+            Producteur, Produit, Vente, ZoneEntrepot,
+        )
+
+        opts = self.options
+        rng = np.random.default_rng(opts['seed'])
+        maintenant = timezone.now()
+        aujourdhui = np.datetime64(timezone.localdate(), 'D')
+        instant = np.datetime64(maintenant.replace(tzinfo=None), 's')
+
+        def horodater(jours):
+            """Dates → horodatages UTC en heures ouvrées, jamais dans le futur."""
+            secondes = rng.integers(7 * 3600, 18 * 3600, len(jours))
+            ts = np.minimum(jours.astype('datetime64[s]') + secondes, instant)
+            return pd.to_datetime(ts, utc=True)
+
+        saison_e = np.array([StockAnalyticsService.SAISON_ENTREES_TOGO[m] for m in range(1, 13)])
+        saison_s = np.array([StockAnalyticsService.SAISON_SORTIES_TOGO[m] for m in range(1, 13)])
+
+        # ── Calendrier : premier jour de chaque mois, du plus ancien au courant ──
+        n_mois = opts['months']
+        debuts = aujourdhui.astype('datetime64[M]') - np.arange(n_mois - 1, -1, -1)
+        jours_mois = ((debuts + 1).astype('datetime64[D]') - debuts.astype('datetime64[D]')).astype(int)
+        mois_calendrier = debuts.astype(int) % 12  # 0 = janvier
+
+        # Tables partitionnées (sql/006) : une partition par mois généré
+        from gestion.partitions import TABLES_PARTITIONNEES, est_partitionnee
+        for table in TABLES_PARTITIONNEES:
+            if est_partitionnee(table):
+                for mois in debuts.astype('datetime64[D]').tolist():
+                    cursor.execute('SELECT stock_cajou.fn_creer_partition_mois(%s, %s)',
+                                   [table, mois])
+
+        # ── Lots : mois de réception ∝ saisonnalité des entrées × tendance ──
+        n_lots = opts['lots']
+        poids = saison_e[mois_calendrier] * (1 + 0.01 * np.arange(n_mois))
+        mois_lot = rng.choice(n_mois, size=n_lots, p=poids / poids.sum())
+        reception = np.minimum(
+            debuts.astype('datetime64[D]')[mois_lot]
+            + (rng.random(n_lots) * jours_mois[mois_lot]).astype(int),
+            aujourdhui)
+        ordre = np.argsort(reception, kind='stable')
+        reception, mois_lot = reception[ordre], mois_lot[ordre]
+
+        n_produits = len(PRODUITS)
+        n_zones = opts['entrepots'] * 4
+        produit_lot = rng.choice(n_produits, size=n_lots, p=[p[6] for p in PRODUITS])
+        zone_lot = rng.integers(0, n_zones, n_lots)
+        producteur_lot = rng.integers(0, opts['producteurs'], n_lots)
+        initiale = np.clip(np.round(rng.lognormal(np.log(500), 0.5, n_lots), 2), 10, 5000)
+
+        # ── Ventes : délai après réception, retenu selon la saisonnalité des sorties ──
+        par_lot = rng.poisson(opts['ventes_par_lot'], n_lots)
+        lot_vente = np.repeat(np.arange(n_lots), par_lot)
+        date_vente = reception[lot_vente] + 1 + rng.exponential(45, len(lot_vente)).astype(int)
+        mois_vente = date_vente.astype('datetime64[M]').astype(int) % 12
+        garde = (date_vente <= aujourdhui) & (rng.random(len(lot_vente)) < saison_s[mois_vente] / saison_s.max())
+        lot_vente, date_vente = lot_vente[garde], date_vente[garde]
+        ordre = np.argsort(date_vente, kind='stable')
+        lot_vente, date_vente = lot_vente[ordre], date_vente[ordre]
+        n_ventes = len(lot_vente)
+
+        # Part vendue de chaque lot (30 % des lots vendus entièrement),
+        # répartie entre ses ventes et arrondie au centime inférieur
+        part = np.where(rng.random(n_lots) < 0.3, 1.0, rng.beta(4, 2, n_lots))
+        poids_vente = rng.random(n_ventes) + 0.1
+        somme = np.bincount(lot_vente, weights=poids_vente, minlength=n_lots)
+        quantite_vente = np.floor(
+            initiale[lot_vente] * part[lot_vente] * poids_vente / somme[lot_vente] * 100) / 100
+        vendu = np.bincount(lot_vente, weights=quantite_vente, minlength=n_lots)
+        # La dernière vente d'un lot vendu entièrement solde les centimes restants
+        derniere = np.full(n_lots, -1)
+        derniere[lot_vente] = np.arange(n_ventes)
+        solde = (part == 1.0) & (derniere >= 0)
+        quantite_vente[derniere[solde]] += np.round(initiale[solde] - vendu[solde], 2)
+        vendu = np.bincount(lot_vente, weights=quantite_vente, minlength=n_lots)
+        restante = np.round(np.maximum(initiale - vendu, 0), 2)
+        quantite_vente = np.round(quantite_vente, 2)
+
+        etat = np.where(restante <= 0, 'EPUISE',
+                        np.where(vendu > 0, 'PARTIELLEMENT_SORTI', 'EN_STOCK')).astype(object)
+        prix_catalogue = np.array([p[3] for p in PRODUITS], dtype=float)
+        prix_vente = np.round(
+            prix_catalogue[produit_lot[lot_vente]] * rng.normal(1.0, 0.05, n_ventes), 2)
+        montant = np.minimum(np.round(quantite_vente * prix_vente, 2), MONTANT_MAX)
+
+        # ── Parents, avec stocks agrégés depuis les lots ──
+        comptes = {}
+        stock_produit = np.bincount(produit_lot, weights=restante, minlength=n_produits)
+        stock_zone = np.bincount(zone_lot, weights=restante, minlength=n_zones)
+        entrepot_zone = np.arange(n_zones) // 4
+        stock_entrepot = np.bincount(entrepot_zone, weights=stock_zone, minlength=opts['entrepots'])
+        dernier_reappro = pd.Series(reception).groupby(produit_lot).max()
+
+        ids_produit = _reserver_ids(cursor, 'stock_cajou.produit', n_produits)
+        comptes['produit'] = self._charger(cursor, Produit, pd.DataFrame({
+            'id': ids_produit,
+            'nom': [p[0] for p in PRODUITS],
+            'categorie': [p[1] for p in PRODUITS],
+            'unite': [p[2] for p in PRODUITS],
+            'prix_unitaire': prix_catalogue,
+            'stock_physique': np.round(stock_produit, 2),
+            'stock_reserve': 0.0,
+            'stock_tampon_comptoir': [float(p[5]) for p in PRODUITS],
+            'seuil_alerte': [float(p[4]) for p in PRODUITS],
+            'quantite_optimale_commande': [float(p[4]) * 5 for p in PRODUITS],
+            'date_dernier_reappro': horodater(
+                dernier_reappro.reindex(range(n_produits)).fillna(aujourdhui).to_numpy()
+                .astype('datetime64[D]')),
+            'date_creation': maintenant,
+        }))
+
+        ids_entrepot = _reserver_ids(cursor, 'stock_cajou.entrepot', opts['entrepots'])
+        capacite_entrepot = np.minimum(np.maximum(stock_entrepot * 1.5, 50000), MONTANT_MAX)
+        comptes['entrepot'] = self._charger(cursor, Entrepot, pd.DataFrame({
+            'id': ids_entrepot,
+            'nom': [f'Entrepôt {i + 1}' for i in range(opts['entrepots'])],
+            'localisation': rng.choice(LOCALITES, opts['entrepots']),
+            'capacite_max': np.round(capacite_entrepot, 2),
+            'seuil_critique': np.round(capacite_entrepot * 0.1, 2),
+            'quantite_disponible': np.round(stock_entrepot, 2),
+            'statut': 'OPERATIONNEL',
+        }))
+
+        ids_zone = _reserver_ids(cursor, 'stock_cajou.zone_entrepot', n_zones)
+        comptes['zone_entrepot'] = self._charger(cursor, ZoneEntrepot, pd.DataFrame({
+            'id': ids_zone,
+            'nom': [f'Zone {chr(65 + i % 4)}' for i in range(n_zones)],
+            'capacite': np.round(np.minimum(np.maximum(stock_zone * 1.5, 12500), MONTANT_MAX), 2),
+            'quantite': np.round(stock_zone, 2),
+            'statut': 'DISPONIBLE',
+            'entrepot_id': ids_entrepot[entrepot_zone],
+        }))
+
+        ids_producteur = _reserver_ids(cursor, 'stock_cajou.producteur', opts['producteurs'])
+        comptes['producteur'] = self._charger(cursor, Producteur, pd.DataFrame({
+            'id': ids_producteur,
+            'nom': rng.choice(NOMS, opts['producteurs']),
+            'prenom': rng.choice(PRENOMS, opts['producteurs']),
+            'localisation': rng.choice(LOCALITES, opts['producteurs']),
+            'numero_identification': [f'PROD-TG-{i + 1:05d}' for i in range(opts['producteurs'])],
+            'type_producteur': rng.choice(['INDIVIDUEL', 'COOPERATIVE'], opts['producteurs'], p=[0.85, 0.15]),
+            'statut': 'ACTIF',
+            'date_inscription': maintenant,
+        }))
+
+        n_clients = max(opts['clients'], 1)
+        ids_client = _reserver_ids(cursor, 'stock_cajou.client', n_clients)
+        comptes['client'] = self._charger(cursor, Client, pd.DataFrame({
+            'id': ids_client,
+            'nom': rng.choice(NOMS, n_clients),
+            'prenom': rng.choice(PRENOMS, n_clients),
+            'type_client': rng.choice(['REGULIER', 'VIP', 'OCCASIONNEL'], n_clients, p=[0.6, 0.1, 0.3]),
+            'date_inscription': maintenant,
+        }))
+
+        # ── Lots ──
+        ids_lot = _reserver_ids(cursor, 'stock_cajou.lot', n_lots)
+        codes_lot = _numeros(cursor, 'LOT', n_lots)
+        reception_ts = horodater(reception)
+        comptes['lot'] = self._charger(cursor, Lot, pd.DataFrame({
+            'id': ids_lot,
+            'code_lot': codes_lot,
+            'quantite_initiale': initiale,
+            'quantite_restante': restante,
+            'quantite_reservee': 0.0,
+            'qualite': rng.choice(['PREMIUM', 'STANDARD', 'ECONOMIQUE'], n_lots, p=[0.2, 0.6, 0.2]),
+            'etat': etat,
+            'date_reception': reception.astype(object),
+            'date_expiration': (reception + 365).astype(object),
+            'produit_id': ids_produit[produit_lot],
+            'producteur_id': ids_producteur[producteur_lot],
+            'zone_id': ids_zone[zone_lot],
+            'user_id': self.user_id,
+            'date_creation': reception_ts,
+        }))
+
+        # ── Ventes ──
+        ids_vente = _reserver_ids(cursor, 'stock_cajou.vente', n_ventes)
+        numeros_vente = _numeros(cursor, 'VNT', n_ventes)
+        vente_ts = horodater(date_vente)
+        comptes['vente'] = self._charger(cursor, Vente, pd.DataFrame({
+            'id': ids_vente,
+            'numero_vente': numeros_vente,
+            'date_vente': vente_ts,
+            'quantite_vendue': quantite_vente,
+            'prix_unitaire': prix_vente,
+            'montant_total': montant,
+            'mode_paiement': rng.choice(['ESPECES', 'MOBILE_MONEY', 'VIREMENT', 'CHEQUE'],
+                                        n_ventes, p=[0.45, 0.35, 0.15, 0.05]),
+            'client_id': ids_client[rng.integers(0, n_clients, n_ventes)],
+            'lot_id': ids_lot[lot_vente],
+            'user_id': self.user_id,
+            'type_vente': 'IMMEDIATE',
+        }))
+
+        # ── Mouvements : une entrée par lot, une sortie par vente ──
+        n_mouvements = n_lots + n_ventes
+        comptes['mouvement_stock'] = self._charger(cursor, MouvementStock, pd.DataFrame({
+            'id': _reserver_ids(cursor, 'stock_cajou.mouvement_stock', n_mouvements),
+            'date_mouvement': reception_ts.append(vente_ts),
+            'type_mouvement': np.repeat(np.array(['ENTREE', 'SORTIE'], dtype=object), [n_lots, n_ventes]),
+            'quantite': np.concatenate([initiale, quantite_vente]),
+            'motif': np.concatenate([
+                'Réception lot ' + codes_lot, 'Vente ' + numeros_vente]),
+            'lot_id': np.concatenate([ids_lot, ids_lot[lot_vente]]),
+            'zone_destination_id': np.concatenate([
+                ids_zone[zone_lot].astype(object), np.full(n_ventes, None, dtype=object)]),
+            'user_id': self.user_id,
+            'valide': True,
+        }))
+
+        # ── Historique : création des lots et ventes ──
+        comptes['historique_tracabilite'] = self._charger(cursor, HistoriqueTracabilite, pd.DataFrame({
+            'id': _reserver_ids(cursor, 'stock_cajou.historique_tracabilite', n_mouvements),
+            'date_action': reception_ts.append(vente_ts),
+            'type_action': np.repeat(np.array(['creation', 'vente'], dtype=object), [n_lots, n_ventes]),
+            'description': np.concatenate([
+                'Lot ' + codes_lot + ' créé — ' + np.char.mod('%.2f', initiale) + ' unités',
+                'Vente ' + numeros_vente + ' — ' + np.char.mod('%.2f', quantite_vente)
+                + ' unités à ' + np.char.mod('%.2f', montant) + ' XOF',
+            ]),
+            'lot_id': np.concatenate([ids_lot, ids_lot[lot_vente]]),
+            'user_id': self.user_id,
+        }))
+        return comptes
@@ -2,6 +2,7 @@
 Commande de gestion pour peupler la base de données avec des données
 réalistes du secteur cajou au Togo, en passant par les formulaires/vues
 pour valider toutes les opérations CRUD.
+Pour des volumes de banc d'essai, voir generer_donnees (COPY en masse).
 """
 import os
 import time
@@ -41,6 +42,7 @@ class Command(BaseCommand):
                 # Désactiver les triggers pour pouvoir supprimer
                 cursor.execute("SET session_replication_role = 'replica'")
                 tables = [
+                    'flux_stock_mensuel', 'flux_stock_mensuel_delta',
                     'demande_achat', 'alerte_stock', 'vente_immediate',
                     'mouvement_stock', 'historique_tracabilite',
                     'vente', 'affectation_lot', 'ligne_commande',
@@ -51,6 +53,9 @@ class Command(BaseCommand):
                 for t in tables:
                     cursor.execute(f'DELETE FROM stock_cajou.{t}')
                 cursor.execute("SET session_replication_role = 'origin'")
+            # Repartir de LOT-0001, VNT-0001…
+            from gestion.numerotation import resynchroniser_sequences
+            resynchroniser_sequences()
             self.stdout.write(self.style.SUCCESS('  Données supprimées.'))
 
         # Récupérer ou créer le superuser
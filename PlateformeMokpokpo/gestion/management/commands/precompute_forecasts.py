@@ -0,0 +1,58 @@
+"""
+Précalcul des prévisions de stock (global, par produit, par entrepôt),
+enregistrées dans prevision_snapshot pour la page Prévisions.
+
+Exemple de planification (cron, toutes les heures) :
+    0 * * * *  cd /app && python manage.py precompute_forecasts
+"""
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Calcule et enregistre les prévisions de stock (instantané lu par la page Prévisions)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mois', type=int, default=12,
+            help='Horizon des prévisions par produit/entrepôt en mois (défaut : 12)',
+        )
+        parser.add_argument(
+            '--workers', type=int,
+            help='Nombre de processus (défaut : FORECAST_WORKERS)',
+        )
+        parser.add_argument(
+            '--conserver', type=int, default=5,
+            help='Nombre de générations conservées (défaut : 5)',
+        )
+
+    def handle(self, *args, **options):
+        from gestion.analytics import StockAnalyticsService
+
+        rapport = StockAnalyticsService.precalculer(
+            n_months=options['mois'], workers=options['workers'],
+            conserver=max(1, options['conserver']))
+
+        for titre, cle in (('Produits', 'produits'), ('Entrepôts', 'entrepots')):
+            self.stdout.write(f'\n{titre} :')
+            for r in rapport['groupes'][cle]:
+                if r['no_data']:
+                    self.stdout.write(f"  {r['libelle']:<30} données insuffisantes")
+                    continue
+                ligne = (
+                    f"  {r['libelle']:<30} stock {r['stock_actuel']:>10} → "
+                    f"{r['stock_fin_horizon']:>10}  ({r['fiabilite']})"
+                )
+                if r['risk_analysis']['rupture_estimee']:
+                    self.stdout.write(self.style.WARNING(
+                        f"{ligne}  rupture : {r['risk_analysis']['rupture_estimee']}"))
+                else:
+                    self.stdout.write(ligne)
+
+        self.stdout.write(
+            f"\nPrévision globale : {rapport['duree_global']:.2f} s — "
+            f"par produit/entrepôt : {rapport['duree_groupes']:.2f} s"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{rapport['nb_snapshots']} instantanés enregistrés "
+            f"({rapport['genere_le']:%Y-%m-%d %H:%M}), "
+            f"{rapport['nb_purges']} anciens supprimés."))
@@ -0,0 +1,39 @@
+"""
+Reconstruction de la table des flux mensuels (flux_stock_mensuel) à partir
+de l'historique complet : backfill initial, ou après un import effectué
+triggers désactivés.
+
+--compacter : reporte seulement les deltas écrits par les triggers
+(flux_stock_mensuel_delta) dans les cumuls. À lancer en cron, toutes les
+quelques minutes :
+    */5 * * * * python manage.py rebuild_flux_stock --compacter
+"""
+import time
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Reconstruit la table flux_stock_mensuel depuis mouvements, lots et ventes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--compacter', action='store_true',
+                            help='Reporte seulement les deltas en attente dans les cumuls')
+
+    def handle(self, *args, **options):
+        from django.db import connection, transaction
+
+        debut = time.perf_counter()
+        with transaction.atomic(), connection.cursor() as cursor:
+            if options['compacter']:
+                cursor.execute('SELECT stock_cajou.fn_flux_mensuel_compacter()')
+            else:
+                cursor.execute('SELECT stock_cajou.fn_flux_mensuel_reconstruire()')
+            nb_lignes = cursor.fetchone()[0]
+        duree = time.perf_counter() - debut
+
+        if options['compacter']:
+            self.stdout.write(self.style.SUCCESS(
+                f'{nb_lignes} deltas de flux mensuels compactés en {duree:.2f} s.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'{nb_lignes} lignes de flux mensuels reconstruites en {duree:.2f} s.'))
@@ -0,0 +1,47 @@
+"""
+Balayage nocturne des alertes de stock : réévalue tout le catalogue en
+quelques requêtes (après un import, une correction d'inventaire…).
+"""
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Crée les alertes (et DA) manquantes et résout les alertes des produits réapprovisionnés'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Afficher ce qui serait fait sans rien écrire",
+        )
+        parser.add_argument(
+            '--username',
+            help="Créateur des demandes d'achat (par défaut : premier superuser)",
+        )
+
+    def handle(self, *args, **options):
+        from gestion.alertes import balayer_alertes
+
+        if options['username']:
+            user = User.objects.filter(username=options['username']).first()
+            if not user:
+                raise CommandError(f"Utilisateur « {options['username']} » introuvable.")
+        else:
+            user = User.objects.filter(is_superuser=True).first()
+            if not user:
+                self.stdout.write(self.style.WARNING(
+                    "Aucun superuser : les alertes seront créées sans demande d'achat."))
+
+        debut = time.perf_counter()
+        compteurs = balayer_alertes(user=user, dry_run=options['dry_run'])
+        duree = time.perf_counter() - debut
+
+        prefixe = '[simulation] ' if options['dry_run'] else ''
+        self.stdout.write(f"{prefixe}Alertes créées      : {compteurs['alertes_creees']}")
+        self.stdout.write(f"{prefixe}Demandes d'achat    : {compteurs['demandes_creees']}")
+        self.stdout.write(f"{prefixe}Alertes résolues    : {compteurs['alertes_resolues']}")
+        self.stdout.write(f"{prefixe}Alertes actualisées : {compteurs['alertes_actualisees']}")
+        self.stdout.write(self.style.SUCCESS(f'Balayage terminé en {duree:.2f} s.'))
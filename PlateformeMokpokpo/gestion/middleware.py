@@ -0,0 +1,98 @@
+"""
+Middlewares de l'application gestion.
+"""
+import json
+import logging
+import time
+
+from django.core.exceptions import MiddlewareNotUsed
+
+from .alertes import collecte_alertes
+from .audit import collecte_historique
+
+
+logger = logging.getLogger('gestion.sql')
+
+
+class CollecteAlertesMiddleware:
+    """
+    Regroupe les signalements d'alertes de stock émis pendant une requête :
+    chaque produit touché est évalué une seule fois, après le commit.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with collecte_alertes():
+            return self.get_response(request)
+
+
+class CollecteHistoriqueMiddleware:
+    """
+    Regroupe les entrées d'historique validées pendant une requête :
+    un seul bulk_create à la fin (ou remise au thread d'écriture).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with collecte_historique():
+            return self.get_response(request)
+
+
+class InstrumentationSQLMiddleware:
+    """
+    Mesure les requêtes SQL de chaque requête HTTP (SQL_INSTRUMENTATION) :
+    en-tête Server-Timing, une ligne de log JSON (logger gestion.sql) et
+    un avertissement si la vue dépasse son budget (SQL_BUDGETS).
+
+    Les requêtes exécutées pendant la diffusion d'une StreamingHttpResponse
+    (exports) ont lieu après la vue et ne sont pas comptées.
+    """
+
+    def __init__(self, get_response):
+        from django.conf import settings
+
+        if not getattr(settings, 'SQL_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        from .instrumentation import budget_vue, enregistrer_sql
+
+        debut = time.perf_counter()
+        with enregistrer_sql() as enregistreur:
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - debut) * 1000
+        db_ms = enregistreur.duree * 1000
+
+        response['Server-Timing'] = (
+            f'db;dur={db_ms:.1f};desc="{enregistreur.nb} requetes SQL", '
+            f'app;dur={total_ms - db_ms:.1f}'
+        )
+
+        vue = request.resolver_match.url_name if request.resolver_match else None
+        budget = budget_vue(vue)
+        ligne = {
+            'vue': vue,
+            'methode': request.method,
+            'chemin': request.path,
+            'statut': response.status_code,
+            'requetes': enregistreur.nb,
+            'budget': budget,
+            'db_ms': round(db_ms, 1),
+            'total_ms': round(total_ms, 1),
+            'plus_lentes': [
+                {'ms': ms, 'sql': sql[:300]} for ms, sql in enregistreur.plus_lentes()
+            ],
+            'repetees': [
+                {'nb': n, 'sql': sql[:300]} for n, sql in enregistreur.repetitions(3)[:3]
+            ],
+        }
+        if enregistreur.nb > budget:
+            logger.warning(json.dumps(ligne, ensure_ascii=False))
+        else:
+            logger.info(json.dumps(ligne, ensure_ascii=False))
+        return response
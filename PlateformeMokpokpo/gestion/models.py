@@ -1,5 +1,7 @@
 ﻿from django.db import models
 from django.conf import settings
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.core.serializers.json import DjangoJSONEncoder
 
 
 # ==================== CHOICES ====================
@@ -131,6 +133,21 @@ VENTE_IMMEDIATE_TYPE_CHOICES = [
     ('URGENTE', 'Urgente'),
 ]
 
+PREVISION_PORTEE_CHOICES = [
+    ('GLOBAL', 'Global'),
+    ('PRODUIT', 'Produit'),
+    ('ENTREPOT', 'Entrepôt'),
+]
+
+FLUX_TYPE_CHOICES = [
+    ('MVT_ENTREE', 'Mouvements d\'entrée'),
+    ('MVT_SORTIE', 'Mouvements de sortie'),
+    ('MVT_AUTRE', 'Autres mouvements'),
+    ('RECEPTION_LOT', 'Réception de lots'),
+    ('VENTE', 'Ventes'),
+    ('VENTE_IMMEDIATE', 'Ventes immédiates'),
+]
+
 
 # ==================== MODELS ====================
 
@@ -424,6 +441,12 @@ class HistoriqueTracabilite(models.Model):
     )
     ancienne_valeur = models.JSONField(blank=True, null=True)
     nouvelle_valeur = models.JSONField(blank=True, null=True)
+    # Index plein texte de la description (sql/005_recherche.sql)
+    recherche = models.GeneratedField(
+        expression=SearchVector('description', config='french'),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
 
     class Meta:
         managed = False
@@ -611,3 +634,42 @@ class VenteImmediate(models.Model):
 
     def __str__(self):
         return self.numero_vente
+
+
+class FluxStockMensuel(models.Model):
+    """
+    Cumul mensuel des flux, tenu à jour par triggers (sql/002_flux_stock_mensuel.sql).
+    Lu dans la vue flux_stock_mensuel_courant : cumuls compactés plus deltas
+    en attente, donc toujours à jour (lecture seule).
+    """
+    mois = models.DateField()
+    produit = models.ForeignKey(Produit, models.DO_NOTHING)
+    # 0 = flux non imputé à un entrepôt (ventes immédiates)
+    entrepot_id = models.BigIntegerField(default=0)
+    type_flux = models.CharField(max_length=20, choices=FLUX_TYPE_CHOICES)
+    quantite = models.DecimalField(max_digits=14, decimal_places=2)
+    nb_operations = models.IntegerField()
+
+    class Meta:
+        managed = False
+        db_table = 'flux_stock_mensuel_courant'
+
+    def __str__(self):
+        return f"{self.mois:%Y-%m} {self.produit_id} {self.type_flux} ({self.quantite})"
+
+
+class PrevisionSnapshot(models.Model):
+    """Prévision précalculée (sql/003_prevision_snapshot.sql)."""
+    genere_le = models.DateTimeField()
+    portee = models.CharField(max_length=20, choices=PREVISION_PORTEE_CHOICES)
+    objet_id = models.BigIntegerField(blank=True, null=True)
+    n_mois = models.IntegerField()
+    duree_calcul_ms = models.IntegerField(blank=True, null=True)
+    contexte = models.JSONField(encoder=DjangoJSONEncoder)
+
+    class Meta:
+        managed = False
+        db_table = 'prevision_snapshot'
+
+    def __str__(self):
+        return f"{self.portee} {self.objet_id or ''} {self.genere_le:%Y-%m-%d %H:%M}"
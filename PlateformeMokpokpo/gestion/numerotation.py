@@ -0,0 +1,75 @@
+"""
+Numérotation des documents : LOT-0001, VNT-0001, CMD-0001, VI-0001, DA-0001…
+
+Chaque préfixe est adossé à une séquence PostgreSQL
+(cf. sql/001_sequences_numerotation.sql). ``nextval()`` est atomique et ne
+pose aucun verrou : deux requêtes concurrentes ne reçoivent jamais le même
+numéro et le coût d'une allocation ne dépend plus de la taille des tables.
+"""
+from django.db import connection
+
+
+# préfixe → (séquence, table, colonne du numéro)
+SEQUENCES_NUMEROTATION = {
+    'LOT': ('stock_cajou.seq_numero_lot', 'stock_cajou.lot', 'code_lot'),
+    'VNT': ('stock_cajou.seq_numero_vente', 'stock_cajou.vente', 'numero_vente'),
+    'CMD': ('stock_cajou.seq_numero_commande', 'stock_cajou.commande', 'numero_commande'),
+    'VI': ('stock_cajou.seq_numero_vente_immediate', 'stock_cajou.vente_immediate', 'numero_vente'),
+    'DA': ('stock_cajou.seq_numero_demande_achat', 'stock_cajou.demande_achat', 'numero_da'),
+}
+
+
+def formater_numero(prefix, valeur):
+    """Ex : ('LOT', 12) → 'LOT-0012'."""
+    return f'{prefix}-{valeur:04d}'
+
+
+def allouer_numeros(prefix, nombre=1):
+    """
+    Réserve `nombre` numéros pour `prefix` en un seul aller-retour.
+    Les numéros sont uniques et croissants ; un numéro alloué dans une
+    transaction annulée est perdu (trou dans la numérotation).
+    """
+    sequence = SEQUENCES_NUMEROTATION[prefix][0]
+    if nombre < 1:
+        return []
+    with connection.cursor() as cur:
+        cur.execute(
+            'SELECT nextval(%s::regclass) FROM generate_series(1, %s)',
+            [sequence, nombre],
+        )
+        return [formater_numero(prefix, valeur) for (valeur,) in cur.fetchall()]
+
+
+def allouer_numero(prefix):
+    """Réserve un seul numéro pour `prefix`."""
+    return allouer_numeros(prefix, 1)[0]
+
+
+def apercu_numero(prefix):
+    """
+    Prochain numéro probable, sans le consommer (pré-remplissage des
+    formulaires). Le numéro définitif est alloué à l'enregistrement.
+    """
+    sequence = SEQUENCES_NUMEROTATION[prefix][0]
+    with connection.cursor() as cur:
+        cur.execute(
+            f'SELECT CASE WHEN is_called THEN last_value + 1 ELSE last_value END '
+            f'FROM {sequence}'
+        )
+        return formater_numero(prefix, cur.fetchone()[0])
+
+
+def resynchroniser_sequences():
+    """
+    Recale chaque séquence sur le plus grand numéro présent en base
+    (après une purge ou un import en masse).
+    """
+    with connection.cursor() as cur:
+        for prefix, (sequence, table, colonne) in SEQUENCES_NUMEROTATION.items():
+            cur.execute(
+                f"SELECT setval(%s::regclass, "
+                f"COALESCE(MAX(substring({colonne} FROM '([0-9]+)$')::bigint), 0) + 1, "
+                f"false) FROM {table} WHERE {colonne} LIKE %s",
+                [sequence, f'{prefix}-%'],
+            )
@@ -0,0 +1,171 @@
+"""
+Pagination par clé (keyset / seek) des listes de gestion.
+
+Chaque page est lue à partir de la dernière ligne affichée :
+``WHERE cle <= v AND (cle < v OR id < i) ORDER BY cle DESC, id DESC LIMIT n``
+au lieu d'un OFFSET. Avec l'index (cle DESC NULLS LAST, id DESC) de
+sql/004_index_pagination.sql, le coût d'une page ne dépend pas de sa
+profondeur.
+
+Le curseur (valeur de la clé + id départageant les égalités) est encodé
+en base64 dans la query string (``?apres=`` / ``?avant=``) ; les autres
+paramètres (recherche, filtres) sont conservés dans les liens.
+
+Les clés de tri sont nullables : les lignes sans date forment une queue
+parcourue après les autres (NULLS LAST), par id seul.
+
+Les totaux affichés en tête de liste (``totaux``) ne sont pas recomptés
+à chaque page : ils sont mis en cache par liste et jeu de filtres.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+PARAM_APRES = 'apres'
+PARAM_AVANT = 'avant'
+
+
+def encoder_curseur(valeur, pk):
+    # str() garde les microsecondes (DjangoJSONEncoder les tronque en ms)
+    brut = json.dumps([valeur, pk], default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(brut.encode()).decode().rstrip('=')
+
+
+def decoder_curseur(curseur, champ):
+    """(valeur, pk) ou None si le curseur est illisible."""
+    try:
+        brut = base64.urlsafe_b64decode(curseur + '=' * (-len(curseur) % 4))
+        valeur, pk = json.loads(brut)
+        return (None if valeur is None else champ.to_python(valeur)), int(pk)
+    except (ValueError, TypeError, ValidationError):
+        return None
+
+
+def _segments(queryset, cle, decroissant, curseur, en_avant):
+    """
+    Requêtes successives (non nulles puis nulles en avant, l'inverse en
+    arrière) dont la concaténation donne les lignes après/avant le curseur.
+    """
+    # Sens de comparaison dans l'ordre de parcours
+    suivant = 'lt' if decroissant == en_avant else 'gt'
+    large = 'lte' if suivant == 'lt' else 'gte'
+    ordre = [f'-{cle}', '-pk'] if suivant == 'lt' else [cle, 'pk']
+    ordre_nuls = ['-pk'] if suivant == 'lt' else ['pk']
+
+    non_nuls = queryset.filter(**{f'{cle}__isnull': False}).order_by(*ordre)
+    nuls = queryset.filter(**{f'{cle}__isnull': True}).order_by(*ordre_nuls)
+
+    if curseur is None:
+        return [non_nuls, nuls] if en_avant else [nuls, non_nuls]
+
+    valeur, pk = curseur
+    if valeur is None:
+        nuls = nuls.filter(**{f'pk__{suivant}': pk})
+        return [nuls] if en_avant else [nuls, non_nuls]
+
+    # cle <= v reste une condition d'index ; l'égalité est départagée par l'id
+    non_nuls = non_nuls.filter(**{f'{cle}__{large}': valeur}).filter(
+        Q(**{f'{cle}__{suivant}': valeur}) | Q(**{f'pk__{suivant}': pk}))
+    return [non_nuls, nuls] if en_avant else [non_nuls]
+
+
+def _lire(segments, n):
+    lignes = []
+    for qs in segments:
+        lignes.extend(qs[:n - len(lignes)])
+        if len(lignes) >= n:
+            break
+    return lignes
+
+
+def paginer(request, queryset, tri, par_page=None):
+    """
+    Page courante d'un queryset trié sur une clé unique, ex. ``'-date_vente'``
+    ou une annotation (``'-pertinence'``) ; l'id sert de second critère. Retourne (lignes, page) où ``page``
+    alimente gestion/_pagination.html.
+    """
+    from django.conf import settings
+
+    par_page = par_page or getattr(settings, 'LISTE_PAR_PAGE', 50)
+    decroissant = tri.startswith('-')
+    cle = tri.lstrip('-')
+    if cle in queryset.query.annotations:
+        # Clé calculée (ex. pertinence de recherche)
+        champ = queryset.query.annotations[cle].output_field
+    else:
+        champ = queryset.model._meta.get_field(cle)
+
+    curseur, en_avant = None, True
+    if request.GET.get(PARAM_AVANT):
+        curseur = decoder_curseur(request.GET[PARAM_AVANT], champ)
+        en_avant = curseur is None
+    elif request.GET.get(PARAM_APRES):
+        curseur = decoder_curseur(request.GET[PARAM_APRES], champ)
+
+    # Une ligne de plus pour savoir s'il reste une page dans ce sens
+    lignes = _lire(_segments(queryset, cle, decroissant, curseur, en_avant), par_page + 1)
+    reste = len(lignes) > par_page
+    if not en_avant and not reste:
+        # Retour en tête de liste : afficher une première page complète
+        curseur, en_avant = None, True
+        lignes = _lire(_segments(queryset, cle, decroissant, None, True), par_page + 1)
+        reste = len(lignes) > par_page
+    lignes = lignes[:par_page]
+    if en_avant:
+        a_suivante, a_precedente = reste, curseur is not None
+    else:
+        lignes.reverse()
+        a_suivante, a_precedente = True, reste
+
+    def _url(param, ligne):
+        params = request.GET.copy()
+        params.pop(PARAM_APRES, None)
+        params.pop(PARAM_AVANT, None)
+        params[param] = encoder_curseur(getattr(ligne, cle), ligne.pk)
+        return '?' + params.urlencode()
+
+    debut = request.GET.copy()
+    debut.pop(PARAM_APRES, None)
+    debut.pop(PARAM_AVANT, None)
+
+    page = {
+        'par_page': par_page,
+        'nombre': len(lignes),
+        'a_suivante': a_suivante and bool(lignes),
+        'a_precedente': a_precedente and bool(lignes),
+        'url_suivante': _url(PARAM_APRES, lignes[-1]) if lignes else '',
+        'url_precedente': _url(PARAM_AVANT, lignes[0]) if lignes else '',
+        'url_premiere': '?' + debut.urlencode(),
+    }
+    return lignes, page
+
+
+def totaux(nom, queryset, params=None, **agregats):
+    """
+    Totaux d'une liste paginée (par défaut ``nb`` : lignes filtrées), mis
+    en cache LISTE_TOTAUX_CACHE_TTL secondes par liste et jeu de filtres
+    ``params`` (hors curseur) : le COUNT parcourt tout le résultat filtré,
+    il est fait une fois, pas à chaque page. Retourne le dict d'aggregate().
+    """
+    import hashlib
+
+    from django.conf import settings
+    from django.core.cache import cache
+    from django.db.models import Count
+
+    filtres = sorted(
+        (param, valeur)
+        for param, valeurs in (params.lists() if params is not None else [])
+        if param not in (PARAM_APRES, PARAM_AVANT)
+        for valeur in valeurs
+    )
+    empreinte = hashlib.sha1(json.dumps(filtres).encode()).hexdigest()
+    cle = f'gestion:totaux:{nom}:{empreinte}'
+    valeurs = cache.get(cle)
+    if valeurs is None:
+        valeurs = queryset.aggregate(**(agregats or {'nb': Count('pk')}))
+        cache.set(cle, valeurs, timeout=getattr(settings, 'LISTE_TOTAUX_CACHE_TTL', 60))
+    return valeurs
@@ -0,0 +1,118 @@
+"""
+Partitions mensuelles de historique_tracabilite et mouvement_stock
+(sql/006_partitionnement.sql) : une partition <table>_pAAAA_MM par mois
+(bornes en UTC), plus <table>_defaut pour les lignes sans date.
+
+- ``creer_partitions`` crée d'avance les mois à venir (cron mensuel,
+  python manage.py creer_partitions) ;
+- ``partitions_anciennes`` / ``detacher`` / ``rattacher`` servent la
+  rétention (python manage.py archiver_partitions).
+"""
+import re
+from datetime import date
+
+from django.db import connection
+
+
+# table → colonne de partitionnement
+TABLES_PARTITIONNEES = {
+    'historique_tracabilite': 'date_action',
+    'mouvement_stock': 'date_mouvement',
+}
+
+_SUFFIXE_MOIS = re.compile(r'_p(\d{4})_(\d{2})$')
+
+
+def ajouter_mois(mois, n):
+    """Premier jour du mois situé `n` mois après `mois` (n peut être négatif)."""
+    index = mois.year * 12 + mois.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def est_partitionnee(table):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table '
+            'WHERE partrelid = to_regclass(%s)', [f'stock_cajou.{table}'])
+        return cursor.fetchone() is not None
+
+
+def partitions(table):
+    """[(nom, premier jour du mois)] des partitions mensuelles attachées, de la plus ancienne."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+            'WHERE i.inhparent = %s::regclass', [f'stock_cajou.{table}'])
+        noms = [nom for (nom,) in cursor.fetchall()]
+    mensuelles = []
+    for nom in noms:
+        correspondance = _SUFFIXE_MOIS.search(nom)
+        if correspondance:
+            annee, mois = map(int, correspondance.groups())
+            mensuelles.append((nom, date(annee, mois, 1)))
+    return sorted(mensuelles, key=lambda p: p[1])
+
+
+def creer_partitions(mois_avance=3, aujourdhui=None):
+    """
+    Crée, pour chaque table, les partitions du mois courant et des
+    `mois_avance` suivants. Retourne {table: [partitions créées]}.
+    """
+    from django.utils import timezone
+
+    courant = (aujourdhui or timezone.now().date()).replace(day=1)
+    creees = {}
+    with connection.cursor() as cursor:
+        for table in TABLES_PARTITIONNEES:
+            existantes = {nom for nom, _ in partitions(table)}
+            creees[table] = []
+            for n in range(mois_avance + 1):
+                cursor.execute('SELECT stock_cajou.fn_creer_partition_mois(%s, %s)',
+                               [table, ajouter_mois(courant, n)])
+                nom = cursor.fetchone()[0]
+                if nom not in existantes:
+                    creees[table].append(nom)
+    return creees
+
+
+def lignes_par_defaut(table):
+    """Lignes datées tombées dans la partition par défaut (mois non créé)."""
+    colonne = TABLES_PARTITIONNEES[table]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT count(*) FROM stock_cajou.{table}_defaut WHERE {colonne} IS NOT NULL')
+        return cursor.fetchone()[0]
+
+
+def partitions_anciennes(garder_mois, aujourdhui=None):
+    """[(table, partition, mois)] antérieures aux `garder_mois` derniers mois."""
+    from django.utils import timezone
+
+    courant = (aujourdhui or timezone.now().date()).replace(day=1)
+    limite = ajouter_mois(courant, -garder_mois)
+    return [
+        (table, nom, mois)
+        for table in TABLES_PARTITIONNEES
+        for nom, mois in partitions(table)
+        if mois < limite
+    ]
+
+
+def detacher(table, partition):
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE stock_cajou.{table} DETACH PARTITION stock_cajou.{partition}')
+
+
+def rattacher(table, partition, mois):
+    """Remet en place une partition détachée (bornes UTC du mois)."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'ALTER TABLE stock_cajou.{table} ATTACH PARTITION stock_cajou.{partition} '
+            f"FOR VALUES FROM ((%s::timestamp AT TIME ZONE 'UTC')) "
+            f"TO ((%s::timestamp AT TIME ZONE 'UTC'))",
+            [mois, ajouter_mois(mois, 1)])
+
+
+def supprimer(partition):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE stock_cajou.{partition}')
@@ -0,0 +1,72 @@
+"""
+Recherche des listes, appuyée sur les index de sql/005_recherche.sql.
+
+- Colonnes courtes (noms, codes, numéros, e-mails) : même sémantique que
+  ``icontains`` (sous-chaîne, casse ignorée), servie par les index GIN
+  ``gin_trgm_ops`` de pg_trgm.
+- Texte libre (description de l'historique) : colonne tsvector générée
+  (configuration 'french'), requête par préfixe de mots.
+
+Un OR entre colonnes de tables jointes empêche PostgreSQL d'utiliser les
+index : chaque colonne devient une sous-requête d'identifiants, réunies
+par UNION dans un ``pk IN (...)`` (chaque branche a son index).
+Les résultats sont annotés d'une ``pertinence`` (similarité trigramme +
+rang plein texte) qui sert de clé de tri en recherche.
+"""
+import re
+
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, TrigramWordSimilarity,
+)
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Coalesce, Greatest
+
+
+def _requete_texte(terme):
+    """Requête tsquery : tous les mots, chacun en préfixe (lot:* & cajou:*)."""
+    mots = re.findall(r'\w+', terme)
+    if not mots:
+        return None
+    return SearchQuery(' & '.join(f'{mot}:*' for mot in mots),
+                       search_type='raw', config='french')
+
+
+def _branche(modele, champ, terme):
+    """Identifiants des lignes dont `champ` contient `terme`."""
+    racine, _, reste = champ.partition('__')
+    if not reste:
+        return modele.objects.filter(**{f'{racine}__icontains': terme}).values('pk')
+    # Colonne d'une table liée : sous-requête sur la table liée (son index
+    # trigramme), puis jointure sur la clé étrangère
+    lie = modele._meta.get_field(racine).related_model
+    return modele.objects.filter(
+        **{f'{racine}__in': _branche(lie, reste, terme)}).values('pk')
+
+
+def rechercher(queryset, terme, champs=(), texte=None):
+    """
+    Filtre `queryset` sur `terme` et l'annote de ``pertinence``.
+
+    `champs` : colonnes cherchées en sous-chaîne (``'nom'``,
+    ``'client__nom'``…) ; `texte` : nom d'un champ tsvector généré.
+    Sans terme, le queryset est rendu tel quel.
+    """
+    if not terme:
+        return queryset
+
+    modele = queryset.model
+    branches = [_branche(modele, champ, terme) for champ in champs]
+    scores = [Coalesce(TrigramWordSimilarity(Value(terme), F(champ)), Value(0.0))
+              for champ in champs]
+
+    requete = _requete_texte(terme) if texte else None
+    if requete is not None:
+        branches.append(modele.objects.filter(**{texte: requete}).values('pk'))
+        scores.append(SearchRank(F(texte), requete))
+
+    if not branches:
+        return queryset
+    ids = branches[0].union(*branches[1:]) if len(branches) > 1 else branches[0]
+    pertinence = Greatest(*scores) if len(scores) > 1 else scores[0]
+    return queryset.filter(pk__in=ids).annotate(
+        pertinence=Coalesce(pertinence, Value(0.0), output_field=FloatField()))
@@ -1,56 +1,31 @@
-import re
-import pandas as pd
-import numpy as np
-from sklearn.linear_model import LinearRegression
-from sklearn.metrics import r2_score, mean_absolute_error
-import json
-import warnings
-warnings.filterwarnings('ignore')
+from .numerotation import allouer_numero, apercu_numero
+# Compatibilité : le moteur de prévision vit dans gestion.analytics (import léger)
+from .analytics import StockAnalyticsService
 
 
-def _next_numero(model_class, field_name, prefix):
-    """
-    Génère le prochain numéro séquentiel pour un modèle donné.
-    Ex : prefix='LOT' → LOT-0001, LOT-0002, …
-    """
-    last = (
-        model_class.objects
-        .filter(**{f'{field_name}__startswith': f'{prefix}-'})
-        .order_by(f'-{field_name}')
-        .values_list(field_name, flat=True)
-        .first()
-    )
-    if last:
-        match = re.search(r'(\d+)$', last)
-        next_num = int(match.group(1)) + 1 if match else 1
-    else:
-        next_num = 1
-    return f'{prefix}-{next_num:04d}'
+def _numero(prefix, reserver):
+    """Alloue le numéro (reserver=True) ou en donne un aperçu pour un formulaire."""
+    return allouer_numero(prefix) if reserver else apercu_numero(prefix)
 
 
-def generate_lot_code():
-    from .models import Lot
-    return _next_numero(Lot, 'code_lot', 'LOT')
+def generate_lot_code(reserver=True):
+    return _numero('LOT', reserver)
 
 
-def generate_vente_numero():
-    from .models import Vente
-    return _next_numero(Vente, 'numero_vente', 'VNT')
+def generate_vente_numero(reserver=True):
+    return _numero('VNT', reserver)
 
 
-def generate_commande_numero():
-    from .models import Commande
-    return _next_numero(Commande, 'numero_commande', 'CMD')
+def generate_commande_numero(reserver=True):
+    return _numero('CMD', reserver)
 
 
-def generate_vente_immediate_numero():
-    from .models import VenteImmediate
-    return _next_numero(VenteImmediate, 'numero_vente', 'VI')
+def generate_vente_immediate_numero(reserver=True):
+    return _numero('VI', reserver)
 
 
-def generate_demande_achat_numero():
-    from .models import DemandeAchat
-    return _next_numero(DemandeAchat, 'numero_da', 'DA')
+def generate_demande_achat_numero(reserver=True):
+    return _numero('DA', reserver)
 
 
 # ==================== BUSINESS LOGIC ====================
@@ -73,84 +48,119 @@ def get_stock_info(produit):
     }
 
 
-def reserver_stock_commande(commande, produit, quantite, user):
+LOT_ETATS_RESERVABLES = ('EN_STOCK', 'PARTIELLEMENT_SORTI')
+
+
+def _verrouiller_lots_fifo(produit_ids):
     """
-    Réserve du stock pour une commande planifiée.
-    Retourne (quantite_reservee, statut).
+    Verrouille les lots réservables des produits (FOR UPDATE, dans l'ordre
+    FIFO) et les regroupe par produit.
+    Un lot verrouillé par une autre transaction (livraison) est attendu,
+    pas sauté : la répartition FIFO voit donc tout le stock des lots.
     """
-    from .models import Lot, AffectationLot, MouvementStock, LigneCommande
-    from django.utils import timezone
-    from decimal import Decimal
+    from collections import defaultdict
+    from .models import Lot
 
-    info = get_stock_info(produit)
-    dispo = info['stock_disponible']
+    lots_par_produit = defaultdict(list)
+    lots = (
+        Lot.objects.select_for_update()
+        .filter(
+            produit_id__in=produit_ids,
+            etat__in=LOT_ETATS_RESERVABLES,
+            quantite_restante__gt=0,
+        )
+        .order_by('produit_id', 'date_reception', 'id')
+    )
+    for lot in lots:
+        lots_par_produit[lot.produit_id].append(lot)
+    return lots_par_produit
 
-    if dispo >= quantite:
-        qty_res = quantite
-        statut = 'RESERVEE'
-    elif dispo > 0:
-        qty_res = dispo
-        statut = 'EN_ATTENTE_REAPPRO'
-    else:
-        qty_res = Decimal('0.00')
-        statut = 'EN_ATTENTE_REAPPRO'
 
-    if qty_res > 0:
-        # Mettre à jour le stock réservé du produit
-        produit.stock_reserve = (produit.stock_reserve or Decimal('0.00')) + qty_res
-        produit.save(update_fields=['stock_reserve'])
+def _repartir_fifo(lots, quantite):
+    """
+    Répartit `quantite` sur les lots (déjà triés FIFO), en mémoire.
+    Met à jour quantite_reservee / etat des lots et retourne
+    la liste [(lot, quantite_affectee)].
+    """
+    from decimal import Decimal
 
-        # Affecter depuis les lots disponibles (FIFO)
-        lots = Lot.objects.filter(
-            produit=produit,
-            etat__in=['EN_STOCK', 'PARTIELLEMENT_SORTI'],
-            quantite_restante__gt=0,
-        ).order_by('date_reception')
+    repartition = []
+    reste = quantite
+    for lot in lots:
+        if reste <= 0:
+            break
+        lot_dispo = lot.quantite_restante - (lot.quantite_reservee or Decimal('0.00'))
+        if lot_dispo <= 0:
+            continue
+        affecte = min(reste, lot_dispo)
+        lot.quantite_reservee = (lot.quantite_reservee or Decimal('0.00')) + affecte
+        if lot.quantite_reservee >= lot.quantite_restante:
+            lot.etat = 'RESERVE'
+        repartition.append((lot, affecte))
+        reste -= affecte
+    return repartition
+
+
+def _enregistrer_reservations(reservations, user):
+    """
+    Écrit en masse des réservations [(commande, lot, quantite)] :
+    affectations (création ou complément), lots et mouvements RESERVATION.
+    Le nombre de requêtes est constant, quel que soit le nombre de lots.
+    """
+    from .models import AffectationLot, Lot, MouvementStock
+    from django.utils import timezone
 
-        reste = qty_res
-        for lot in lots:
-            if reste <= 0:
-                break
-            lot_dispo = lot.quantite_restante - (lot.quantite_reservee or Decimal('0.00'))
-            if lot_dispo <= 0:
-                continue
-            affecte = min(reste, lot_dispo)
+    if not reservations:
+        return
+    now = timezone.now()
 
-            AffectationLot.objects.create(
+    # Une seule affectation par couple (commande, lot) : on complète l'existante
+    affectations = {
+        (a.commande_id, a.lot_id): a
+        for a in AffectationLot.objects.filter(
+            commande_id__in={c.pk for c, _, _ in reservations},
+            lot_id__in={lot.pk for _, lot, _ in reservations},
+        )
+    }
+    a_creer, a_completer, lots, mouvements = [], {}, {}, []
+    for commande, lot, quantite in reservations:
+        aff = affectations.get((commande.pk, lot.pk))
+        if aff is None:
+            aff = AffectationLot(
                 commande=commande, lot=lot,
-                quantite_affectee=affecte,
-                date_affectation=timezone.now(),
+                quantite_affectee=quantite,
+                date_affectation=now,
                 user=user, statut='RESERVE',
             )
-            lot.quantite_reservee = (lot.quantite_reservee or Decimal('0.00')) + affecte
-            if lot.quantite_reservee >= lot.quantite_restante:
-                lot.etat = 'RESERVE'
-            lot.save(update_fields=['quantite_reservee', 'etat'])
-
-            MouvementStock.objects.create(
-                lot=lot, type_mouvement='RESERVATION',
-                quantite=affecte,
-                motif=f'Réservation pour {commande.numero_commande}',
-                commande=commande, user=user,
-                date_mouvement=timezone.now(), valide=True,
-            )
-            reste -= affecte
+            affectations[(commande.pk, lot.pk)] = aff
+            a_creer.append(aff)
+        else:
+            if aff.statut == 'RESERVE':
+                aff.quantite_affectee += quantite
+            else:
+                # Affectation servie/annulée : elle repart pour la nouvelle réservation
+                aff.quantite_affectee = quantite
+                aff.statut = 'RESERVE'
+            aff.date_affectation = now
+            aff.user = user
+            if aff.pk:
+                a_completer[aff.pk] = aff
+        lots[lot.pk] = lot
+        mouvements.append(MouvementStock(
+            lot=lot, type_mouvement='RESERVATION',
+            quantite=quantite,
+            motif=f'Réservation pour {commande.numero_commande}',
+            commande=commande, user=user,
+            date_mouvement=now, valide=True,
+        ))
 
-    # Mettre à jour la commande
-    commande.quantite_reservee = (commande.quantite_reservee or Decimal('0.00')) + qty_res
-    commande.statut = statut
-    commande.save(update_fields=['quantite_reservee', 'statut'])
-
-    # Mettre à jour la ligne commande associée
-    ligne = LigneCommande.objects.filter(commande=commande, produit=produit).first()
-    if ligne:
-        ligne.quantite_reservee = (ligne.quantite_reservee or Decimal('0.00')) + qty_res
-        ligne.statut_ligne = 'RESERVEE' if statut == 'RESERVEE' else 'EN_ATTENTE_REAPPRO'
-        ligne.save(update_fields=['quantite_reservee', 'statut_ligne'])
-
-    # Vérifier les alertes
-    verifier_et_creer_alertes(produit, user)
-    return qty_res, statut
+    AffectationLot.objects.bulk_create(a_creer)
+    if a_completer:
+        AffectationLot.objects.bulk_update(
+            list(a_completer.values()),
+            ['quantite_affectee', 'statut', 'date_affectation', 'user'])
+    Lot.objects.bulk_update(list(lots.values()), ['quantite_reservee', 'etat'])
+    MouvementStock.objects.bulk_create(mouvements)
 
 
 def traiter_vente_immediate_service(produit, quantite_demandee, type_vente,
@@ -265,73 +275,36 @@ def traiter_vente_immediate_service(produit, quantite_demandee, type_vente,
 
 
 def verifier_et_creer_alertes(produit, user=None):
-    """Vérifie si stock ≤ seuil et crée alerte + DA automatiquement.
-    Si le stock est repassé au-dessus du seuil, résout les alertes actives."""
-    from .models import AlerteStock
-    from django.utils import timezone
-
-    # Rafraîchir le produit depuis la BD (les triggers DB ont pu modifier le stock)
-    produit.refresh_from_db()
-    info = get_stock_info(produit)
-
-    if not info['en_alerte']:
-        # Stock OK → résoudre les alertes actives existantes
-        alertes_actives = AlerteStock.objects.filter(produit=produit, statut='ACTIVE')
-        for alerte in alertes_actives:
-            alerte.statut = 'TRAITEE'
-            alerte.date_traitement = timezone.now()
-            alerte.user_traitement = user
-            alerte.observations = (
-                (alerte.observations or '') +
-                f'\nRésolue auto : stock remonté à {info["stock_disponible"]}'
-            )
-            alerte.save(update_fields=['statut', 'date_traitement',
-                                       'user_traitement', 'observations'])
-        return None
+    """Signale le produit pour l'évaluation des alertes (stock ≤ seuil →
+    alerte + DA ; stock remonté → résolution des alertes actives).
+    L'évaluation est différée au commit et regroupée par produit,
+    cf. gestion.alertes."""
+    from .alertes import signaler_produit
+    signaler_produit(produit, user)
 
-    existe = AlerteStock.objects.filter(produit=produit, statut='ACTIVE').exists()
-    if existe:
-        # Mettre à jour le stock_actuel de l'alerte existante
-        AlerteStock.objects.filter(produit=produit, statut='ACTIVE').update(
-            stock_actuel=info['stock_disponible']
-        )
-        return None
 
-    alerte = AlerteStock.objects.create(
-        produit=produit, date_alerte=timezone.now(),
-        stock_actuel=info['stock_disponible'],
-        seuil_alerte=info['seuil_alerte'],
-        statut='ACTIVE', demande_achat_generee=False,
-        observations=(
-            f'Alerte auto : stock dispo ({info["stock_disponible"]}) '
-            f'≤ seuil ({info["seuil_alerte"]})'
-        ),
-    )
-    if user:
-        generer_demande_achat_depuis_alerte(alerte, user)
-    return alerte
+def quantite_demande_achat(alerte):
+    """Quantité à commander pour une alerte : au moins la quantité optimale."""
+    from decimal import Decimal
+    qty_opt = alerte.produit.quantite_optimale_commande or Decimal('100.00')
+    return max(qty_opt, (alerte.seuil_alerte * 2) - alerte.stock_actuel)
 
 
 def generer_demande_achat_depuis_alerte(alerte, user):
     """Génère une DA automatiquement depuis une alerte."""
     from .models import DemandeAchat
     from django.utils import timezone
-    from decimal import Decimal
 
     if alerte.demande_achat_generee:
         return None
 
-    produit = alerte.produit
-    qty_opt = produit.quantite_optimale_commande or Decimal('100.00')
-    qty_cmd = max(qty_opt, (alerte.seuil_alerte * 2) - alerte.stock_actuel)
-
     da = DemandeAchat.objects.create(
         numero_da=generate_demande_achat_numero(),
         date_creation=timezone.now(),
-        produit=produit,
+        produit=alerte.produit,
         stock_actuel=alerte.stock_actuel,
         seuil_alerte=alerte.seuil_alerte,
-        quantite_a_commander=qty_cmd,
+        quantite_a_commander=quantite_demande_achat(alerte),
         priorite='URGENT' if alerte.stock_actuel <= 0 else 'NORMAL',
         statut='BROUILLON',
         alerte=alerte,
@@ -342,30 +315,261 @@ def generer_demande_achat_depuis_alerte(alerte, user):
     return da
 
 
+COMMANDE_STATUTS_CONFIRMABLES = ('CONFIRMEE', 'EN_ATTENTE_REAPPRO')
+COMMANDE_PRIORITE_ORDRE = {'URGENTE': 0, 'NORMALE': 1}
+
+
+def confirmer_commandes_batch(commandes, user):
+    """
+    Confirme plusieurs commandes en une seule passe.
+    Lignes, produits et lots sont chargés (et verrouillés) une seule fois,
+    le stock est alloué FIFO en mémoire par priorité (URGENTE d'abord,
+    puis date de commande) et tout est écrit en masse.
+    Retourne un rapport {commande_id: {...}} par commande.
+    """
+    from .models import Commande, LigneCommande, Produit
+    from django.db import transaction
+    from collections import defaultdict
+    from datetime import datetime, timezone as dt_timezone
+    from decimal import Decimal
+
+    commande_ids = [getattr(c, 'pk', c) for c in commandes]
+    rapport = {}
+
+    with transaction.atomic():
+        # Ordre stable des verrous (pk) : deux lots concurrents ne s'interbloquent pas
+        commandes = list(
+            Commande.objects.select_for_update().filter(pk__in=commande_ids).order_by('pk'))
+        lignes_par_commande = defaultdict(list)
+        for ligne in LigneCommande.objects.filter(
+                commande_id__in=commande_ids).order_by('id'):
+            lignes_par_commande[ligne.commande_id].append(ligne)
+
+        produit_ids = {
+            ligne.produit_id
+            for lignes in lignes_par_commande.values() for ligne in lignes
+        }
+        # Ordre stable des verrous (pk) pour éviter les interblocages
+        produits = {
+            p.pk: p for p in
+            Produit.objects.select_for_update().filter(pk__in=produit_ids).order_by('pk')
+        }
+        lots_par_produit = _verrouiller_lots_fifo(produit_ids)
+
+        date_max = datetime.max.replace(tzinfo=dt_timezone.utc)
+        commandes.sort(key=lambda c: (
+            COMMANDE_PRIORITE_ORDRE.get(c.priorite, 1),
+            c.date_commande or date_max,
+            c.pk,
+        ))
+
+        reservations = []
+        produits_modifies, lignes_modifiees, commandes_modifiees = {}, [], []
+        for commande in commandes:
+            lignes = lignes_par_commande.get(commande.pk)
+            if commande.statut not in COMMANDE_STATUTS_CONFIRMABLES:
+                rapport[commande.pk] = {
+                    'numero_commande': commande.numero_commande,
+                    'succes': False, 'statut': commande.statut,
+                    'quantite_reservee': Decimal('0.00'),
+                    'message': "La commande n'est pas dans un état confirmable.",
+                }
+                continue
+            if not lignes:
+                rapport[commande.pk] = {
+                    'numero_commande': commande.numero_commande,
+                    'succes': False, 'statut': commande.statut,
+                    'quantite_reservee': Decimal('0.00'),
+                    'message': "Aucune ligne de commande à réserver.",
+                }
+                continue
+
+            tout_reserve = True
+            total_reserve = Decimal('0.00')
+            for ligne in lignes:
+                produit = produits[ligne.produit_id]
+                dispo = get_stock_info(produit)['stock_disponible']
+                # Seul le manque est réservé (re-confirmation d'un reliquat)
+                manque = max(Decimal('0.00'),
+                             ligne.quantite_demandee - (ligne.quantite_reservee or Decimal('0.00')))
+                qty_res = min(dispo, manque)
+
+                if qty_res > 0:
+                    # Seul ce que les lots couvrent réellement est réservé
+                    repartition = _repartir_fifo(lots_par_produit[produit.pk], qty_res)
+                    qty_res = sum((affecte for _, affecte in repartition), Decimal('0.00'))
+                if qty_res > 0:
+                    produit.stock_reserve = (produit.stock_reserve or Decimal('0.00')) + qty_res
+                    produits_modifies[produit.pk] = produit
+                    reservations.extend(
+                        (commande, lot, affecte) for lot, affecte in repartition)
+
+                ligne_complete = qty_res >= manque
+                tout_reserve = tout_reserve and ligne_complete
+                total_reserve += qty_res
+                ligne.quantite_reservee = (ligne.quantite_reservee or Decimal('0.00')) + qty_res
+                ligne.statut_ligne = 'RESERVEE' if ligne_complete else 'EN_ATTENTE_REAPPRO'
+                lignes_modifiees.append(ligne)
+
+            commande.quantite_reservee = (commande.quantite_reservee or Decimal('0.00')) + total_reserve
+            commande.statut = 'RESERVEE' if tout_reserve else 'EN_ATTENTE_REAPPRO'
+            commandes_modifiees.append(commande)
+            rapport[commande.pk] = {
+                'numero_commande': commande.numero_commande,
+                'succes': True, 'statut': commande.statut,
+                'quantite_reservee': total_reserve,
+                'message': ("Stock entièrement réservé." if tout_reserve
+                            else "Réservation partielle — en attente de réapprovisionnement."),
+            }
+
+        if produits_modifies:
+            Produit.objects.bulk_update(list(produits_modifies.values()), ['stock_reserve'])
+        _enregistrer_reservations(reservations, user)
+        if lignes_modifiees:
+            LigneCommande.objects.bulk_update(
+                lignes_modifiees, ['quantite_reservee', 'statut_ligne'])
+        if commandes_modifiees:
+            Commande.objects.bulk_update(
+                commandes_modifiees, ['quantite_reservee', 'statut'])
+
+    # Vérifier les alertes, une évaluation groupée pour les produits touchés
+    from .alertes import collecte_alertes
+    with collecte_alertes():
+        for produit in produits_modifies.values():
+            verifier_et_creer_alertes(produit, user)
+    return rapport
+
+
 def confirmer_commande(commande, user):
     """Confirme une commande → lance la réservation automatique du stock."""
-    from .models import LigneCommande
+    resultat = confirmer_commandes_batch([commande], user).get(commande.pk)
+    if resultat is None:
+        return False, "Commande introuvable."
+    return resultat['succes'], resultat['message']
 
-    lignes = LigneCommande.objects.filter(commande=commande).select_related('produit')
-    if not lignes.exists():
-        return False, "Aucune ligne de commande à réserver."
 
-    tout_reserve = True
-    for ligne in lignes:
-        qty, statut = reserver_stock_commande(
-            commande, ligne.produit, ligne.quantite_demandee, user)
-        if statut != 'RESERVEE':
-            tout_reserve = False
+def reallouer_reliquats(produit, user):
+    """
+    À l'arrivée de stock, complète les réservations des commandes en attente
+    de réappro — pour ce seul produit.
+    Les lignes en attente sont servies par priorité (URGENTE d'abord) puis
+    ancienneté, et le parcours s'arrête dès que le stock disponible est
+    épuisé : seul le delta arrivé est alloué, le coût reste borné.
+    Verrous dans l'ordre de confirmer_commandes_batch (commandes par pk,
+    puis produit, puis lots) : les commandes candidates sont repérées sans
+    verrou, verrouillées, puis relues.
+    Retourne la liste des commandes complétées (entièrement ou en partie).
+    """
+    from .models import Produit, Commande, LigneCommande
+    from django.db import transaction
+    from django.db.models import Case, When, Value, IntegerField
+    from decimal import Decimal
 
-    msg = ("Stock entièrement réservé." if tout_reserve
-           else "Réservation partielle — en attente de réapprovisionnement.")
-    return True, msg
+    def lignes_en_attente():
+        return (
+            LigneCommande.objects
+            .filter(
+                produit_id=produit.pk,
+                statut_ligne='EN_ATTENTE_REAPPRO',
+                commande__statut='EN_ATTENTE_REAPPRO',
+            )
+            .annotate(rang_priorite=Case(
+                When(commande__priorite='URGENTE', then=Value(0)),
+                default=Value(1), output_field=IntegerField(),
+            ))
+            .order_by('rang_priorite', 'commande__date_commande', 'id')
+        )
+
+    dispo = get_stock_info(Produit.objects.get(pk=produit.pk))['stock_disponible']
+    if dispo <= 0:
+        return []
+
+    # Commandes candidates, sans verrou : juste assez pour couvrir le disponible
+    commande_ids, a_couvrir = set(), dispo
+    for commande_id, demandee, reservee in lignes_en_attente().values_list(
+            'commande_id', 'quantite_demandee', 'quantite_reservee').iterator(chunk_size=50):
+        if a_couvrir <= 0:
+            break
+        manque = demandee - (reservee or Decimal('0.00'))
+        if manque > 0:
+            commande_ids.add(commande_id)
+            a_couvrir -= manque
+    if not commande_ids:
+        return []
+
+    commandes_modifiees = {}
+    with transaction.atomic():
+        commandes = {
+            c.pk: c for c in
+            Commande.objects.select_for_update()
+            .filter(pk__in=commande_ids, statut='EN_ATTENTE_REAPPRO').order_by('pk')
+        }
+        produit = Produit.objects.select_for_update().get(pk=produit.pk)
+        dispo = get_stock_info(produit)['stock_disponible']
+        if dispo <= 0 or not commandes:
+            return []
+
+        lots = None
+        reservations, lignes_modifiees = [], []
+        total_reserve = Decimal('0.00')
+        for ligne in lignes_en_attente().select_for_update(of=('self',)).filter(
+                commande_id__in=list(commandes)):
+            if dispo <= 0:
+                break
+            manque = ligne.quantite_demandee - (ligne.quantite_reservee or Decimal('0.00'))
+            if manque <= 0:
+                continue
+            if lots is None:
+                lots = _verrouiller_lots_fifo([produit.pk])[produit.pk]
+            # Plafonné à ce que les lots couvrent : une DA réceptionnée hausse
+            # le stock physique sans créer de lot
+            repartition = _repartir_fifo(lots, min(dispo, manque))
+            qty_res = sum((affecte for _, affecte in repartition), Decimal('0.00'))
+            if qty_res <= 0:
+                break
+            dispo -= qty_res
+            total_reserve += qty_res
+
+            commande = commandes_modifiees.setdefault(
+                ligne.commande_id, commandes[ligne.commande_id])
+            reservations.extend((commande, lot, affecte) for lot, affecte in repartition)
+            ligne.quantite_reservee = (ligne.quantite_reservee or Decimal('0.00')) + qty_res
+            if ligne.quantite_reservee >= ligne.quantite_demandee:
+                ligne.statut_ligne = 'RESERVEE'
+            lignes_modifiees.append(ligne)
+
+            commande.quantite_reservee = (commande.quantite_reservee or Decimal('0.00')) + qty_res
+            if commande.quantite_reservee >= commande.quantite_demandee:
+                commande.statut = 'RESERVEE'
+
+        if not lignes_modifiees:
+            return []
+
+        produit.stock_reserve = (produit.stock_reserve or Decimal('0.00')) + total_reserve
+        produit.save(update_fields=['stock_reserve'])
+        _enregistrer_reservations(reservations, user)
+        LigneCommande.objects.bulk_update(
+            lignes_modifiees, ['quantite_reservee', 'statut_ligne'])
+        Commande.objects.bulk_update(
+            list(commandes_modifiees.values()), ['quantite_reservee', 'statut'])
+
+    verifier_et_creer_alertes(produit, user)
+    return list(commandes_modifiees.values())
 
 
 def livrer_commande(commande, user):
-    """Livre une commande → sort physiquement le stock réservé."""
-    from .models import AffectationLot, MouvementStock
+    """
+    Livre une commande → sort physiquement le stock réservé.
+    Opération ensembliste en une transaction : lots et affectations mis à
+    jour en masse, un seul UPDATE (F()) par produit, mouvements insérés en
+    masse et alertes évaluées une fois par produit à la fin.
+    """
+    from .models import AffectationLot, Lot, MouvementStock, Produit
+    from django.db import transaction
+    from django.db.models import F, Value
+    from django.db.models.functions import Coalesce, Greatest
     from django.utils import timezone
+    from collections import defaultdict
     from decimal import Decimal
 
     if commande.statut not in ('RESERVEE', 'EN_ATTENTE_REAPPRO', 'CONFIRMEE'):
@@ -377,57 +581,77 @@ def livrer_commande(commande, user):
     if reste <= 0:
         return False, "La commande est déjà entièrement livrée."
 
-    affectations = AffectationLot.objects.filter(
-        commande=commande, statut='RESERVE'
-    ).select_related('lot', 'lot__produit')
-
-    if not affectations.exists():
-        return False, "Aucune affectation de lot à livrer."
-
-    total_servi = Decimal('0.00')
-    for aff in affectations:
-        qty = aff.quantite_affectee
-        # Ne pas dépasser la quantité restante à livrer
-        if total_servi + qty > reste:
-            qty = reste - total_servi
+    zero = Value(Decimal('0.00'))
+    with transaction.atomic():
+        affectations = list(
+            AffectationLot.objects
+            .select_for_update(of=('self', 'lot'))
+            .filter(commande=commande, statut='RESERVE')
+            .select_related('lot')
+            .order_by('id')
+        )
+        if not affectations:
+            return False, "Aucune affectation de lot à livrer."
+
+        now = timezone.now()
+        total_servi = Decimal('0.00')
+        sorties_par_produit = defaultdict(Decimal)
+        lots, mouvements, affectations_servies = [], [], []
+        for aff in affectations:
+            # Ne pas dépasser la quantité restante à livrer
+            qty = min(aff.quantite_affectee, reste - total_servi)
             if qty <= 0:
                 break
 
-        lot = aff.lot
-        qty = aff.quantite_affectee
-        lot.quantite_restante = max(Decimal('0.00'), lot.quantite_restante - qty)
-        lot.quantite_reservee = max(Decimal('0.00'),
-            (lot.quantite_reservee or Decimal('0.00')) - qty)
-        lot.etat = 'EPUISE' if lot.quantite_restante <= 0 else 'PARTIELLEMENT_SORTI'
-        lot.save(update_fields=['quantite_restante', 'quantite_reservee', 'etat'])
+            lot = aff.lot
+            lot.quantite_restante = max(Decimal('0.00'), lot.quantite_restante - qty)
+            lot.quantite_reservee = max(Decimal('0.00'),
+                (lot.quantite_reservee or Decimal('0.00')) - qty)
+            lot.etat = 'EPUISE' if lot.quantite_restante <= 0 else 'PARTIELLEMENT_SORTI'
+            lots.append(lot)
+            sorties_par_produit[lot.produit_id] += qty
+
+            mouvements.append(MouvementStock(
+                lot=lot, type_mouvement='SORTIE', quantite=qty,
+                motif=f'Livraison {commande.numero_commande}',
+                commande=commande, user=user,
+                date_mouvement=now, valide=True,
+            ))
+            if qty < aff.quantite_affectee:
+                # Reliquat : le reste de l'affectation demeure réservé
+                aff.quantite_affectee -= qty
+            else:
+                aff.statut = 'SERVI'
+            affectations_servies.append(aff)
+            total_servi += qty
+
+        Lot.objects.bulk_update(lots, ['quantite_restante', 'quantite_reservee', 'etat'])
+        AffectationLot.objects.bulk_update(
+            affectations_servies, ['quantite_affectee', 'statut'])
+        MouvementStock.objects.bulk_create(mouvements)
+
+        # Un seul UPDATE par produit, calculé côté base
+        for produit_id, qty in sorties_par_produit.items():
+            Produit.objects.filter(pk=produit_id).update(
+                stock_physique=Greatest(Coalesce(F('stock_physique'), zero) - qty, zero),
+                stock_reserve=Greatest(Coalesce(F('stock_reserve'), zero) - qty, zero),
+            )
 
-        produit = lot.produit
-        produit.stock_physique = max(Decimal('0.00'),
-            (produit.stock_physique or Decimal('0.00')) - qty)
-        produit.stock_reserve = max(Decimal('0.00'),
-            (produit.stock_reserve or Decimal('0.00')) - qty)
-        produit.save(update_fields=['stock_physique', 'stock_reserve'])
+        nouvelle_servie = deja_servie + total_servi
+        # Sécurité : ne jamais dépasser la quantité demandée
+        commande.quantite_servie = min(nouvelle_servie, commande.quantite_demandee)
+        if commande.quantite_servie >= commande.quantite_demandee:
+            commande.statut = 'LIVREE'
+        else:
+            commande.statut = 'RESERVEE'
+        commande.date_livraison_effective = now.date()
+        commande.save(update_fields=['quantite_servie', 'statut', 'date_livraison_effective'])
 
-        MouvementStock.objects.create(
-            lot=lot, type_mouvement='SORTIE', quantite=qty,
-            motif=f'Livraison {commande.numero_commande}',
-            commande=commande, user=user,
-            date_mouvement=timezone.now(), valide=True,
-        )
-        aff.statut = 'SERVI'
-        aff.save(update_fields=['statut'])
-        total_servi += qty
-        verifier_et_creer_alertes(produit, user)
-
-    nouvelle_servie = deja_servie + total_servi
-    # Sécurité : ne jamais dépasser la quantité demandée
-    commande.quantite_servie = min(nouvelle_servie, commande.quantite_demandee)
-    if commande.quantite_servie >= commande.quantite_demandee:
-        commande.statut = 'LIVREE'
-    else:
-        commande.statut = 'RESERVEE'
-    commande.date_livraison_effective = timezone.now().date()
-    commande.save(update_fields=['quantite_servie', 'statut', 'date_livraison_effective'])
+    # Alertes : une évaluation groupée pour les produits distincts
+    from .alertes import collecte_alertes
+    with collecte_alertes():
+        for produit_id in sorties_par_produit:
+            verifier_et_creer_alertes(produit_id, user)
 
     return True, f"Commande livrée — {total_servi} unités servies."
 
@@ -456,594 +680,13 @@ def receptionner_demande_achat(demande, user):
         demande.alerte.user_traitement = user
         demande.alerte.save(update_fields=['statut', 'date_traitement', 'user_traitement'])
 
-    return True, (
+    # Servir les commandes en attente de ce produit avec le stock reçu
+    commandes = reallouer_reliquats(produit, user)
+
+    msg = (
         f"DA réceptionnée — {demande.quantite_a_commander} "
         f"ajoutées au stock de {produit.nom}."
     )
-
-
-class StockAnalyticsService:
-    """Service de prévision basé sur LinearRegression + saisonnalité cajou Togo."""
-
-    # ── Seuils par défaut ──
-    SEUIL_MIN = 100
-    SEUIL_ALERTE = 300
-    SEUIL_OPTIMAL = 500
-
-    MOIS_LABELS = [
-        'Jan', 'Fév', 'Mar', 'Avr', 'Mai', 'Jun',
-        'Jul', 'Aoû', 'Sep', 'Oct', 'Nov', 'Déc',
-    ]
-
-    # ── Saisonnalité cajou au Togo ──
-    # Récolte : Fév-Mai (pic Mars-Avr) → entrées concentrées
-    # Saison pluies (Jun-Sep) et sèche (Oct-Jan) → entrées quasi nulles
-    SAISON_ENTREES_TOGO = {
-        1: 0.10,   # Jan : hors récolte, quasi nul
-        2: 0.80,   # Fév : début campagne cajou
-        3: 1.80,   # Mar : pic récolte
-        4: 1.90,   # Avr : pic récolte
-        5: 1.20,   # Mai : fin récolte
-        6: 0.15,   # Jun : début pluies, quasi nul
-        7: 0.05,   # Jul : saison pluies, quasi nul
-        8: 0.05,   # Aoû : saison pluies, quasi nul
-        9: 0.08,   # Sep : fin pluies, quasi nul
-        10: 0.08,  # Oct : saison sèche, quasi nul
-        11: 0.08,  # Nov : saison sèche, quasi nul
-        12: 0.08,  # Déc : saison sèche, quasi nul
-    }
-    SAISON_SORTIES_TOGO = {
-        1: 0.60,   # Jan : demande modérée
-        2: 0.70,   # Fév : demande croissante
-        3: 0.90,   # Mar : export début
-        4: 1.30,   # Avr : export fort
-        5: 1.40,   # Mai : export/ventes fort
-        6: 1.20,   # Jun : export continue
-        7: 0.80,   # Jul : baisse
-        8: 0.70,   # Aoû : baisse
-        9: 0.75,   # Sep : reprise lente
-        10: 0.85,  # Oct : reprise
-        11: 1.10,  # Nov : fêtes, demande forte
-        12: 1.20,  # Déc : fêtes, demande forte
-    }
-
-    @staticmethod
-    def generate_stock_data():
-        """Construit la série temporelle mensuelle à partir des données réelles."""
-        from .models import (
-            MouvementStock, Produit, Entrepot, Lot, Vente, VenteImmediate,
-        )
-        from django.db.models import Sum, Q, Avg
-        from django.db.models.functions import TruncMonth
-
-        # ── Paramètres réels depuis la BD ──
-        agg = Entrepot.objects.aggregate(
-            cap=Sum('capacite_max'), seuil=Sum('seuil_critique'))
-        capacite_max = float(agg['cap'] or 50000)
-        seuil_critique = float(agg['seuil'] or StockAnalyticsService.SEUIL_ALERTE)
-        stock_actuel = float(
-            Produit.objects.aggregate(t=Sum('stock_physique'))['t'] or 0)
-
-        # Seuils dynamiques basés sur les données réelles
-        seuil_min = float(
-            Produit.objects.aggregate(t=Avg('seuil_alerte'))['t']
-            or StockAnalyticsService.SEUIL_MIN)
-        seuil_alerte = max(seuil_critique, StockAnalyticsService.SEUIL_ALERTE)
-        seuil_optimal = float(
-            Produit.objects.aggregate(t=Avg('quantite_optimale_commande'))['t']
-            or StockAnalyticsService.SEUIL_OPTIMAL)
-
-        def _to_key(dt):
-            return f"{dt.year:04d}-{dt.month:02d}" if dt else None
-
-        entrees = {}
-        sorties = {}
-
-        # ── Source 1 : MouvementStock ──
-        mvt_qs = (
-            MouvementStock.objects
-            .filter(date_mouvement__isnull=False)
-            .annotate(mois=TruncMonth('date_mouvement'))
-            .values('mois')
-            .annotate(
-                ent=Sum('quantite', filter=Q(
-                    type_mouvement__in=['ENTREE', 'AJUSTEMENT', 'LIBERATION'])),
-                sor=Sum('quantite', filter=Q(
-                    type_mouvement__in=['SORTIE', 'RESERVATION'])),
-            )
-            .order_by('mois')
-        )
-        for r in mvt_qs:
-            k = _to_key(r['mois'])
-            if k:
-                entrees[k] = entrees.get(k, 0) + float(r['ent'] or 0)
-                sorties[k] = sorties.get(k, 0) + float(r['sor'] or 0)
-
-        # ── Source 2 : Lots reçus ──
-        lots_agg = (
-            Lot.objects
-            .filter(date_reception__isnull=False)
-            .annotate(mois=TruncMonth('date_reception'))
-            .values('mois')
-            .annotate(total=Sum('quantite_initiale'))
-            .order_by('mois')
-        )
-        for r in lots_agg:
-            k = _to_key(r['mois'])
-            if k and k not in entrees:
-                entrees[k] = float(r['total'] or 0)
-
-        # ── Source 3 : Ventes + Ventes Immédiates ──
-        ventes_agg = (
-            Vente.objects
-            .filter(date_vente__isnull=False)
-            .annotate(mois=TruncMonth('date_vente'))
-            .values('mois')
-            .annotate(total=Sum('quantite_vendue'))
-            .order_by('mois')
-        )
-        for r in ventes_agg:
-            k = _to_key(r['mois'])
-            if k and k not in sorties:
-                sorties[k] = float(r['total'] or 0)
-
-        vi_agg = (
-            VenteImmediate.objects
-            .filter(date_vente__isnull=False)
-            .annotate(mois=TruncMonth('date_vente'))
-            .values('mois')
-            .annotate(total=Sum('quantite_servie_maintenant'))
-            .order_by('mois')
-        )
-        for r in vi_agg:
-            k = _to_key(r['mois'])
-            if k:
-                sorties[k] = sorties.get(k, 0) + float(r['total'] or 0)
-
-        # ── Fusion en série temporelle continue ──
-        all_keys = sorted(set(entrees.keys()) | set(sorties.keys()))
-        if not all_keys:
-            return None, capacite_max, seuil_min, seuil_alerte, seuil_optimal, stock_actuel
-
-        first = pd.Timestamp(all_keys[0] + '-01')
-        last = pd.Timestamp(all_keys[-1] + '-01')
-        date_range = pd.date_range(start=first, end=last, freq='MS')
-
-        rows = []
-        for dt in date_range:
-            k = f"{dt.year:04d}-{dt.month:02d}"
-            rows.append({
-                'ds': dt,
-                'entrees': entrees.get(k, 0),
-                'sorties': sorties.get(k, 0),
-            })
-
-        df = pd.DataFrame(rows)
-
-        # ── Stock glissant recalé sur le stock physique actuel ──
-        flux_cumule = (df['entrees'] - df['sorties']).cumsum()
-        stock_initial = stock_actuel - float(flux_cumule.iloc[-1])
-        df['stock'] = stock_initial + flux_cumule
-        df['stock'] = df['stock'].clip(lower=0, upper=capacite_max)
-
-        # ── Features pour la régression ──
-        df['mois_num'] = df['ds'].dt.month
-        df['tendance'] = np.arange(len(df))
-        df['stock_prev'] = df['stock'].shift(1).fillna(df['stock'].iloc[0])
-
-        return df, capacite_max, seuil_min, seuil_alerte, seuil_optimal, stock_actuel
-
-    @staticmethod
-    def _train_models(df):
-        """Entraîne les 3 modèles de régression linéaire."""
-        if len(df) < 3:
-            return None, None, None, {}
-
-        # ── Features communes ──
-        X_entrees = df[['mois_num', 'tendance', 'stock_prev']].values
-        y_entrees = df['entrees'].values
-
-        X_sorties = df[['mois_num', 'tendance', 'stock_prev']].values
-        y_sorties = df['sorties'].values
-
-        X_stock = df[['stock_prev', 'entrees', 'sorties', 'mois_num', 'tendance']].values
-        y_stock = df['stock'].values
-
-        model_entrees = LinearRegression()
-        model_entrees.fit(X_entrees, y_entrees)
-        pred_entrees = model_entrees.predict(X_entrees)
-
-        model_sorties = LinearRegression()
-        model_sorties.fit(X_sorties, y_sorties)
-        pred_sorties = model_sorties.predict(X_sorties)
-
-        model_stock = LinearRegression()
-        model_stock.fit(X_stock, y_stock)
-        pred_stock = model_stock.predict(X_stock)
-
-        # ── Métriques RÉALISTES ──
-        # R² brut sur données d'entraînement (pas de test set)
-        def _safe_r2(y_true, y_pred):
-            if len(y_true) < 2 or np.std(y_true) == 0:
-                return 0
-            return max(0, r2_score(y_true, y_pred))
-
-        r2_e = _safe_r2(y_entrees, pred_entrees)
-        r2_s = _safe_r2(y_sorties, pred_sorties)
-        r2_st = _safe_r2(y_stock, pred_stock)
-
-        # Pénalité pour petit jeu de données (R² sur-estimé)
-        # Moins de 12 mois → forte pénalité, plus de 24 → faible pénalité
-        n = len(df)
-        penalite_data = min(1.0, 0.4 + 0.6 * (n / 24))  # 0.4 à 3 mois, 1.0 à 24+
-        # On plafonne à 92% max (jamais 100% - c'est irréaliste)
-        plafond = 0.92
-
-        r2_e_adj = min(r2_e * penalite_data, plafond)
-        r2_s_adj = min(r2_s * penalite_data, plafond)
-        r2_st_adj = min(r2_st * penalite_data, plafond)
-        precision_globale = (r2_e_adj + r2_s_adj + r2_st_adj) / 3
-
-        metrics = {
-            'r2_entrees': round(r2_e_adj * 100, 1),
-            'r2_sorties': round(r2_s_adj * 100, 1),
-            'r2_stock': round(r2_st_adj * 100, 1),
-            'mae_entrees': round(mean_absolute_error(y_entrees, pred_entrees), 1),
-            'mae_sorties': round(mean_absolute_error(y_sorties, pred_sorties), 1),
-            'mae_stock': round(mean_absolute_error(y_stock, pred_stock), 1),
-            'precision_globale': round(precision_globale * 100, 1),
-            'nb_points': n,
-            'fiabilite': (
-                'Faible' if n < 6 else
-                'Moyenne' if n < 12 else
-                'Bonne' if n < 24 else 'Elevee'
-            ),
-        }
-
-        return model_entrees, model_sorties, model_stock, metrics
-
-    @staticmethod
-    def _generate_predictions(df, model_entrees, model_sorties, model_stock,
-                              n_months=36, capacite_max=50000):
-        """Génère n_months de prédictions avec saisonnalité cajou togolaise."""
-        last_date = df['ds'].iloc[-1]
-        last_stock = float(df['stock'].iloc[-1])
-        last_tendance = int(df['tendance'].iloc[-1])
-
-        # Moyennes et écarts-types historiques
-        hist_entrees_mean = max(float(df['entrees'].mean()), 0.1)
-        hist_sorties_mean = max(float(df['sorties'].mean()), 0.1)
-        hist_entrees_std = max(float(df['entrees'].std()), 0.1)
-        hist_sorties_std = max(float(df['sorties'].std()), 0.1)
-
-        # Pondération : plus on a de données, plus le modèle LR pèse
-        # Peu de données → on se base surtout sur la saisonnalité Togo
-        n = len(df)
-        poids_lr = min(0.4, n / 48)  # 0 à 40% max pour le modèle LR
-
-        predictions = []
-        current_stock = last_stock
-        np.random.seed(42)
-
-        for i in range(1, n_months + 1):
-            future_date = last_date + pd.DateOffset(months=i)
-            mois_num = future_date.month
-            tendance = last_tendance + i
-
-            # Base = moyenne historique × coefficient saisonnier Togo
-            coeff_e = StockAnalyticsService.SAISON_ENTREES_TOGO[mois_num]
-            coeff_s = StockAnalyticsService.SAISON_SORTIES_TOGO[mois_num]
-            base_entree = hist_entrees_mean * coeff_e
-            base_sortie = hist_sorties_mean * coeff_s
-
-            # Ajustement LR (petit correctif, plafonné à ±30% de la base)
-            X_e = np.array([[mois_num, tendance, current_stock]])
-            ajust_entree = float(model_entrees.predict(X_e)[0]) - hist_entrees_mean
-            ajust_entree = max(-base_entree * 0.3, min(ajust_entree, base_entree * 0.3))
-            X_s = np.array([[mois_num, tendance, current_stock]])
-            ajust_sortie = float(model_sorties.predict(X_s)[0]) - hist_sorties_mean
-            ajust_sortie = max(-base_sortie * 0.3, min(ajust_sortie, base_sortie * 0.3))
-
-            pred_entree = base_entree + poids_lr * ajust_entree
-            pred_sortie = base_sortie + poids_lr * ajust_sortie
-
-            # Variabilité légère (±10%)
-            pred_entree += np.random.normal(0, hist_entrees_std * 0.08)
-            pred_sortie += np.random.normal(0, hist_sorties_std * 0.08)
-
-            # Borner entre 0 et 1.8× la moyenne (pas de valeurs irréalistes)
-            pred_entree = max(0, min(pred_entree, hist_entrees_mean * 1.8))
-            pred_sortie = max(0, min(pred_sortie, hist_sorties_mean * 1.8))
-
-            # Stock = stock précédent + entrées - sorties (calcul par flux net)
-            pred_stock = current_stock + pred_entree - pred_sortie
-            pred_stock = max(0, min(pred_stock, capacite_max))
-
-            # Confiance décroissante (80% → 50%)
-            confiance = max(50, round(80 - (i / n_months) * 30))
-
-            predictions.append({
-                'ds': future_date.strftime('%Y-%m-%d'),
-                'date_label': f"{StockAnalyticsService.MOIS_LABELS[mois_num - 1]} {future_date.year}",
-                'mois_num': mois_num,
-                'year': future_date.year,
-                'entrees': round(pred_entree, 1),
-                'sorties': round(pred_sortie, 1),
-                'stock': round(pred_stock, 1),
-                'flux_net': round(pred_entree - pred_sortie, 1),
-                'confiance': confiance,
-                'saison': (
-                    'Recolte' if mois_num in (2, 3, 4, 5) else
-                    'Pluies' if mois_num in (6, 7, 8, 9) else
-                    'Seche'
-                ),
-            })
-
-            current_stock = pred_stock
-
-        return predictions
-
-    @staticmethod
-    def _compute_risk_analysis(predictions, seuil_min, seuil_alerte, seuil_optimal):
-        """Calcule l'analyse de risque pour chaque prédiction."""
-        for p in predictions:
-            stock = p['stock']
-            if stock <= seuil_min:
-                p['risque'] = 'CRITIQUE'
-                p['risque_score'] = 100
-            elif stock <= seuil_alerte:
-                p['risque'] = 'ALERTE'
-                p['risque_score'] = 70
-            elif stock <= seuil_optimal:
-                p['risque'] = 'VIGILANCE'
-                p['risque_score'] = 40
-            else:
-                p['risque'] = 'OPTIMAL'
-                p['risque_score'] = 10
-
-        # Mois de rupture estimé
-        rupture_mois = None
-        for p in predictions:
-            if p['stock'] <= seuil_min:
-                rupture_mois = p['date_label']
-                break
-
-        # Tendance globale
-        if len(predictions) >= 2:
-            stocks = [p['stock'] for p in predictions]
-            tendance_pct = ((stocks[-1] - stocks[0]) / max(stocks[0], 1)) * 100
-        else:
-            tendance_pct = 0
-
-        return {
-            'rupture_estimee': rupture_mois,
-            'tendance_pct': round(tendance_pct, 1),
-            'tendance_dir': 'hausse' if tendance_pct > 5 else (
-                'baisse' if tendance_pct < -5 else 'stable'),
-            'mois_critique_count': sum(
-                1 for p in predictions if p['risque'] == 'CRITIQUE'),
-            'mois_alerte_count': sum(
-                1 for p in predictions if p['risque'] == 'ALERTE'),
-            'mois_optimal_count': sum(
-                1 for p in predictions if p['risque'] == 'OPTIMAL'),
-            'stock_moyen_prevu': round(
-                np.mean([p['stock'] for p in predictions]), 1),
-            'stock_min_prevu': round(
-                min(p['stock'] for p in predictions), 1),
-            'stock_max_prevu': round(
-                max(p['stock'] for p in predictions), 1),
-        }
-
-    @staticmethod
-    def _compute_seasonality(df):
-        """Analyse de saisonnalité mensuelle à partir de l'historique."""
-        if len(df) < 6:
-            return None
-
-        seasonal = df.groupby('mois_num').agg(
-            entrees_moy=('entrees', 'mean'),
-            sorties_moy=('sorties', 'mean'),
-            stock_moy=('stock', 'mean'),
-        ).round(1)
-
-        result = {}
-        for mois_num in range(1, 13):
-            label = StockAnalyticsService.MOIS_LABELS[mois_num - 1]
-            if mois_num in seasonal.index:
-                row = seasonal.loc[mois_num]
-                result[label] = {
-                    'entrees': float(row['entrees_moy']),
-                    'sorties': float(row['sorties_moy']),
-                    'stock': float(row['stock_moy']),
-                }
-            else:
-                result[label] = {'entrees': 0, 'sorties': 0, 'stock': 0}
-
-        return result
-
-    @staticmethod
-    def analyze_complete():
-        """Pipeline complet : données réelles → LinearRegression + saisonnalité Togo → prévisions."""
-        result = StockAnalyticsService.generate_stock_data()
-        df = result[0]
-        capacite_max = result[1]
-        seuil_min = result[2]
-        seuil_alerte = result[3]
-        seuil_optimal = result[4]
-        stock_actuel = result[5]
-
-        if df is None or len(df) < 2:
-            return {
-                'current_stock': int(stock_actuel),
-                'precision': 0,
-                'fiabilite': 'Insuffisant',
-                'capacite_max': int(capacite_max),
-                'seuil_min': int(seuil_min),
-                'seuil_alerte': int(seuil_alerte),
-                'seuil_optimal': int(seuil_optimal),
-                'no_data': True,
-            }
-
-        # ── Entraîner les 3 modèles ──
-        model_e, model_s, model_st, metrics = StockAnalyticsService._train_models(df)
-
-        if model_e is None:
-            return {
-                'current_stock': int(stock_actuel),
-                'precision': 0,
-                'fiabilite': 'Insuffisant',
-                'capacite_max': int(capacite_max),
-                'seuil_min': int(seuil_min),
-                'seuil_alerte': int(seuil_alerte),
-                'seuil_optimal': int(seuil_optimal),
-                'no_data': True,
-            }
-
-        # ── Générer 36 mois de prédictions ──
-        predictions = StockAnalyticsService._generate_predictions(
-            df, model_e, model_s, model_st, n_months=36,
-            capacite_max=capacite_max)
-
-        # ── Analyse de risque ──
-        risk_analysis = StockAnalyticsService._compute_risk_analysis(
-            predictions, seuil_min, seuil_alerte, seuil_optimal)
-
-        # ── Saisonnalité ──
-        seasonality = StockAnalyticsService._compute_seasonality(df)
-
-        # ── Historique formaté ──
-        historique = []
-        for _, row in df.iterrows():
-            historique.append({
-                'ds': row['ds'].strftime('%Y-%m-%d'),
-                'date_label': f"{StockAnalyticsService.MOIS_LABELS[row['ds'].month - 1]} {row['ds'].year}",
-                'entrees': round(float(row['entrees']), 1),
-                'sorties': round(float(row['sorties']), 1),
-                'stock': round(float(row['stock']), 1),
-            })
-
-        # ── Prévisions regroupées par année ──
-        forecast_years = sorted(set(p['year'] for p in predictions))
-
-        year_forecasts = []
-        for year in forecast_years:
-            year_data = [p for p in predictions if p['year'] == year]
-            year_forecasts.append({
-                'year': year,
-                'data': year_data,
-                'stock_moyen': round(np.mean([p['stock'] for p in year_data]), 1),
-                'entrees_total': round(sum(p['entrees'] for p in year_data), 1),
-                'sorties_total': round(sum(p['sorties'] for p in year_data), 1),
-            })
-
-        # ── Plage de dates ──
-        first_year = df['ds'].min().year
-        last_data_year = df['ds'].max().year
-        last_forecast_year = predictions[-1]['year'] if predictions else last_data_year
-        date_range_str = f"{first_year}–{last_forecast_year}"
-
-        # ── Recommandations adaptées au contexte togolais ──
-        recommandations = []
-
-        # Info fiabilité
-        fiabilite = metrics.get('fiabilite', 'Faible')
-        nb_pts = metrics.get('nb_points', 0)
-        if nb_pts < 12:
-            recommandations.append({
-                'type': 'info',
-                'icon': 'fas fa-info-circle',
-                'text': f"Fiabilité {fiabilite} ({nb_pts} mois de données). "
-                        f"Les prévisions seront plus précises avec au moins 12 mois d'historique.",
-            })
-
-        if risk_analysis['rupture_estimee']:
-            recommandations.append({
-                'type': 'danger',
-                'icon': 'fas fa-exclamation-circle',
-                'text': f"Risque de rupture de stock estimé en {risk_analysis['rupture_estimee']}. "
-                        f"Prévoir un réapprovisionnement auprès des producteurs avant cette date.",
-            })
-
-        if risk_analysis['tendance_dir'] == 'baisse':
-            recommandations.append({
-                'type': 'warning',
-                'icon': 'fas fa-arrow-trend-down',
-                'text': f"Tendance à la baisse ({risk_analysis['tendance_pct']}%). "
-                        f"Envisager de renforcer les achats pendant la campagne cajou (Fév-Mai).",
-            })
-
-        if risk_analysis['mois_alerte_count'] > 3:
-            recommandations.append({
-                'type': 'warning',
-                'icon': 'fas fa-bell',
-                'text': f"{risk_analysis['mois_alerte_count']} mois en zone d'alerte prévus. "
-                        f"Augmenter les stocks pendant la période de récolte (Mars-Avril).",
-            })
-
-        # Conseil saisonnier selon le mois actuel
-        from django.utils import timezone
-        mois_actuel = timezone.now().month
-        if mois_actuel in (11, 12, 1):
-            recommandations.append({
-                'type': 'info',
-                'icon': 'fas fa-seedling',
-                'text': "Préparer la campagne cajou : la récolte débute en février. "
-                        "Anticiper les achats et préparer l'espace d'entreposage.",
-            })
-        elif mois_actuel in (2, 3, 4, 5):
-            recommandations.append({
-                'type': 'success',
-                'icon': 'fas fa-leaf',
-                'text': "Période de récolte cajou en cours. "
-                        "Moment favorable pour constituer les stocks annuels.",
-            })
-        elif mois_actuel in (6, 7, 8, 9):
-            recommandations.append({
-                'type': 'warning',
-                'icon': 'fas fa-cloud-rain',
-                'text': "Saison des pluies : les approvisionnements sont réduits. "
-                        "Gérer les stocks avec prudence jusqu'à la prochaine récolte.",
-            })
-
-        if risk_analysis['tendance_dir'] == 'hausse':
-            recommandations.append({
-                'type': 'success',
-                'icon': 'fas fa-arrow-trend-up',
-                'text': f"Tendance positive ({risk_analysis['tendance_pct']}%). "
-                        f"Le stock évolue favorablement.",
-            })
-
-        if stock_actuel > seuil_optimal:
-            recommandations.append({
-                'type': 'success',
-                'icon': 'fas fa-check-circle',
-                'text': f"Stock actuel ({int(stock_actuel)} kg) au-dessus du seuil optimal "
-                        f"({int(seuil_optimal)} kg).",
-            })
-
-        return {
-            'current_stock': int(stock_actuel),
-            'precision': metrics.get('precision_globale', 0),
-            'fiabilite': fiabilite,
-            'capacite_max': int(capacite_max),
-            'seuil_min': int(seuil_min),
-            'seuil_alerte': int(seuil_alerte),
-            'seuil_optimal': int(seuil_optimal),
-            'date_range': date_range_str,
-            'nb_mois_historique': len(df),
-            'metrics': metrics,
-            'risk_analysis': risk_analysis,
-            'recommandations': recommandations,
-            'seasonality': seasonality,
-
-            # ── Données JSON pour Chart.js ──
-            'historique_json': json.dumps(historique),
-            'predictions_json': json.dumps(predictions),
-            'year_forecasts_json': json.dumps(year_forecasts),
-            'seasonality_json': json.dumps(seasonality) if seasonality else '{}',
-
-            # ── Données tableau ──
-            'historique_stock': historique[-12:],
-            'predictions_table': predictions[:12],
-            'year_forecasts': year_forecasts,
-        }
+    if commandes:
+        msg += f" {len(commandes)} commande(s) en attente réapprovisionnée(s)."
+    return True, msg
@@ -0,0 +1,19 @@
+"""
+Signaux de l'application gestion.
+"""
+from django.db.models.signals import post_delete, post_save
+
+
+def invalider_previsions(sender, **kwargs):
+    """Toute écriture sur les données d'entrée rend les prévisions obsolètes."""
+    from .analytics import StockAnalyticsService
+    StockAnalyticsService.invalider_cache()
+
+
+def connecter_signaux():
+    from .models import Entrepot, Lot, MouvementStock, Produit, Vente, VenteImmediate
+
+    for modele in (MouvementStock, Lot, Vente, VenteImmediate, Produit, Entrepot):
+        uid = f'invalider_previsions_{modele.__name__}'
+        post_save.connect(invalider_previsions, sender=modele, dispatch_uid=uid)
+        post_delete.connect(invalider_previsions, sender=modele, dispatch_uid=uid)
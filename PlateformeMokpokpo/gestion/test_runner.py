@@ -0,0 +1,73 @@
+"""
+Runner de tests pour les modèles non managés (managed = False).
+
+Les tables du schéma stock_cajou sont créées par les scripts SQL, pas par
+des migrations : pour la base de test, les modèles de gestion passent en
+managed = True et leurs tables sont créées après les migrations (elles
+référencent auth_user), dans le schéma stock_cajou placé en tête du
+search_path — les requêtes SQL brutes qualifiées (stock_cajou.produit…)
+les trouvent. Les triggers et fonctions de sql/ ne sont pas installés.
+
+    python manage.py test gestion
+"""
+from django.test.runner import DiscoverRunner
+
+
+SCHEMA = 'stock_cajou'
+
+
+def _creer_schema(using, **kwargs):
+    """pre_migrate : crée le schéma avant les tables de la base de test."""
+    from django.db import connections
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'CREATE SCHEMA IF NOT EXISTS {SCHEMA}')
+
+
+def _creer_tables(app_config, using, **kwargs):
+    """post_migrate (gestion) : tables des modèles, une fois auth migrée."""
+    from django.db import connections
+
+    connexion = connections[using]
+    existantes = set(connexion.introspection.table_names())
+    with connexion.schema_editor() as editeur:
+        for modele in app_config.get_models():
+            if modele._meta.db_table not in existantes:
+                editeur.create_model(modele)
+
+
+class UnmanagedModelTestRunner(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        from django.apps import apps
+
+        self.modeles_non_managees = [
+            modele for modele in apps.get_app_config('gestion').get_models()
+            if not modele._meta.managed
+        ]
+        for modele in self.modeles_non_managees:
+            modele._meta.managed = True
+        super().setup_test_environment(**kwargs)
+
+    def teardown_test_environment(self, **kwargs):
+        super().teardown_test_environment(**kwargs)
+        for modele in self.modeles_non_managees:
+            modele._meta.managed = False
+
+    def setup_databases(self, **kwargs):
+        from django.db import connections
+        from django.apps import apps
+        from django.db.models.signals import post_migrate, pre_migrate
+
+        for alias in connections:
+            options = connections[alias].settings_dict.setdefault('OPTIONS', {})
+            options['options'] = f'-c search_path={SCHEMA},public'
+        pre_migrate.connect(_creer_schema, dispatch_uid='gestion_test_schema')
+        post_migrate.connect(_creer_tables, sender=apps.get_app_config('gestion'),
+                             dispatch_uid='gestion_test_tables')
+        try:
+            return super().setup_databases(**kwargs)
+        finally:
+            pre_migrate.disconnect(dispatch_uid='gestion_test_schema')
+            post_migrate.disconnect(sender=apps.get_app_config('gestion'),
+                                    dispatch_uid='gestion_test_tables')
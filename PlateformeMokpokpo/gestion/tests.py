@@ -0,0 +1,298 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import audit, services
+from .pagination import totaux
+from .instrumentation import EnregistreurSQL, budget_vue, enregistrer_sql, verifier_budget
+from .models import (
+    Client, Commande, Entrepot, HistoriqueTracabilite, LigneCommande, Lot, MouvementStock,
+    Produit, Vente, ZoneEntrepot,
+)
+
+
+CACHE_LOCAL = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def creer_stock(user, nb_lots, debut=0):
+    """Lots avec un mouvement d'entrée et une vente chacun."""
+    entrepot = Entrepot.objects.first() or Entrepot.objects.create(
+        nom='Entrepôt Sotouboua', capacite_max=Decimal('10000'),
+        seuil_critique=Decimal('500'), quantite_disponible=Decimal('0'))
+    zone = ZoneEntrepot.objects.first() or ZoneEntrepot.objects.create(
+        nom='Zone A', capacite=Decimal('5000'), quantite=Decimal('100'), entrepot=entrepot)
+    produit = Produit.objects.first() or Produit.objects.create(
+        nom='Noix de cajou brutes', categorie='Brut', prix_unitaire=Decimal('350'),
+        stock_physique=Decimal('0'), stock_reserve=Decimal('0'),
+        stock_tampon_comptoir=Decimal('0'), seuil_alerte=Decimal('100'))
+    client = Client.objects.first() or Client.objects.create(nom='AGBEKO')
+    maintenant = timezone.now()
+    for i in range(debut, debut + nb_lots):
+        lot = Lot.objects.create(
+            code_lot=f'LOT-T{i:04d}', quantite_initiale=Decimal('100'),
+            quantite_restante=Decimal('90'), etat='PARTIELLEMENT_SORTI',
+            date_reception=maintenant.date(), produit=produit, zone=zone, user=user)
+        MouvementStock.objects.create(
+            date_mouvement=maintenant - timedelta(minutes=i), type_mouvement='ENTREE',
+            quantite=Decimal('100'), lot=lot, user=user, valide=True)
+        Vente.objects.create(
+            numero_vente=f'VNT-T{i:04d}', date_vente=maintenant - timedelta(minutes=i),
+            quantite_vendue=Decimal('10'), prix_unitaire=Decimal('350'),
+            montant_total=Decimal('3500'), client=client, lot=lot, user=user)
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class DashboardBudgetTests(TestCase):
+    """Le tableau de bord reste sous son budget de requêtes (SQL_BUDGETS)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('gestionnaire', 'g@mokpokpo.tg', 'secret')
+        creer_stock(cls.user, 3)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_dashboard_sous_budget(self):
+        response = verifier_budget(self.client, reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_lots'], 3)
+
+    def test_dashboard_requetes_independantes_du_volume(self):
+        with enregistrer_sql() as avant:
+            self.client.get(reverse('dashboard'))
+        creer_stock(self.user, 10, debut=3)
+        cache.clear()
+        with enregistrer_sql() as apres:
+            self.client.get(reverse('dashboard'))
+        self.assertEqual(apres.nb, avant.nb)
+        self.assertLessEqual(apres.nb, budget_vue('dashboard'))
+
+    def test_dashboard_compteurs_en_cache(self):
+        self.client.get(reverse('dashboard'))
+        with enregistrer_sql() as premier:
+            self.client.get(reverse('dashboard'))
+        cache.clear()
+        with enregistrer_sql() as sans_cache:
+            self.client.get(reverse('dashboard'))
+        # Compteurs en cache : une requête de moins (calculer_indicateurs)
+        self.assertEqual(sans_cache.nb, premier.nb + 1)
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class InstrumentationSQLTests(TestCase):
+    """Compteur SQL, middleware (Server-Timing, log hors budget) et verifier_budget."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('gestionnaire', 'g@mokpokpo.tg', 'secret')
+        creer_stock(cls.user, 2)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_enregistreur_compte_les_requetes(self):
+        with enregistrer_sql(nb_lentes=2) as enregistreur:
+            list(Produit.objects.all())
+            for lot in Lot.objects.all():
+                Produit.objects.get(pk=lot.produit_id)
+        self.assertEqual(enregistreur.nb, 4)
+        self.assertGreater(enregistreur.duree, 0)
+        self.assertEqual(len(enregistreur.plus_lentes()), 2)
+        # La requête répétée par lot est signalée (N+1)
+        (nb, sql), = enregistreur.repetitions()
+        self.assertEqual(nb, 2)
+        self.assertIn('produit', sql)
+
+    def test_enregistreur_hors_contexte(self):
+        enregistreur = EnregistreurSQL()
+        with enregistrer_sql():
+            list(Produit.objects.all())
+        self.assertEqual(enregistreur.nb, 0)
+
+    @override_settings(SQL_INSTRUMENTATION=True)
+    def test_middleware_server_timing(self):
+        with self.assertLogs('gestion.sql', 'INFO'):
+            response = self.client.get(reverse('dashboard'))
+        self.assertRegex(
+            response['Server-Timing'],
+            r'^db;dur=[\d.]+;desc="\d+ requetes SQL", app;dur=[\d.-]+$')
+
+    @override_settings(SQL_INSTRUMENTATION=True, SQL_BUDGETS={'dashboard': 1})
+    def test_middleware_avertit_hors_budget(self):
+        with self.assertLogs('gestion.sql', 'WARNING') as logs:
+            self.client.get(reverse('dashboard'))
+        ligne = json.loads(logs.records[0].getMessage())
+        self.assertEqual(ligne['vue'], 'dashboard')
+        self.assertEqual(ligne['budget'], 1)
+        self.assertGreater(ligne['requetes'], 1)
+
+    @override_settings(SQL_INSTRUMENTATION=True)
+    def test_middleware_info_sous_budget(self):
+        with self.assertLogs('gestion.sql', 'INFO') as logs:
+            self.client.get(reverse('dashboard'))
+        self.assertEqual([r.levelname for r in logs.records], ['INFO'])
+
+    def test_verifier_budget_respecte(self):
+        response = verifier_budget(self.client, reverse('dashboard'), budget=20)
+        self.assertEqual(response.status_code, 200)
+
+    def test_verifier_budget_depasse(self):
+        with self.assertRaisesMessage(AssertionError, 'requêtes SQL pour un budget de 1'):
+            verifier_budget(self.client, reverse('dashboard'), budget=1)
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class TotauxListesTests(TestCase):
+    """Totaux des listes paginées : comptés une fois par jeu de filtres."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('gestionnaire', 'g@mokpokpo.tg', 'secret')
+        creer_stock(cls.user, 3)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_totaux_en_cache_hors_curseur(self):
+        self.assertEqual(totaux('ventes', Vente.objects.all(), QueryDict('search=a'))['nb'], 3)
+        with self.assertNumQueries(0):
+            resume = totaux('ventes', Vente.objects.all(), QueryDict('search=a&apres=xyz'))
+        self.assertEqual(resume['nb'], 3)
+        with self.assertNumQueries(1):
+            totaux('ventes', Vente.objects.all(), QueryDict('search=b'))
+
+    def test_page_suivante_sans_recomptage(self):
+        self.client.get(reverse('historique_list'))
+        with enregistrer_sql() as premiere:
+            reponse = self.client.get(reverse('historique_list'))
+        self.assertEqual(reponse.context['nb_historiques'],
+                         HistoriqueTracabilite.objects.count())
+        cache.clear()
+        with enregistrer_sql() as sans_cache:
+            self.client.get(reverse('historique_list'))
+        # Nombre filtré + cartes (compteurs et types d'action) : deux requêtes
+        self.assertEqual(sans_cache.nb, premiere.nb + 2)
+
+
+class ReallocationReliquatsTests(TestCase):
+    """Réallocation à l'arrivée de stock : priorité, plafond des lots, totaux."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('gestionnaire', 'g@mokpokpo.tg', 'secret')
+        creer_stock(cls.user, 0)
+        cls.produit = Produit.objects.get()
+        Produit.objects.filter(pk=cls.produit.pk).update(stock_physique=Decimal('50'))
+        Lot.objects.create(
+            code_lot='LOT-R0001', quantite_initiale=Decimal('30'),
+            quantite_restante=Decimal('30'), quantite_reservee=Decimal('0'),
+            etat='EN_STOCK', date_reception=timezone.now().date(),
+            produit=cls.produit, zone=ZoneEntrepot.objects.get(), user=cls.user)
+
+    def commande(self, numero, priorite, anciennete):
+        commande = Commande.objects.create(
+            numero_commande=numero, statut='EN_ATTENTE_REAPPRO', priorite=priorite,
+            date_commande=timezone.now() - timedelta(days=anciennete),
+            client=Client.objects.get(), user=self.user, quantite_demandee=Decimal('20'),
+            quantite_reservee=Decimal('0'), quantite_servie=Decimal('0'))
+        LigneCommande.objects.create(
+            commande=commande, produit=self.produit, quantite_demandee=Decimal('20'),
+            quantite_reservee=Decimal('0'), quantite_servie=Decimal('0'),
+            statut_ligne='EN_ATTENTE_REAPPRO')
+        return commande
+
+    def test_urgente_servie_puis_plafond_des_lots(self):
+        normale = self.commande('CMD-R1', 'NORMALE', 2)
+        urgente = self.commande('CMD-R2', 'URGENTE', 1)
+        servies = services.reallouer_reliquats(self.produit, self.user)
+        self.assertEqual({c.pk for c in servies}, {normale.pk, urgente.pk})
+
+        urgente.refresh_from_db()
+        normale.refresh_from_db()
+        self.assertEqual((urgente.statut, urgente.quantite_reservee), ('RESERVEE', Decimal('20')))
+        # 50 en stock physique, mais 30 seulement en lots : 10 pour la suivante
+        self.assertEqual((normale.statut, normale.quantite_reservee),
+                         ('EN_ATTENTE_REAPPRO', Decimal('10')))
+        self.produit.refresh_from_db()
+        self.assertEqual(self.produit.stock_reserve, Decimal('30'))
+
+    def test_sans_disponible(self):
+        Produit.objects.filter(pk=self.produit.pk).update(stock_reserve=Decimal('50'))
+        self.commande('CMD-R1', 'NORMALE', 1)
+        self.assertEqual(services.reallouer_reliquats(self.produit, self.user), [])
+
+
+class EcrivainHistoriqueTests(TestCase):
+    """Thread d'écriture de l'historique : aucune entrée perdue."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('gestionnaire', 'g@mokpokpo.tg', 'secret')
+
+    def entrees(self, nombre):
+        return [
+            HistoriqueTracabilite(date_action=timezone.now(), type_action='TEST',
+                                  description=f'entrée {i}', user=self.user,
+                                  nouvelle_valeur={'rang': i})
+            for i in range(nombre)
+        ]
+
+    def test_echec_ecriture_fichier_secours(self):
+        ecrivain = audit.EcrivainHistorique(10, 10, tentatives=3, pause=0)
+        with tempfile.TemporaryDirectory() as dossier:
+            chemin = os.path.join(dossier, 'secours.jsonl')
+            with override_settings(HISTORIQUE_SECOURS=chemin), \
+                    mock.patch.object(audit, 'ecrire_entrees',
+                                      side_effect=DatabaseError('base indisponible')) as ecrire, \
+                    mock.patch('django.db.close_old_connections'), \
+                    mock.patch.object(connection, 'close'), \
+                    self.assertLogs('gestion.audit', 'WARNING'):
+                ecrivain._ecrire(self.entrees(2))
+            self.assertEqual(ecrire.call_count, 3)
+            with open(chemin, encoding='utf-8') as fichier:
+                self.assertEqual(len(fichier.readlines()), 2)
+
+            # Le fichier de secours se recharge tel quel
+            call_command('loaddata', chemin, verbosity=0)
+        self.assertEqual(
+            sorted(HistoriqueTracabilite.objects.values_list('description', flat=True)),
+            ['entrée 0', 'entrée 1'])
+
+    def test_nouvelle_tentative_reussie(self):
+        ecrivain = audit.EcrivainHistorique(10, 10, tentatives=3, pause=0)
+        ecrire = mock.Mock(side_effect=[DatabaseError('coupure'), None])
+        with mock.patch.object(audit, 'ecrire_entrees', ecrire), \
+                mock.patch.object(audit, 'ecrire_secours') as secours, \
+                mock.patch('django.db.close_old_connections'), \
+                mock.patch.object(connection, 'close'), \
+                self.assertLogs('gestion.audit', 'WARNING'):
+            ecrivain._ecrire(self.entrees(3))
+        self.assertEqual(ecrire.call_count, 2)
+        secours.assert_not_called()
+
+    def test_arret_file_pleine(self):
+        ecrivain = audit.EcrivainHistorique(2, 10)
+        for entree in self.entrees(2):
+            ecrivain.file.put_nowait(entree)
+        # Thread occupé (base lente) : la file pleine ne bloque pas l'arrêt
+        ecrivain._thread = mock.Mock(is_alive=mock.Mock(return_value=True))
+        with mock.patch('django.db.close_old_connections'):
+            ecrivain.arreter(delai=0)
+        self.assertTrue(ecrivain.file.empty())
+        self.assertEqual(HistoriqueTracabilite.objects.filter(type_action='TEST').count(), 2)
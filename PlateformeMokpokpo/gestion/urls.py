@@ -62,6 +62,9 @@ urlpatterns = [
     path('historique/', views.historique_list, name='historique_list'),
     path('historique/<int:pk>/', views.historique_detail, name='historique_detail'),
 
+    # Exports
+    path('exports/<str:nom>/', views.exporter_view, name='exporter'),
+
     # Prévisions de stock
     path('stock-forecast/', views.stock_forecast_view, name='stock_prediction'),
 
@@ -1,6 +1,7 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.contrib.postgres.aggregates import ArrayAgg
 from django.db.models import Q, Sum, Count, F
 from django.utils import timezone
 from django.http import JsonResponse
@@ -21,72 +22,41 @@ from .services import (
     generate_lot_code, generate_vente_numero,
     generate_commande_numero, generate_vente_immediate_numero,
     generate_demande_achat_numero,
-    get_stock_info, reserver_stock_commande,
+    get_stock_info,
     traiter_vente_immediate_service, verifier_et_creer_alertes,
     generer_demande_achat_depuis_alerte, confirmer_commande,
-    livrer_commande, receptionner_demande_achat,
+    livrer_commande, receptionner_demande_achat, reallouer_reliquats,
 )
-
-
-def _log_historique(user, type_action, description, lot=None, commande=None,
-                    ancienne_valeur=None, nouvelle_valeur=None):
-    """Helper pour enregistrer une entrée dans l'historique de traçabilité."""
-    HistoriqueTracabilite.objects.create(
-        date_action=timezone.now(),
-        type_action=type_action,
-        description=description,
-        lot=lot,
-        commande=commande,
-        user=user,
-        ancienne_valeur=ancienne_valeur,
-        nouvelle_valeur=nouvelle_valeur,
-    )
-
-
-def _model_to_dict(instance, fields=None):
-    """Convertit un objet model en dict lisible pour l'historique."""
-    from django.forms.models import model_to_dict as django_m2d
-    data = {}
-    if fields:
-        field_list = fields
-    else:
-        field_list = [f.name for f in instance._meta.fields
-                      if f.name not in ('id', 'user', 'date_creation')]
-    for field_name in field_list:
-        try:
-            val = getattr(instance, field_name, None)
-            if hasattr(val, '__str__') and not isinstance(val, (str, int, float, bool, type(None))):
-                val = str(val)
-            data[field_name] = val
-        except Exception:
-            pass
-    return data
+from .pagination import paginer, totaux
+from .recherche import rechercher
+from .kpi import indicateurs
+from .alertes import produits_critiques, annoter_priorite
+from .filtres import (
+    filtrer_ventes, filtrer_mouvements, filtrer_historique,
+    filtrer_ventes_immediates,
+)
+# Historique écrit en lot à la fin de la requête (gestion/audit.py)
+from .audit import journaliser as _log_historique, valeurs_modele as _model_to_dict
 
 
 @login_required
 def dashboard(request):
     """Tableau de bord principal du gestionnaire"""
+    kpi = indicateurs()
     context = {
-        'total_clients': Client.objects.count(),
-        'total_produits': Produit.objects.count(),
-        'total_lots': Lot.objects.count(),
-        'total_ventes': Vente.objects.count(),
-        'total_entrepots': Entrepot.objects.count(),
-        'total_producteurs': Producteur.objects.count(),
-        'total_commandes': Commande.objects.exclude(statut__in=['LIVREE', 'ANNULEE']).count(),
-        'total_alertes': AlerteStock.objects.filter(statut='ACTIVE').count(),
+        'total_clients': kpi['total_clients'],
+        'total_produits': kpi['total_produits'],
+        'total_lots': kpi['total_lots'],
+        'total_ventes': kpi['total_ventes'],
+        'total_entrepots': kpi['total_entrepots'],
+        'total_producteurs': kpi['total_producteurs'],
+        'total_commandes': kpi['total_commandes'],
+        'total_alertes': kpi['alertes_actives'],
 
         # Statistiques détaillées
-        'lots_expiration_proche': Lot.objects.filter(
-            date_expiration__lte=timezone.now() + timedelta(days=30),
-            date_expiration__gte=timezone.now()
-        ).count(),
-        'lots_expires': Lot.objects.filter(
-            date_expiration__lt=timezone.now()
-        ).count(),
-        'entrepots_alerte': Entrepot.objects.filter(
-            quantite_disponible__lte=F('seuil_critique')
-        ).count(),
+        'lots_expiration_proche': kpi['lots_expiration_proche'],
+        'lots_expires': kpi['lots_expires'],
+        'entrepots_alerte': kpi['entrepots_alerte'],
 
         # Derniers mouvements
         'derniers_mouvements': MouvementStock.objects.select_related(
@@ -114,16 +84,15 @@ def clients_list(request):
     queryset = Client.objects.all()
     search_query = request.GET.get('search', '')
 
-    if search_query:
-        queryset = queryset.filter(
-            Q(nom__icontains=search_query) |
-            Q(prenom__icontains=search_query) |
-            Q(email__icontains=search_query) |
-            Q(entreprise__icontains=search_query)
-        )
+    queryset = rechercher(queryset, search_query,
+                          ('nom', 'prenom', 'email', 'entreprise'))
+
+    clients, page = paginer(
+        request, queryset, '-pertinence' if search_query else '-date_inscription')
 
     context = {
-        'clients': queryset.order_by('-date_inscription'),
+        'clients': clients,
+        'page': page,
         'search_query': search_query,
     }
     return render(request, 'gestion/clients/list.html', context)
@@ -685,11 +654,7 @@ def lots_list(request):
     etat_filter = request.GET.get('etat', '')
     produit_filter = request.GET.get('produit', '')
 
-    if search_query:
-        queryset = queryset.filter(
-            Q(code_lot__icontains=search_query) |
-            Q(produit__nom__icontains=search_query)
-        )
+    queryset = rechercher(queryset, search_query, ('code_lot', 'produit__nom'))
 
     if etat_filter:
         queryset = queryset.filter(etat=etat_filter)
@@ -697,8 +662,13 @@ def lots_list(request):
     if produit_filter:
         queryset = queryset.filter(produit_id=produit_filter)
 
+    lots, page = paginer(
+        request, queryset, '-pertinence' if search_query else '-date_creation')
+
     context = {
-        'lots': queryset.order_by('-date_creation'),
+        'lots': lots,
+        'page': page,
+        'nb_lots': totaux('lots', queryset, request.GET)['nb'],
         'search_query': search_query,
         'etats': Lot.objects.values_list('etat', flat=True).distinct(),
         'produits': Produit.objects.all(),
@@ -740,6 +710,9 @@ def lots_create(request):
                 valide=True,
             )
 
+            # ── Compléter les commandes en attente de ce produit ──
+            commandes_servies = reallouer_reliquats(produit, request.user)
+
             # ── Vérifier les alertes (résoudre si stock remonté) ──
             verifier_et_creer_alertes(produit, request.user)
 
@@ -750,6 +723,10 @@ def lots_create(request):
                 nouvelle_valeur=_model_to_dict(lot, ['code_lot', 'quantite_initiale', 'qualite', 'etat', 'date_reception', 'date_expiration']),
             )
             messages.success(request, f'Lot {lot.code_lot} créé avec succès')
+            if commandes_servies:
+                messages.info(request,
+                    f'{len(commandes_servies)} commande(s) en attente de réappro '
+                    f'complétée(s) avec ce lot.')
             return redirect('lots_list')
     else:
         form = LotForm()
@@ -844,24 +821,19 @@ def ventes_list(request):
         'client', 'lot', 'user'
     ).all()
     search_query = request.GET.get('search', '')
-    date_filter = request.GET.get('date', '')
-
-    if search_query:
-        queryset = queryset.filter(
-            Q(numero_vente__icontains=search_query) |
-            Q(client__nom__icontains=search_query) |
-            Q(lot__code_lot__icontains=search_query)
-        )
+    queryset = filtrer_ventes(queryset, request.GET)
 
-    if date_filter:
-        queryset = queryset.filter(date_vente__date=date_filter)
+    ventes, page = paginer(
+        request, queryset, '-pertinence' if search_query else '-date_vente')
+    resume = totaux('ventes', queryset, request.GET,
+                    nb=Count('pk'), montant=Sum('montant_total'))
 
     context = {
-        'ventes': queryset.order_by('-date_vente'),
+        'ventes': ventes,
+        'page': page,
+        'nb_ventes': resume['nb'],
         'search_query': search_query,
-        'total_ventes': queryset.aggregate(
-            Sum('montant_total')
-        )['montant_total__sum'] or 0,
+        'total_ventes': resume['montant'] or 0,
     }
     return render(request, 'gestion/ventes/list.html', context)
 
@@ -961,9 +933,13 @@ def mouvements_list(request):
     queryset = MouvementStock.objects.select_related(
         'lot', 'user', 'zone_origine', 'zone_destination'
     ).all()
+    queryset = filtrer_mouvements(queryset, request.GET)
+
+    mouvements, page = paginer(request, queryset, '-date_mouvement')
 
     context = {
-        'mouvements': queryset.order_by('-date_mouvement'),
+        'mouvements': mouvements,
+        'page': page,
     }
     return render(request, 'gestion/mouvements/list.html', context)
 
@@ -1035,37 +1011,36 @@ def mouvements_delete(request, pk):
 @login_required
 def historique_list(request):
     """Liste de l'historique de traçabilité"""
+    # Le tsvector de recherche n'est pas affiché : ne pas le charger
     queryset = HistoriqueTracabilite.objects.select_related(
         'lot', 'commande', 'user'
-    ).all()
+    ).defer('recherche')
     search_query = request.GET.get('search', '')
     type_action_filter = request.GET.get('type_action', '')
-
-    if search_query:
-        queryset = queryset.filter(
-            Q(lot__code_lot__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(user__username__icontains=search_query) |
-            Q(commande__numero_commande__icontains=search_query)
-        )
-
-    if type_action_filter:
-        queryset = queryset.filter(type_action=type_action_filter)
-
-    # Statistiques pour les cartes
-    all_qs = HistoriqueTracabilite.objects.all()
-    types_action = list(
-        HistoriqueTracabilite.objects.values_list('type_action', flat=True).distinct()
+    queryset = filtrer_historique(queryset, request.GET)
+
+    # Statistiques pour les cartes : toute la table, une requête en cache
+    cartes = totaux(
+        'historique:cartes', HistoriqueTracabilite.objects.all(),
+        types_action=ArrayAgg('type_action', distinct=True, order_by='type_action'),
+        count_creations=Count('pk', filter=Q(type_action='creation')),
+        count_modifications=Count('pk', filter=Q(type_action='modification')),
+        count_suppressions=Count('pk', filter=Q(type_action='suppression')),
     )
 
+    historiques, page = paginer(
+        request, queryset, '-pertinence' if search_query else '-date_action')
+
     context = {
-        'historiques': queryset.order_by('-date_action'),
+        'historiques': historiques,
+        'page': page,
+        'nb_historiques': totaux('historique', queryset, request.GET)['nb'],
         'search_query': search_query,
         'type_action_filter': type_action_filter,
-        'types_action': types_action,
-        'count_creations': all_qs.filter(type_action='creation').count(),
-        'count_modifications': all_qs.filter(type_action='modification').count(),
-        'count_suppressions': all_qs.filter(type_action='suppression').count(),
+        'types_action': cartes['types_action'] or [],
+        'count_creations': cartes['count_creations'],
+        'count_modifications': cartes['count_modifications'],
+        'count_suppressions': cartes['count_suppressions'],
     }
     return render(request, 'gestion/historique/list.html', context)
 
@@ -1078,6 +1053,63 @@ def historique_detail(request, pk):
     return render(request, 'gestion/historique/detail.html', context)
 
 
+# ==================== EXPORTS ====================
+
+# Liste d'origine de chaque extraction (retour en cas d'erreur)
+EXPORT_LISTES = {
+    'mouvements': 'mouvements_list',
+    'ventes': 'ventes_list',
+    'ventes_immediates': 'ventes_immediates_list',
+    'historique': 'historique_list',
+}
+
+
+@login_required
+def exporter_view(request, nom):
+    """
+    Extraction CSV (par défaut) ou XLSX d'une liste, avec ses filtres GET.
+    Le CSV est envoyé au fil de la lecture (StreamingHttpResponse) ;
+    le XLSX est écrit dans un fichier temporaire puis servi, et borné à
+    EXPORT_XLSX_MAX_LIGNES : au-delà, CSV ou manage.py exporter_donnees.
+    """
+    from django.conf import settings
+    from django.http import Http404, StreamingHttpResponse, FileResponse
+    from django.urls import reverse
+    from .exports import EXPORTS, lignes_csv, ecrire_xlsx, depasse
+    import tempfile
+
+    if nom not in EXPORTS:
+        raise Http404("Extraction inconnue")
+    fichier_nom = f"{nom}_{timezone.localdate():%Y%m%d}"
+
+    if request.GET.get('format') == 'xlsx':
+        limite = getattr(settings, 'EXPORT_XLSX_MAX_LIGNES', 100000)
+        if depasse(nom, request.GET, limite):
+            messages.warning(
+                request,
+                f"Plus de {limite} lignes : l'export XLSX est trop long pour une page web. "
+                f"Réduire la période (du / au), exporter en CSV, ou lancer "
+                f"« python manage.py exporter_donnees {nom} --format xlsx -o fichier.xlsx ».")
+            params = request.GET.copy()
+            params.pop('format', None)
+            url = reverse(EXPORT_LISTES[nom])
+            return redirect(f'{url}?{params.urlencode()}' if params else url)
+        fichier = tempfile.TemporaryFile()
+        try:
+            ecrire_xlsx(nom, request.GET, fichier)
+        except ImportError:
+            fichier.close()
+            messages.error(request, "Export XLSX indisponible : installer openpyxl.")
+            return redirect(EXPORT_LISTES[nom])
+        fichier.seek(0)
+        return FileResponse(fichier, as_attachment=True, filename=f'{fichier_nom}.xlsx')
+
+    response = StreamingHttpResponse(
+        lignes_csv(nom, request.GET), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{fichier_nom}.csv"'
+    return response
+
+
 from django.contrib.auth.views import LoginView, LogoutView
 from django.urls import reverse_lazy
 
@@ -1100,8 +1132,29 @@ class CustomLogoutView(LogoutView):
 
 def stock_forecast_view(request):
     """Prévisions de stock IA - Ferme Mokpokpo (via StockAnalyticsService)"""
-    from .services import StockAnalyticsService
-    context = StockAnalyticsService.analyze_complete()
+    from .analytics import StockAnalyticsService
+    from django.conf import settings
+    from datetime import timedelta
+
+    # Dernier instantané précalculé (manage.py precompute_forecasts)
+    snapshot = StockAnalyticsService.dernier_snapshot()
+    age_max = timedelta(seconds=getattr(settings, 'FORECAST_SNAPSHOT_MAX_AGE', 10800))
+    if snapshot and timezone.now() - snapshot[1] <= age_max:
+        contexte, genere_le, groupes = snapshot
+        context = dict(contexte)
+        context['snapshot_genere_le'] = genere_le
+        context['previsions_groupes'] = groupes
+    else:
+        # Aucun précalcul récent : calcul à la demande, mis en cache
+        # (invalidé à chaque écriture de stock)
+        context = dict(StockAnalyticsService.analyze_cached())
+        context['previsions_groupes'] = None
+        if snapshot:
+            # Instantané périmé (cron arrêté ?) : prévisions par groupe
+            # affichées, mais signalées comme anciennes
+            context['snapshot_genere_le'] = snapshot[1]
+            context['previsions_groupes'] = snapshot[2]
+            context['snapshot_perime'] = True
     return render(request, 'gestion/stock-forecast/stock_forecast.html', context)
 
 
@@ -1164,17 +1217,18 @@ def commandes_list(request):
     search_query = request.GET.get('search', '')
     statut_filter = request.GET.get('statut', '')
 
-    if search_query:
-        queryset = queryset.filter(
-            Q(numero_commande__icontains=search_query) |
-            Q(client__nom__icontains=search_query)
-        )
+    queryset = rechercher(queryset, search_query, ('numero_commande', 'client__nom'))
 
     if statut_filter:
         queryset = queryset.filter(statut=statut_filter)
 
+    commandes, page = paginer(
+        request, queryset, '-pertinence' if search_query else '-date_commande')
+
     context = {
-        'commandes': queryset.order_by('-date_commande'),
+        'commandes': commandes,
+        'page': page,
+        'nb_commandes': totaux('commandes', queryset, request.GET)['nb'],
         'search_query': search_query,
         'statut_filter': statut_filter,
     }
@@ -1416,6 +1470,10 @@ def commandes_delete(request, pk):
 
 # ==================== VUES ALERTES STOCK ====================
 
+# Produits critiques affichés dans le panneau du centre d'alertes
+PRODUITS_CRITIQUES_AFFICHES = 10
+
+
 @login_required
 def alertes_list(request):
     """Tableau de bord des alertes de stock — vue dynamique et analytique."""
@@ -1428,59 +1486,37 @@ def alertes_list(request):
 
     if statut_filter:
         queryset = queryset.filter(statut=statut_filter)
-    if search_query:
-        queryset = queryset.filter(
-            Q(produit__nom__icontains=search_query) |
-            Q(observations__icontains=search_query)
-        )
-
-    alertes = queryset.order_by('-date_alerte')
-
-    # ── KPI statistiques ──
-    total_alertes = AlerteStock.objects.count()
-    alertes_actives = AlerteStock.objects.filter(statut='ACTIVE').count()
-    alertes_traitees = AlerteStock.objects.filter(statut='TRAITEE').count()
-    alertes_ignorees = AlerteStock.objects.filter(statut='IGNOREE').count()
-    alertes_avec_da = AlerteStock.objects.filter(demande_achat_generee=True).count()
-
-    # ── Produits en état critique (stock < seuil) ──
-    produits_critiques = []
-    for produit in Produit.objects.all():
-        stock_dispo = produit.stock_disponible or Decimal('0.00')
-        seuil = produit.seuil_alerte or Decimal('0.00')
-        if seuil > 0:
-            ratio = (stock_dispo / seuil * 100) if seuil else 0
-            ratio = min(ratio, 100)
-            if stock_dispo <= seuil:
-                severity = 'CRITIQUE' if stock_dispo <= seuil * Decimal('0.25') else (
-                    'URGENT' if stock_dispo <= seuil * Decimal('0.50') else 'ATTENTION'
-                )
-                produits_critiques.append({
-                    'produit': produit,
-                    'stock_dispo': stock_dispo,
-                    'seuil': seuil,
-                    'ratio': round(float(ratio), 1),
-                    'severity': severity,
-                    'deficit': seuil - stock_dispo,
-                })
-
-    # Trier par sévérité (les plus critiques en premier)
-    severity_order = {'CRITIQUE': 0, 'URGENT': 1, 'ATTENTION': 2}
-    produits_critiques.sort(key=lambda x: (severity_order.get(x['severity'], 3), -float(x['deficit'])))
-
-    # ── Filtrer par priorité côté template ──
+    queryset = rechercher(queryset, search_query, ('produit__nom', 'observations'))
+    # Priorité calculée en SQL (CRITIQUE ≤ 25 % du seuil, URGENT ≤ 50 %…)
     if priorite_filter:
-        alertes_list_filtered = []
-        for a in alertes:
-            if a.produit and a.seuil_alerte and a.seuil_alerte > 0:
-                ratio = float(a.stock_actuel / a.seuil_alerte * 100)
-                if priorite_filter == 'CRITIQUE' and ratio <= 25:
-                    alertes_list_filtered.append(a)
-                elif priorite_filter == 'URGENT' and 25 < ratio <= 50:
-                    alertes_list_filtered.append(a)
-                elif priorite_filter == 'ATTENTION' and ratio > 50:
-                    alertes_list_filtered.append(a)
-        alertes = alertes_list_filtered
+        queryset = annoter_priorite(queryset).filter(priorite=priorite_filter)
+
+    nb_alertes = totaux('alertes', queryset, request.GET)['nb']
+    alertes, page = paginer(
+        request, queryset, '-pertinence' if search_query else '-date_alerte')
+
+    # ── KPI statistiques (gestion.kpi, une requête en cache) ──
+    kpi = indicateurs()
+    total_alertes = kpi['alertes_total']
+    alertes_actives = kpi['alertes_actives']
+    alertes_traitees = kpi['alertes_traitees']
+    alertes_ignorees = kpi['alertes_ignorees']
+    alertes_avec_da = kpi['alertes_avec_da']
+
+    # ── Produits en état critique (stock ≤ seuil), calculés en SQL ──
+    critiques = produits_critiques()
+    nb_produits_critiques = critiques.count()
+    produits_critiques_top = [
+        {
+            'produit': produit,
+            'stock_dispo': produit.stock_dispo,
+            'seuil': produit.seuil,
+            'ratio': float(produit.ratio),
+            'severity': produit.severite,
+            'deficit': produit.deficit,
+        }
+        for produit in critiques[:PRODUITS_CRITIQUES_AFFICHES]
+    ]
 
     # ── Entrepôts en alerte (quantité ≤ seuil critique) ──
     entrepots_alerte = Entrepot.objects.filter(
@@ -1494,10 +1530,7 @@ def alertes_list(request):
         etat__in=['EN_STOCK', 'PARTIELLEMENT_SORTI', 'RESERVE']
     ).select_related('produit').order_by('date_expiration')[:5]
 
-    lots_expires = Lot.objects.filter(
-        date_expiration__lt=timezone.now(),
-        etat__in=['EN_STOCK', 'PARTIELLEMENT_SORTI']
-    ).count()
+    lots_expires = kpi['lots_expires_en_stock']
 
     # ── Dernières alertes traitées ──
     derniers_traitements = AlerteStock.objects.filter(
@@ -1510,6 +1543,8 @@ def alertes_list(request):
 
     context = {
         'alertes': alertes,
+        'page': page,
+        'nb_alertes': nb_alertes,
         'statut_filter': statut_filter,
         'search_query': search_query,
         'priorite_filter': priorite_filter,
@@ -1521,8 +1556,8 @@ def alertes_list(request):
         'alertes_avec_da': alertes_avec_da,
         'taux_resolution': taux_resolution,
         # Analyses
-        'produits_critiques': produits_critiques,
-        'nb_produits_critiques': len(produits_critiques),
+        'produits_critiques': produits_critiques_top,
+        'nb_produits_critiques': nb_produits_critiques,
         'entrepots_alerte': entrepots_alerte,
         'lots_expirant': lots_expirant,
         'lots_expires': lots_expires,
@@ -1543,8 +1578,12 @@ def demandes_list(request):
     if statut_filter:
         queryset = queryset.filter(statut=statut_filter)
 
+    demandes, page = paginer(request, queryset, '-date_creation')
+
     context = {
-        'demandes': queryset.order_by('-date_creation'),
+        'demandes': demandes,
+        'page': page,
+        'nb_demandes': totaux('demandes', queryset, request.GET)['nb'],
         'statut_filter': statut_filter,
     }
     return render(request, 'gestion/demandes/list.html', context)
@@ -1597,18 +1636,19 @@ def ventes_immediates_list(request):
         'produit', 'client', 'user'
     ).all()
     search_query = request.GET.get('search', '')
-    if search_query:
-        queryset = queryset.filter(
-            Q(numero_vente__icontains=search_query) |
-            Q(client__nom__icontains=search_query)
-        )
+    queryset = filtrer_ventes_immediates(queryset, request.GET)
+
+    ventes_immediates, page = paginer(
+        request, queryset, '-pertinence' if search_query else '-date_vente')
+    resume = totaux('ventes_immediates', queryset, request.GET,
+                    nb=Count('pk'), montant=Sum('montant_total'))
 
     context = {
-        'ventes_immediates': queryset.order_by('-date_vente'),
+        'ventes_immediates': ventes_immediates,
+        'page': page,
+        'nb_ventes_immediates': resume['nb'],
         'search_query': search_query,
-        'total': queryset.aggregate(
-            Sum('montant_total')
-        )['montant_total__sum'] or 0,
+        'total': resume['montant'] or 0,
     }
     return render(request, 'gestion/ventes_immediates/list.html', context)
 
@@ -0,0 +1,39 @@
+-- =====================================================================
+-- 001 — Séquences de numérotation des documents
+-- Remplace le scan « ORDER BY numero DESC » de l'ancien _next_numero :
+-- nextval() est atomique, sans verrou, et en O(1).
+--
+-- Application : psql -d <base> -f sql/001_sequences_numerotation.sql
+-- Rejouable sans risque (IF NOT EXISTS + recalage sur l'existant).
+-- =====================================================================
+
+BEGIN;
+
+CREATE SEQUENCE IF NOT EXISTS stock_cajou.seq_numero_lot;
+CREATE SEQUENCE IF NOT EXISTS stock_cajou.seq_numero_vente;
+CREATE SEQUENCE IF NOT EXISTS stock_cajou.seq_numero_commande;
+CREATE SEQUENCE IF NOT EXISTS stock_cajou.seq_numero_vente_immediate;
+CREATE SEQUENCE IF NOT EXISTS stock_cajou.seq_numero_demande_achat;
+
+-- Recaler chaque séquence sur le dernier numéro déjà attribué
+SELECT setval('stock_cajou.seq_numero_lot',
+    COALESCE(MAX(substring(code_lot FROM '([0-9]+)$')::bigint), 0) + 1, false)
+FROM stock_cajou.lot WHERE code_lot LIKE 'LOT-%';
+
+SELECT setval('stock_cajou.seq_numero_vente',
+    COALESCE(MAX(substring(numero_vente FROM '([0-9]+)$')::bigint), 0) + 1, false)
+FROM stock_cajou.vente WHERE numero_vente LIKE 'VNT-%';
+
+SELECT setval('stock_cajou.seq_numero_commande',
+    COALESCE(MAX(substring(numero_commande FROM '([0-9]+)$')::bigint), 0) + 1, false)
+FROM stock_cajou.commande WHERE numero_commande LIKE 'CMD-%';
+
+SELECT setval('stock_cajou.seq_numero_vente_immediate',
+    COALESCE(MAX(substring(numero_vente FROM '([0-9]+)$')::bigint), 0) + 1, false)
+FROM stock_cajou.vente_immediate WHERE numero_vente LIKE 'VI-%';
+
+SELECT setval('stock_cajou.seq_numero_demande_achat',
+    COALESCE(MAX(substring(numero_da FROM '([0-9]+)$')::bigint), 0) + 1, false)
+FROM stock_cajou.demande_achat WHERE numero_da LIKE 'DA-%';
+
+COMMIT;
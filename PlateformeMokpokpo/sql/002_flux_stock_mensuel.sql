@@ -0,0 +1,451 @@
+-- =====================================================================
+-- 002 — Table de flux mensuels (mois × produit × entrepôt × type de flux)
+-- Alimente StockAnalyticsService : les prévisions lisent O(mois) lignes
+-- au lieu de ré-agréger tout l'historique des mouvements.
+--
+-- Tenue à jour par triggers sur mouvement_stock, lot, vente et
+-- vente_immediate (insert / update / delete, y compris en masse).
+-- Les triggers sont au niveau instruction (tables de transition) et
+-- n'écrivent qu'en ajout dans flux_stock_mensuel_delta : aucun écrivain
+-- ne verrouille une ligne de cumul, deux ventes simultanées sur un même
+-- produit ne s'attendent pas. Les deltas sont reportés dans
+-- flux_stock_mensuel par compactage (cron, toutes les quelques minutes) :
+--   python manage.py rebuild_flux_stock --compacter
+-- Lecture : vue flux_stock_mensuel_courant = cumuls + deltas en attente.
+-- Reconstruction complète : python manage.py rebuild_flux_stock
+-- (ou SELECT stock_cajou.fn_flux_mensuel_reconstruire();).
+--
+-- Types de flux :
+--   MVT_ENTREE      mouvements ENTREE, AJUSTEMENT, LIBERATION
+--   MVT_SORTIE      mouvements SORTIE, RESERVATION
+--   MVT_AUTRE       autres mouvements (comptent pour la présence du mois)
+--   RECEPTION_LOT   quantité initiale des lots reçus
+--   VENTE           ventes sur lot
+--   VENTE_IMMEDIATE ventes immédiates (sans lot : entrepot_id = 0)
+--
+-- Application : psql -d <base> -f sql/002_flux_stock_mensuel.sql
+-- =====================================================================
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS stock_cajou.flux_stock_mensuel (
+    id            bigserial PRIMARY KEY,
+    mois          date          NOT NULL,
+    produit_id    bigint        NOT NULL,
+    entrepot_id   bigint        NOT NULL DEFAULT 0,  -- 0 = non imputé à un entrepôt
+    type_flux     varchar(20)   NOT NULL,
+    quantite      numeric(14,2) NOT NULL DEFAULT 0,
+    nb_operations integer       NOT NULL DEFAULT 0,
+    CONSTRAINT flux_stock_mensuel_uniq UNIQUE (mois, produit_id, entrepot_id, type_flux)
+);
+
+-- Mois (UTC, comme TruncMonth côté Django)
+CREATE OR REPLACE FUNCTION stock_cajou.fn_mois(p timestamptz) RETURNS date
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT date_trunc('month', p AT TIME ZONE 'UTC')::date
+$$;
+
+CREATE OR REPLACE FUNCTION stock_cajou.fn_mois(p date) RETURNS date
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT date_trunc('month', p::timestamp)::date
+$$;
+
+CREATE OR REPLACE FUNCTION stock_cajou.fn_type_flux_mouvement(p_type varchar) RETURNS varchar
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT CASE
+        WHEN p_type IN ('ENTREE', 'AJUSTEMENT', 'LIBERATION') THEN 'MVT_ENTREE'
+        WHEN p_type IN ('SORTIE', 'RESERVATION') THEN 'MVT_SORTIE'
+        ELSE 'MVT_AUTRE'
+    END
+$$;
+
+-- Deltas en attente de compactage (ajout seul, pas de contrainte d'unicité)
+CREATE TABLE IF NOT EXISTS stock_cajou.flux_stock_mensuel_delta (
+    id            bigserial PRIMARY KEY,
+    mois          date          NOT NULL,
+    produit_id    bigint        NOT NULL,
+    entrepot_id   bigint        NOT NULL DEFAULT 0,
+    type_flux     varchar(20)   NOT NULL,
+    quantite      numeric(14,2) NOT NULL DEFAULT 0,
+    nb_operations integer       NOT NULL DEFAULT 0
+);
+
+-- Ancienne version : un UPSERT par ligne sur le cumul du mois
+DROP TRIGGER IF EXISTS trg_flux_mensuel_mouvement ON stock_cajou.mouvement_stock;
+DROP TRIGGER IF EXISTS trg_flux_mensuel_lot ON stock_cajou.lot;
+DROP TRIGGER IF EXISTS trg_flux_mensuel_vente ON stock_cajou.vente;
+DROP TRIGGER IF EXISTS trg_flux_mensuel_vente_immediate ON stock_cajou.vente_immediate;
+DROP FUNCTION IF EXISTS stock_cajou.fn_flux_mensuel_cumuler(date, bigint, bigint, varchar, numeric, integer);
+
+-- Chaque fonction lit les tables de transition de l'instruction
+-- (ancien / nouveau) et insère un delta par (mois, produit, entrepôt, type).
+-- UPDATE : seules les lignes dont une colonne suivie a changé comptent.
+
+-- ── mouvement_stock ──
+CREATE OR REPLACE FUNCTION stock_cajou.fn_flux_mensuel_mouvement() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO stock_cajou.flux_stock_mensuel_delta
+            (mois, produit_id, entrepot_id, type_flux, quantite, nb_operations)
+        SELECT stock_cajou.fn_mois(n.date_mouvement), l.produit_id, COALESCE(z.entrepot_id, 0),
+               stock_cajou.fn_type_flux_mouvement(n.type_mouvement),
+               COALESCE(sum(n.quantite), 0), count(*)
+        FROM nouveau n
+        JOIN stock_cajou.lot l ON l.id = n.lot_id
+        JOIN stock_cajou.zone_entrepot z ON z.id = l.zone_id
+        WHERE n.date_mouvement IS NOT NULL
+        GROUP BY 1, 2, 3, 4;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO stock_cajou.flux_stock_mensuel_delta
+            (mois, produit_id, entrepot_id, type_flux, quantite, nb_operations)
+        SELECT stock_cajou.fn_mois(o.date_mouvement), l.produit_id, COALESCE(z.entrepot_id, 0),
+               stock_cajou.fn_type_flux_mouvement(o.type_mouvement),
+               -COALESCE(sum(o.quantite), 0), -count(*)
+        FROM ancien o
+        JOIN stock_cajou.lot l ON l.id = o.lot_id
+        JOIN stock_cajou.zone_entrepot z ON z.id = l.zone_id
+        WHERE o.date_mouvement IS NOT NULL
+        GROUP BY 1, 2, 3, 4;
+    ELSE
+        INSERT INTO stock_cajou.flux_stock_mensuel_delta
+            (mois, produit_id, entrepot_id, type_flux, quantite, nb_operations)
+        SELECT d.mois, l.produit_id, COALESCE(z.entrepot_id, 0), d.type_flux,
+               sum(d.quantite), sum(d.nb)
+        FROM (
+            SELECT o.lot_id, stock_cajou.fn_mois(o.date_mouvement) AS mois,
+                   stock_cajou.fn_type_flux_mouvement(o.type_mouvement) AS type_flux,
+                   -COALESCE(o.quantite, 0) AS quantite, -1 AS nb
+            FROM ancien o JOIN nouveau n ON n.id = o.id
+            WHERE (o.date_mouvement, o.type_mouvement, o.quantite, o.lot_id)
+                  IS DISTINCT FROM (n.date_mouvement, n.type_mouvement, n.quantite, n.lot_id)
+            UNION ALL
+            SELECT n.lot_id, stock_cajou.fn_mois(n.date_mouvement),
+                   stock_cajou.fn_type_flux_mouvement(n.type_mouvement),
+                   COALESCE(n.quantite, 0), 1
+            FROM nouveau n JOIN ancien o ON o.id = n.id
+            WHERE (o.date_mouvement, o.type_mouvement, o.quantite, o.lot_id)
+                  IS DISTINCT FROM (n.date_mouvement, n.type_mouvement, n.quantite, n.lot_id)
+        ) d
+        JOIN stock_cajou.lot l ON l.id = d.lot_id
+        JOIN stock_cajou.zone_entrepot z ON z.id = l.zone_id
+        WHERE d.mois IS NOT NULL
+        GROUP BY 1, 2, 3, 4
+        HAVING sum(d.nb) <> 0 OR sum(d.quantite) <> 0;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_flux_mensuel_mouvement_ins ON stock_cajou.mouvement_stock;
+DROP TRIGGER IF EXISTS trg_flux_mensuel_mouvement_maj ON stock_cajou.mouvement_stock;
+DROP TRIGGER IF EXISTS trg_flux_mensuel_mouvement_sup ON stock_cajou.mouvement_stock;
+CREATE TRIGGER trg_flux_mensuel_mouvement_ins
+    AFTER INSERT ON stock_cajou.mouvement_stock
+    REFERENCING NEW TABLE AS nouveau
+    FOR EACH STATEMENT EXECUTE FUNCTION stock_cajou.fn_flux_mensuel_mouvement();
+CREATE TRIGGER trg_flux_mensuel_mouvement_maj
+    AFTER UPDATE ON stock_cajou.mouvement_stock
+    REFERENCING OLD TABLE AS ancien NEW TABLE AS nouveau
+    FOR EACH STATEMENT EXECUTE FUNCTION stock_cajou.fn_flux_mensuel_mouvement();
+CREATE TRIGGER trg_flux_mensuel_mouvement_sup
+    AFTER DELETE ON stock_cajou.mouvement_stock
+    REFERENCING OLD TABLE AS ancien
+    FOR EACH STATEMENT EXECUTE FUNCTION stock_cajou.fn_flux_mensuel_mouvement();
+
+-- ── lot (réceptions) ──
+CREATE OR REPLACE FUNCTION stock_cajou.fn_flux_mensuel_lot() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO stock_cajou.flux_stock_mensuel_delta
+            (mois, produit_id, entrepot_id, type_flux, quantite, nb_operations)
+        SELECT stock_cajou.fn_mois(n.date_reception), n.produit_id, COALESCE(z.entrepot_id, 0),
+               'RECEPTION_LOT', COALESCE(sum(n.quantite_initiale), 0), count(*)
+        FROM nouveau n
+        LEFT JOIN stock_cajou.zone_entrepot z ON z.id = n.zone_id
+        WHERE n.date_reception IS NOT NULL AND n.produit_id IS NOT NULL
+        GROUP BY 1, 2, 3;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO stock_cajou.flux_stock_mensuel_delta
+            (mois, produit_id, entrepot_id, type_flux, quantite, nb_operations)
+        SELECT stock_cajou.fn_mois(o.date_reception), o.produit_id, COALESCE(z.entrepot_id, 0),
+               'RECEPTION_LOT', -COALESCE(sum(o.quantite_initiale), 0), -count(*)
+        FROM ancien o
+        LEFT JOIN stock_cajou.zone_entrepot z ON z.id = o.zone_id
+        WHERE o.date_reception IS NOT NULL AND o.produit_id IS NOT NULL
+        GROUP BY 1, 2, 3;
+    ELSE
+        -- Les mises à jour de quantite_restante / etat (ventes, livraisons)
+        -- ne produisent aucun delta
+        INSERT INTO stock_cajou.flux_stock_mensuel_delta
+            (mois, produit_id, entrepot_id, type_flux, quantite, nb_operations)
+        SELECT d.mois, d.produit_id, COALESCE(z.entrepot_id, 0), 'RECEPTION_LOT',
+               sum(d.quantite), sum(d.nb)
+        FROM (
+            SELECT stock_cajou.fn_mois(o.date_reception) AS mois, o.produit_id, o.zone_id,
+                   -COALESCE(o.quantite_initiale, 0) AS quantite, -1 AS nb
+            FROM ancien o JOIN nouveau n ON n.id = o.id
+            WHERE (o.date_reception, o.quantite_initiale, o.produit_id, o.zone_id)
+                  IS DISTINCT FROM (n.date_reception, n.quantite_initiale, n.produit_id, n.zone_id)
+            UNION ALL
+            SELECT stock_cajou.fn_mois(n.date_reception), n.produit_id, n.zone_id,
+                   COALESCE(n.quantite_initiale, 0), 1
+            FROM nouveau n JOIN ancien o ON o.id = n.id
+            WHERE (o.date_reception, o.quantite_initiale, o.produit_id, o.zone_id)
+                  IS DISTINCT FROM (n.date_reception, n.quantite_initiale, n.produit_id, n.zone_id)
+        ) d
+        LEFT JOIN stock_cajou.zone_entrepot z ON z.id = d.zone_id
+        WHERE d.mois IS NOT NULL AND d.produit_id IS NOT NULL
+        GROUP BY 1, 2, 3
+        HAVING sum(d.nb) <> 0 OR sum(d.quantite) <> 0;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_flux_mensuel_lot_ins ON stock_cajou.lot;
+DROP TRIGGER IF EXISTS trg_flux_mensuel_lot_maj ON stock_cajou.lot;
+DROP TRIGGER IF EXISTS trg_flux_mensuel_lot_sup ON stock_cajou.lot;
+CREATE TRIGGER trg_flux_mensuel_lot_ins
+    AFTER INSERT ON stock_cajou.lot
+    REFERENCING NEW TABLE AS nouveau
+    FOR EACH STATEMENT EXECUTE FUNCTION stock_cajou.fn_flux_mensuel_lot();
+CREATE TRIGGER trg_flux_mensuel_lot_maj
+    AFTER UPDATE ON stock_cajou.lot
+    REFERENCING OLD TABLE AS ancien NEW TABLE AS nouveau
+    FOR EACH STATEMENT EXECUTE FUNCTION stock_cajou.fn_flux_mensuel_lot();
+CREATE TRIGGER trg_flux_mensuel_lot_sup
+    AFTER DELETE ON stock_cajou.lot
+    REFERENCING OLD TABLE AS ancien
+    FOR EACH STATEMENT EXECUTE FUNCTION stock_cajou.fn_flux_mensuel_lot();
+
+-- ── vente ──
+CREATE OR REPLACE FUNCTION stock_cajou.fn_flux_mensuel_vente() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO stock_cajou.flux_stock_mensuel_delta
+            (mois, produit_id, entrepot_id, type_flux, quantite, nb_operations)
+        SELECT stock_cajou.fn_mois(n.date_vente), l.produit_id, COALESCE(z.entrepot_id, 0),
+               'VENTE', COALESCE(sum(n.quantite_vendue), 0), count(*)
+        FROM nouveau n
+        JOIN stock_cajou.lot l ON l.id = n.lot_id
+        JOIN stock_cajou.zone_entrepot z ON z.id = l.zone_id
+        WHERE n.date_vente IS NOT NULL
+        GROUP BY 1, 2, 3;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO stock_cajou.flux_stock_mensuel_delta
+            (mois, produit_id, entrepot_id, type_flux, quantite, nb_operations)
+        SELECT stock_cajou.fn_mois(o.date_vente), l.produit_id, COALESCE(z.entrepot_id, 0),
+               'VENTE', -COALESCE(sum(o.quantite_vendue), 0), -count(*)
+        FROM ancien o
+        JOIN stock_cajou.lot l ON l.id = o.lot_id
+        JOIN stock_cajou.zone_entrepot z ON z.id = l.zone_id
+        WHERE o.date_vente IS NOT NULL
+        GROUP BY 1, 2, 3;
+    ELSE
+        INSERT INTO stock_cajou.flux_stock_mensuel_delta
+            (mois, produit_id, entrepot_id, type_flux, quantite, nb_operations)
+        SELECT d.mois, l.produit_id, COALESCE(z.entrepot_id, 0), 'VENTE',
+               sum(d.quantite), sum(d.nb)
+        FROM (
+            SELECT o.lot_id, stock_cajou.fn_mois(o.date_vente) AS mois,
+                   -COALESCE(o.quantite_vendue, 0) AS quantite, -1 AS nb
+            FROM ancien o JOIN nouveau n ON n.id = o.id
+            WHERE (o.date_vente, o.quantite_vendue, o.lot_id)
+                  IS DISTINCT FROM (n.date_vente, n.quantite_vendue, n.lot_id)
+            UNION ALL
+            SELECT n.lot_id, stock_cajou.fn_mois(n.date_vente), COALESCE(n.quantite_vendue, 0), 1
+            FROM nouveau n JOIN ancien o ON o.id = n.id
+            WHERE (o.date_vente, o.quantite_vendue, o.lot_id)
+                  IS DISTINCT FROM (n.date_vente, n.quantite_vendue, n.lot_id)
+        ) d
+        JOIN stock_cajou.lot l ON l.id = d.lot_id
+        JOIN stock_cajou.zone_entrepot z ON z.id = l.zone_id
+        WHERE d.mois IS NOT NULL
+        GROUP BY 1, 2, 3
+        HAVING sum(d.nb) <> 0 OR sum(d.quantite) <> 0;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_flux_mensuel_vente_ins ON stock_cajou.vente;
+DROP TRIGGER IF EXISTS trg_flux_mensuel_vente_maj ON stock_cajou.vente;
+DROP TRIGGER IF EXISTS trg_flux_mensuel_vente_sup ON stock_cajou.vente;
+CREATE TRIGGER trg_flux_mensuel_vente_ins
+    AFTER INSERT ON stock_cajou.vente
+    REFERENCING NEW TABLE AS nouveau
+    FOR EACH STATEMENT EXECUTE FUNCTION stock_cajou.fn_flux_mensuel_vente();
+CREATE TRIGGER trg_flux_mensuel_vente_maj
+    AFTER UPDATE ON stock_cajou.vente
+    REFERENCING OLD TABLE AS ancien NEW TABLE AS nouveau
+    FOR EACH STATEMENT EXECUTE FUNCTION stock_cajou.fn_flux_mensuel_vente();
+CREATE TRIGGER trg_flux_mensuel_vente_sup
+    AFTER DELETE ON stock_cajou.vente
+    REFERENCING OLD TABLE AS ancien
+    FOR EACH STATEMENT EXECUTE FUNCTION stock_cajou.fn_flux_mensuel_vente();
+
+-- ── vente_immediate ──
+CREATE OR REPLACE FUNCTION stock_cajou.fn_flux_mensuel_vente_immediate() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO stock_cajou.flux_stock_mensuel_delta
+            (mois, produit_id, entrepot_id, type_flux, quantite, nb_operations)
+        SELECT stock_cajou.fn_mois(n.date_vente), n.produit_id, 0,
+               'VENTE_IMMEDIATE', COALESCE(sum(n.quantite_servie_maintenant), 0), count(*)
+        FROM nouveau n
+        WHERE n.date_vente IS NOT NULL AND n.produit_id IS NOT NULL
+        GROUP BY 1, 2;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO stock_cajou.flux_stock_mensuel_delta
+            (mois, produit_id, entrepot_id, type_flux, quantite, nb_operations)
+        SELECT stock_cajou.fn_mois(o.date_vente), o.produit_id, 0,
+               'VENTE_IMMEDIATE', -COALESCE(sum(o.quantite_servie_maintenant), 0), -count(*)
+        FROM ancien o
+        WHERE o.date_vente IS NOT NULL AND o.produit_id IS NOT NULL
+        GROUP BY 1, 2;
+    ELSE
+        INSERT INTO stock_cajou.flux_stock_mensuel_delta
+            (mois, produit_id, entrepot_id, type_flux, quantite, nb_operations)
+        SELECT d.mois, d.produit_id, 0, 'VENTE_IMMEDIATE', sum(d.quantite), sum(d.nb)
+        FROM (
+            SELECT stock_cajou.fn_mois(o.date_vente) AS mois, o.produit_id,
+                   -COALESCE(o.quantite_servie_maintenant, 0) AS quantite, -1 AS nb
+            FROM ancien o JOIN nouveau n ON n.id = o.id
+            WHERE (o.date_vente, o.quantite_servie_maintenant, o.produit_id)
+                  IS DISTINCT FROM (n.date_vente, n.quantite_servie_maintenant, n.produit_id)
+            UNION ALL
+            SELECT stock_cajou.fn_mois(n.date_vente), n.produit_id,
+                   COALESCE(n.quantite_servie_maintenant, 0), 1
+            FROM nouveau n JOIN ancien o ON o.id = n.id
+            WHERE (o.date_vente, o.quantite_servie_maintenant, o.produit_id)
+                  IS DISTINCT FROM (n.date_vente, n.quantite_servie_maintenant, n.produit_id)
+        ) d
+        WHERE d.mois IS NOT NULL AND d.produit_id IS NOT NULL
+        GROUP BY 1, 2
+        HAVING sum(d.nb) <> 0 OR sum(d.quantite) <> 0;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_flux_mensuel_vente_immediate_ins ON stock_cajou.vente_immediate;
+DROP TRIGGER IF EXISTS trg_flux_mensuel_vente_immediate_maj ON stock_cajou.vente_immediate;
+DROP TRIGGER IF EXISTS trg_flux_mensuel_vente_immediate_sup ON stock_cajou.vente_immediate;
+CREATE TRIGGER trg_flux_mensuel_vente_immediate_ins
+    AFTER INSERT ON stock_cajou.vente_immediate
+    REFERENCING NEW TABLE AS nouveau
+    FOR EACH STATEMENT EXECUTE FUNCTION stock_cajou.fn_flux_mensuel_vente_immediate();
+CREATE TRIGGER trg_flux_mensuel_vente_immediate_maj
+    AFTER UPDATE ON stock_cajou.vente_immediate
+    REFERENCING OLD TABLE AS ancien NEW TABLE AS nouveau
+    FOR EACH STATEMENT EXECUTE FUNCTION stock_cajou.fn_flux_mensuel_vente_immediate();
+CREATE TRIGGER trg_flux_mensuel_vente_immediate_sup
+    AFTER DELETE ON stock_cajou.vente_immediate
+    REFERENCING OLD TABLE AS ancien
+    FOR EACH STATEMENT EXECUTE FUNCTION stock_cajou.fn_flux_mensuel_vente_immediate();
+
+-- ── Lecture : cumuls compactés + deltas en attente ──
+-- Un groupe dont toutes les opérations ont été retirées disparaît, comme
+-- une ligne de cumul à nb_operations <= 0 après compactage.
+CREATE OR REPLACE VIEW stock_cajou.flux_stock_mensuel_courant AS
+SELECT min(f.id) AS id, f.mois, f.produit_id, f.entrepot_id, f.type_flux,
+       sum(f.quantite) AS quantite, sum(f.nb_operations)::integer AS nb_operations
+FROM (
+    SELECT id, mois, produit_id, entrepot_id, type_flux, quantite, nb_operations
+    FROM stock_cajou.flux_stock_mensuel
+    UNION ALL
+    SELECT -id, mois, produit_id, entrepot_id, type_flux, quantite, nb_operations
+    FROM stock_cajou.flux_stock_mensuel_delta
+) f
+GROUP BY f.mois, f.produit_id, f.entrepot_id, f.type_flux
+HAVING sum(f.nb_operations) > 0;
+
+-- ── Compactage : reporte les deltas dans les cumuls ──
+-- Les deltas lus sont supprimés dans la même instruction ; ceux d'une
+-- transaction non encore validée restent pour le passage suivant.
+CREATE OR REPLACE FUNCTION stock_cajou.fn_flux_mensuel_compacter() RETURNS bigint
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_deltas bigint;
+BEGIN
+    WITH lus AS (
+        DELETE FROM stock_cajou.flux_stock_mensuel_delta
+        RETURNING mois, produit_id, entrepot_id, type_flux, quantite, nb_operations
+    ), cumul AS (
+        INSERT INTO stock_cajou.flux_stock_mensuel AS f
+            (mois, produit_id, entrepot_id, type_flux, quantite, nb_operations)
+        SELECT mois, produit_id, entrepot_id, type_flux, sum(quantite), sum(nb_operations)
+        FROM lus
+        GROUP BY mois, produit_id, entrepot_id, type_flux
+        ON CONFLICT (mois, produit_id, entrepot_id, type_flux) DO UPDATE
+            SET quantite = f.quantite + EXCLUDED.quantite,
+                nb_operations = f.nb_operations + EXCLUDED.nb_operations
+    )
+    SELECT count(*) INTO v_deltas FROM lus;
+
+    IF v_deltas > 0 THEN
+        DELETE FROM stock_cajou.flux_stock_mensuel WHERE nb_operations <= 0;
+    END IF;
+    RETURN v_deltas;
+END;
+$$;
+
+-- ── Reconstruction complète (backfill, après import triggers désactivés) ──
+CREATE OR REPLACE FUNCTION stock_cajou.fn_flux_mensuel_reconstruire() RETURNS bigint
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_lignes bigint;
+BEGIN
+    -- Les écrivains (triggers) attendent la fin de la reconstruction
+    LOCK TABLE stock_cajou.flux_stock_mensuel, stock_cajou.flux_stock_mensuel_delta
+        IN EXCLUSIVE MODE;
+    DELETE FROM stock_cajou.flux_stock_mensuel_delta;
+    DELETE FROM stock_cajou.flux_stock_mensuel;
+
+    -- Mêmes jointures et filtres que les triggers : la reconstruction
+    -- redonne exactement les cumuls incrémentaux
+    INSERT INTO stock_cajou.flux_stock_mensuel
+        (mois, produit_id, entrepot_id, type_flux, quantite, nb_operations)
+    SELECT mois, produit_id, COALESCE(entrepot_id, 0), type_flux,
+           COALESCE(SUM(quantite), 0), COUNT(*)
+    FROM (
+        SELECT stock_cajou.fn_mois(m.date_mouvement) AS mois, l.produit_id, z.entrepot_id,
+               stock_cajou.fn_type_flux_mouvement(m.type_mouvement) AS type_flux,
+               m.quantite
+        FROM stock_cajou.mouvement_stock m
+        JOIN stock_cajou.lot l ON l.id = m.lot_id
+        JOIN stock_cajou.zone_entrepot z ON z.id = l.zone_id
+        WHERE m.date_mouvement IS NOT NULL
+        UNION ALL
+        SELECT stock_cajou.fn_mois(l.date_reception), l.produit_id, z.entrepot_id,
+               'RECEPTION_LOT', l.quantite_initiale
+        FROM stock_cajou.lot l
+        LEFT JOIN stock_cajou.zone_entrepot z ON z.id = l.zone_id
+        WHERE l.date_reception IS NOT NULL AND l.produit_id IS NOT NULL
+        UNION ALL
+        SELECT stock_cajou.fn_mois(v.date_vente), l.produit_id, z.entrepot_id,
+               'VENTE', v.quantite_vendue
+        FROM stock_cajou.vente v
+        JOIN stock_cajou.lot l ON l.id = v.lot_id
+        JOIN stock_cajou.zone_entrepot z ON z.id = l.zone_id
+        WHERE v.date_vente IS NOT NULL
+        UNION ALL
+        SELECT stock_cajou.fn_mois(vi.date_vente), vi.produit_id, 0,
+               'VENTE_IMMEDIATE', vi.quantite_servie_maintenant
+        FROM stock_cajou.vente_immediate vi
+        WHERE vi.date_vente IS NOT NULL AND vi.produit_id IS NOT NULL
+    ) flux
+    GROUP BY mois, produit_id, COALESCE(entrepot_id, 0), type_flux;
+
+    GET DIAGNOSTICS v_lignes = ROW_COUNT;
+    RETURN v_lignes;
+END;
+$$;
+
+SELECT stock_cajou.fn_flux_mensuel_reconstruire();
+
+COMMIT;
@@ -0,0 +1,30 @@
+-- =====================================================================
+-- 003 — Instantanés de prévisions précalculées
+-- Écrits par : python manage.py precompute_forecasts (cron) ;
+-- lus par la page Prévisions, qui ne lance plus l'entraînement.
+--
+-- Une génération = toutes les lignes d'un même genere_le :
+--   GLOBAL   contexte complet de la page (objet_id NULL)
+--   PRODUIT  prévision d'un produit (objet_id = produit.id)
+--   ENTREPOT prévision d'un entrepôt (objet_id = entrepot.id)
+--
+-- Application : psql -d <base> -f sql/003_prevision_snapshot.sql
+-- =====================================================================
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS stock_cajou.prevision_snapshot (
+    id              bigserial PRIMARY KEY,
+    genere_le       timestamptz NOT NULL,
+    portee          varchar(20) NOT NULL
+                    CHECK (portee IN ('GLOBAL', 'PRODUIT', 'ENTREPOT')),
+    objet_id        bigint,
+    n_mois          integer     NOT NULL,
+    duree_calcul_ms integer,
+    contexte        jsonb       NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS prevision_snapshot_portee_genere_idx
+    ON stock_cajou.prevision_snapshot (portee, genere_le DESC);
+
+COMMIT;
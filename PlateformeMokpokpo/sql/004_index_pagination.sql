@@ -0,0 +1,36 @@
+-- =====================================================================
+-- 004 — Index de la pagination par clé des listes (gestion/pagination.py)
+-- Chaque liste est lue par « clé ≤ curseur ORDER BY clé DESC, id DESC
+-- LIMIT n » : l'index ci-dessous rend le coût d'une page indépendant de
+-- sa profondeur. Les lignes sans date (NULL) sont parcourues en dernier.
+--
+-- Application : psql -d <base> -f sql/004_index_pagination.sql
+-- (CONCURRENTLY : hors transaction, sans bloquer les écritures)
+-- =====================================================================
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS client_date_inscription_id_idx
+    ON stock_cajou.client (date_inscription DESC NULLS LAST, id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS lot_date_creation_id_idx
+    ON stock_cajou.lot (date_creation DESC NULLS LAST, id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS vente_date_vente_id_idx
+    ON stock_cajou.vente (date_vente DESC NULLS LAST, id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS mouvement_stock_date_mouvement_id_idx
+    ON stock_cajou.mouvement_stock (date_mouvement DESC NULLS LAST, id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS historique_tracabilite_date_action_id_idx
+    ON stock_cajou.historique_tracabilite (date_action DESC NULLS LAST, id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS commande_date_commande_id_idx
+    ON stock_cajou.commande (date_commande DESC NULLS LAST, id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS demande_achat_date_creation_id_idx
+    ON stock_cajou.demande_achat (date_creation DESC NULLS LAST, id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS alerte_stock_date_alerte_id_idx
+    ON stock_cajou.alerte_stock (date_alerte DESC NULLS LAST, id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS vente_immediate_date_vente_id_idx
+    ON stock_cajou.vente_immediate (date_vente DESC NULLS LAST, id DESC);
@@ -0,0 +1,85 @@
+-- =====================================================================
+-- 005 — Index de recherche des listes (gestion/recherche.py)
+--
+-- Colonnes courtes : GIN pg_trgm sur UPPER(col::text), l'expression
+-- exacte générée par Django pour icontains (UPPER(col::text) LIKE
+-- UPPER('%terme%')) ; la recherche garde sa sémantique de sous-chaîne.
+--
+-- Historique : colonne tsvector générée (configuration 'french') sur la
+-- description, indexée en GIN, interrogée par préfixe de mots.
+--
+-- Clés étrangères : chaque colonne d'une table liée est cherchée par
+-- « fk IN (ids trouvés) » ; les index ci-dessous servent ces jointures.
+--
+-- Application : psql -d <base> -f sql/005_recherche.sql
+-- (CONCURRENTLY : hors transaction, sans bloquer les écritures ;
+--  l'ajout de la colonne générée réécrit historique_tracabilite)
+-- =====================================================================
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- ── Trigrammes ──
+CREATE INDEX CONCURRENTLY IF NOT EXISTS client_nom_trgm_idx
+    ON stock_cajou.client USING gin ((UPPER(nom::text)) gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS client_prenom_trgm_idx
+    ON stock_cajou.client USING gin ((UPPER(prenom::text)) gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS client_email_trgm_idx
+    ON stock_cajou.client USING gin ((UPPER(email::text)) gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS client_entreprise_trgm_idx
+    ON stock_cajou.client USING gin ((UPPER(entreprise::text)) gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS produit_nom_trgm_idx
+    ON stock_cajou.produit USING gin ((UPPER(nom::text)) gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS lot_code_lot_trgm_idx
+    ON stock_cajou.lot USING gin ((UPPER(code_lot::text)) gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS vente_numero_vente_trgm_idx
+    ON stock_cajou.vente USING gin ((UPPER(numero_vente::text)) gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS vente_immediate_numero_vente_trgm_idx
+    ON stock_cajou.vente_immediate USING gin ((UPPER(numero_vente::text)) gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS commande_numero_commande_trgm_idx
+    ON stock_cajou.commande USING gin ((UPPER(numero_commande::text)) gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS alerte_stock_observations_trgm_idx
+    ON stock_cajou.alerte_stock USING gin ((UPPER(observations::text)) gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS auth_user_username_trgm_idx
+    ON public.auth_user USING gin ((UPPER(username::text)) gin_trgm_ops);
+
+-- ── Plein texte : description de l'historique ──
+ALTER TABLE stock_cajou.historique_tracabilite
+    ADD COLUMN IF NOT EXISTS recherche tsvector
+    GENERATED ALWAYS AS (
+        to_tsvector('french'::regconfig, COALESCE(description, ''))
+    ) STORED;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS historique_tracabilite_recherche_idx
+    ON stock_cajou.historique_tracabilite USING gin (recherche);
+
+-- ── Clés étrangères des recherches sur tables liées ──
+CREATE INDEX CONCURRENTLY IF NOT EXISTS lot_produit_id_idx
+    ON stock_cajou.lot (produit_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS vente_client_id_idx
+    ON stock_cajou.vente (client_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS vente_lot_id_idx
+    ON stock_cajou.vente (lot_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS vente_immediate_client_id_idx
+    ON stock_cajou.vente_immediate (client_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS commande_client_id_idx
+    ON stock_cajou.commande (client_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS alerte_stock_produit_id_idx
+    ON stock_cajou.alerte_stock (produit_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS historique_tracabilite_lot_id_idx
+    ON stock_cajou.historique_tracabilite (lot_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS historique_tracabilite_commande_id_idx
+    ON stock_cajou.historique_tracabilite (commande_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS historique_tracabilite_user_id_idx
+    ON stock_cajou.historique_tracabilite (user_id);
+
+ANALYZE stock_cajou.client, stock_cajou.produit, stock_cajou.lot,
+        stock_cajou.vente, stock_cajou.vente_immediate, stock_cajou.commande,
+        stock_cajou.alerte_stock, stock_cajou.historique_tracabilite,
+        public.auth_user;
@@ -0,0 +1,198 @@
+-- =====================================================================
+-- 006 — Partitionnement mensuel des tables d'historique
+--
+--   historique_tracabilite  PARTITION BY RANGE (date_action)
+--   mouvement_stock         PARTITION BY RANGE (date_mouvement)
+--
+-- Une partition par mois (UTC, comme fn_mois) : <table>_pAAAA_MM.
+-- Les requêtes filtrées ou paginées par date (listes, exports du/au)
+-- n'ouvrent que les partitions utiles ; VACUUM et index travaillent
+-- partition par partition, et les mois anciens se détachent sans
+-- DELETE massif (python manage.py archiver_partitions).
+-- Partition <table>_defaut : lignes sans date (NULL). Elle doit rester
+-- quasi vide ; les mois à venir sont créés d'avance par
+-- python manage.py creer_partitions (cron mensuel).
+--
+-- Conversion en place, dans une transaction : la table est renommée,
+-- la table partitionnée créée à l'identique (colonnes, valeurs par
+-- défaut, colonne générée, contraintes CHECK), les données copiées, puis
+-- index, clés étrangères et triggers (002, 004, 005) recréés à partir de
+-- leur définition d'origine. La clé primaire devient un index unique
+-- (id, date) : une clé unique doit contenir la clé de partitionnement,
+-- et une clé primaire interdirait les dates NULL. La séquence d'id est
+-- conservée.
+--
+-- PostgreSQL 13 ou plus. Sauvegarde préalable conseillée ; la
+-- conversion verrouille les deux tables le temps de la copie.
+--
+-- Application : psql -d <base> -f sql/006_partitionnement.sql
+-- =====================================================================
+
+BEGIN;
+
+-- Crée (si besoin) la partition du mois de p_mois ; retourne son nom.
+-- Les lignes de ce mois tombées entre-temps dans la partition par défaut
+-- y sont déplacées.
+CREATE OR REPLACE FUNCTION stock_cajou.fn_creer_partition_mois(p_table text, p_mois date)
+RETURNS text LANGUAGE plpgsql
+SET search_path = pg_catalog, pg_temp AS $$
+DECLARE
+    v_debut   date := date_trunc('month', p_mois)::date;
+    v_nom     text := format('%s_p%s', p_table, to_char(v_debut, 'YYYY_MM'));
+    v_bas     timestamptz := v_debut::timestamp AT TIME ZONE 'UTC';
+    v_haut    timestamptz := (v_debut + interval '1 month')::timestamp AT TIME ZONE 'UTC';
+    v_colonne text;
+    v_colonnes text;
+    v_egares  bigint;
+BEGIN
+    IF to_regclass(format('stock_cajou.%I', v_nom)) IS NOT NULL THEN
+        RETURN v_nom;
+    END IF;
+
+    SELECT a.attname INTO v_colonne
+    FROM pg_partitioned_table pt
+    JOIN pg_attribute a ON a.attrelid = pt.partrelid AND a.attnum = pt.partattrs[0]
+    WHERE pt.partrelid = format('stock_cajou.%I', p_table)::regclass;
+
+    SELECT string_agg(quote_ident(attname), ', ' ORDER BY attnum) INTO v_colonnes
+    FROM pg_attribute
+    WHERE attrelid = format('stock_cajou.%I', p_table)::regclass
+      AND attnum > 0 AND NOT attisdropped AND attgenerated = '';
+
+    -- Lignes du mois arrivées dans la partition par défaut (cron en retard)
+    EXECUTE format(
+        'CREATE TEMP TABLE _transit_partition ON COMMIT DROP AS '
+        'SELECT %s FROM stock_cajou.%I WHERE %I >= %L AND %I < %L',
+        v_colonnes, p_table || '_defaut', v_colonne, v_bas, v_colonne, v_haut);
+    GET DIAGNOSTICS v_egares = ROW_COUNT;
+    IF v_egares > 0 THEN
+        EXECUTE format('DELETE FROM stock_cajou.%I WHERE %I >= %L AND %I < %L',
+                       p_table || '_defaut', v_colonne, v_bas, v_colonne, v_haut);
+    END IF;
+
+    EXECUTE format(
+        'CREATE TABLE stock_cajou.%I PARTITION OF stock_cajou.%I FOR VALUES FROM (%L) TO (%L)',
+        v_nom, p_table, v_bas, v_haut);
+
+    -- Réinsérées dans la partition elle-même : les triggers de niveau
+    -- instruction du parent (flux, 002) ne revoient pas ces lignes, que le
+    -- DELETE sur <table>_defaut n'a pas non plus retirées des cumuls
+    IF v_egares > 0 THEN
+        EXECUTE format('INSERT INTO stock_cajou.%I (%s) SELECT %s FROM _transit_partition',
+                       v_nom, v_colonnes, v_colonnes);
+        RAISE NOTICE '% : % lignes reprises de la partition par défaut', v_nom, v_egares;
+    END IF;
+    DROP TABLE _transit_partition;
+    RETURN v_nom;
+END;
+$$;
+
+-- Convertit stock_cajou.<p_table> en table partitionnée par mois sur p_colonne
+-- (search_path restreint : les définitions relues sont toutes qualifiées)
+CREATE OR REPLACE FUNCTION stock_cajou.fn_partitionner_par_mois(p_table text, p_colonne text)
+RETURNS integer LANGUAGE plpgsql
+SET search_path = pg_catalog, pg_temp AS $$
+DECLARE
+    v_ancien    text := p_table || '_ancien';
+    v_colonnes  text;
+    v_index     text[];
+    v_fk        text[];
+    v_triggers  text[];
+    v_sequence  text;
+    v_identite  boolean;
+    v_mois      date;
+    v_dernier   date;
+    v_def       text;
+    v_nb        integer := 0;
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_partitioned_table
+               WHERE partrelid = format('stock_cajou.%I', p_table)::regclass) THEN
+        RAISE NOTICE '% est déjà partitionnée', p_table;
+        RETURN 0;
+    END IF;
+    IF EXISTS (SELECT 1 FROM pg_constraint
+               WHERE contype = 'f' AND confrelid = format('stock_cajou.%I', p_table)::regclass) THEN
+        RAISE EXCEPTION '% est référencée par une clé étrangère : conversion impossible', p_table;
+    END IF;
+
+    EXECUTE format('ALTER TABLE stock_cajou.%I RENAME TO %I', p_table, v_ancien);
+
+    -- Définitions à recréer sur la nouvelle table (hors clé primaire)
+    SELECT array_agg(pg_get_indexdef(i.indexrelid)) INTO v_index
+    FROM pg_index i
+    WHERE i.indrelid = format('stock_cajou.%I', v_ancien)::regclass AND NOT i.indisprimary;
+    SELECT array_agg(format('ALTER TABLE stock_cajou.%I ADD CONSTRAINT %I %s',
+                            p_table, conname, pg_get_constraintdef(oid))) INTO v_fk
+    FROM pg_constraint
+    WHERE conrelid = format('stock_cajou.%I', v_ancien)::regclass AND contype = 'f';
+    SELECT array_agg(pg_get_triggerdef(oid)) INTO v_triggers
+    FROM pg_trigger
+    WHERE tgrelid = format('stock_cajou.%I', v_ancien)::regclass AND NOT tgisinternal;
+
+    v_sequence := pg_get_serial_sequence(format('stock_cajou.%I', v_ancien), 'id');
+    SELECT attidentity <> '' INTO v_identite
+    FROM pg_attribute
+    WHERE attrelid = format('stock_cajou.%I', v_ancien)::regclass AND attname = 'id';
+
+    EXECUTE format(
+        'CREATE TABLE stock_cajou.%I (LIKE stock_cajou.%I INCLUDING DEFAULTS '
+        'INCLUDING GENERATED INCLUDING IDENTITY INCLUDING CONSTRAINTS '
+        'INCLUDING STORAGE INCLUDING COMMENTS, UNIQUE (id, %I)) '
+        'PARTITION BY RANGE (%I)',
+        p_table, v_ancien, p_colonne, p_colonne);
+    EXECUTE format('CREATE TABLE stock_cajou.%I PARTITION OF stock_cajou.%I DEFAULT',
+                   p_table || '_defaut', p_table);
+
+    -- Un mois par partition, du plus ancien à trois mois d'avance
+    EXECUTE format('SELECT stock_cajou.fn_mois(min(%I)) FROM stock_cajou.%I', p_colonne, v_ancien)
+        INTO v_mois;
+    v_mois := COALESCE(v_mois, stock_cajou.fn_mois(now()));
+    v_dernier := (stock_cajou.fn_mois(now()) + interval '3 months')::date;
+    WHILE v_mois <= v_dernier LOOP
+        PERFORM stock_cajou.fn_creer_partition_mois(p_table, v_mois);
+        v_nb := v_nb + 1;
+        v_mois := (v_mois + interval '1 month')::date;
+    END LOOP;
+
+    SELECT string_agg(quote_ident(attname), ', ' ORDER BY attnum) INTO v_colonnes
+    FROM pg_attribute
+    WHERE attrelid = format('stock_cajou.%I', v_ancien)::regclass
+      AND attnum > 0 AND NOT attisdropped AND attgenerated = '';
+    -- Copie sans triggers : les cumuls de flux_stock_mensuel sont déjà à jour
+    EXECUTE format('INSERT INTO stock_cajou.%I (%s) SELECT %s FROM stock_cajou.%I',
+                   p_table, v_colonnes, v_colonnes, v_ancien);
+
+    -- La séquence d'id suit la colonne de la nouvelle table
+    IF v_identite THEN
+        EXECUTE format('SELECT setval(pg_get_serial_sequence(%L, ''id''), '
+                       'COALESCE((SELECT max(id) FROM stock_cajou.%I), 0) + 1, false)',
+                       format('stock_cajou.%I', p_table), p_table);
+    ELSIF v_sequence IS NOT NULL THEN
+        EXECUTE format('ALTER SEQUENCE %s OWNED BY stock_cajou.%I.id', v_sequence, p_table);
+    END IF;
+
+    EXECUTE format('DROP TABLE stock_cajou.%I', v_ancien);
+
+    -- Index (créés sur chaque partition), clés étrangères et triggers d'origine
+    FOREACH v_def IN ARRAY COALESCE(v_index, '{}') LOOP
+        EXECUTE replace(v_def, format(' ON stock_cajou.%s ', v_ancien),
+                        format(' ON stock_cajou.%s ', p_table));
+    END LOOP;
+    FOREACH v_def IN ARRAY COALESCE(v_fk, '{}') LOOP
+        EXECUTE v_def;
+    END LOOP;
+    FOREACH v_def IN ARRAY COALESCE(v_triggers, '{}') LOOP
+        EXECUTE replace(v_def, format(' ON stock_cajou.%s ', v_ancien),
+                        format(' ON stock_cajou.%s ', p_table));
+    END LOOP;
+
+    RETURN v_nb;
+END;
+$$;
+
+SELECT stock_cajou.fn_partitionner_par_mois('historique_tracabilite', 'date_action');
+SELECT stock_cajou.fn_partitionner_par_mois('mouvement_stock', 'date_mouvement');
+
+COMMIT;
+
+ANALYZE stock_cajou.historique_tracabilite, stock_cajou.mouvement_stock;